@@ -2,13 +2,13 @@ from dataclasses import dataclass, field, asdict
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 import re
-import json
+import orjson
 def validate_json(text: str, field_name: str = "") -> bool:
     """Test if a string can be properly encoded as JSON."""
     try:
-        json.dumps(text)
+        orjson.dumps(text)
         return True
-    except (TypeError, ValueError):
+    except orjson.JSONEncodeError:
         return False
 
 def sanitize_text(text: str | None) -> str:
@@ -123,16 +123,15 @@ class EmailMetadata:
                 "BodyPreview": raw_data.get("BodyPreview", "")
             }
             
-            # Validate each field can be properly encoded as JSON
-            for key, value in data.items():
-                if not validate_json(value, key):
-                    raise ValueError(f"Field {key} contains invalid JSON data")
-            
-            # Validate the entire object can be encoded as JSON
+            # Validate the entire object can be encoded as JSON; only look for
+            # the offending field when it cannot
             try:
-                json.dumps(data)
+                orjson.dumps(data)
                 return data
-            except (TypeError, ValueError) as e:
+            except orjson.JSONEncodeError as e:
+                for key, value in data.items():
+                    if not validate_json(value, key):
+                        raise ValueError(f"Field {key} contains invalid JSON data")
                 raise ValueError(f"Email metadata cannot be encoded as JSON: {str(e)}")
                 
         except Exception as e:
@@ -1,12 +1,39 @@
+import asyncio
+import random
+import time
 import msal
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Iterator, Optional
 from src.EmailMetadata import EmailMetadata
 # import pytz
 import logging
 
 logger = logging.getLogger("outlook-email.graph")
 
+# Keep-alive connections held open to graph.microsoft.com
+GRAPH_POOL_SIZE = 16
+
+# Throttling (429) and unavailable (503) responses are retried with backoff
+GRAPH_TRANSIENT_STATUS = frozenset({429, 503})
+GRAPH_MAX_ATTEMPTS = 5
+GRAPH_BACKOFF_BASE = 1.0
+GRAPH_BACKOFF_MAX = 30.0
+
+
+class GraphTransientError(Exception):
+    """Graph kept answering 429/503 after every retry attempt."""
+
+    def __init__(self, status_code: int, url: str):
+        super().__init__(
+            f"Microsoft Graph returned {status_code} after {GRAPH_MAX_ATTEMPTS} attempts"
+        )
+        self.status_code = status_code
+        self.url = url
+
 
 class GraphConnector:
     def __init__(self, tenant_id: str, client_id: str, client_secret: str, user_email: str):
@@ -24,6 +51,10 @@ class GraphConnector:
         self.client_secret = client_secret
         self.user_email = user_email
         self.token = None
+        # Long-lived keep-alive pool shared by paging, attachment and download calls
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=GRAPH_POOL_SIZE, pool_maxsize=GRAPH_POOL_SIZE)
+        self.session.mount("https://", adapter)
 
     # -----------------------------------------------------
     # AUTHENTICATION
@@ -60,19 +91,162 @@ class GraphConnector:
             "Content-Type": "application/json"
         }
 
+    def _to_email_metadata(self, msg: dict) -> EmailMetadata:
+        """
+        Convert a Graph message resource into EmailMetadata.
+
+        Args:
+            msg: Message JSON object returned by Graph
+
+        Returns:
+            EmailMetadata for the message
+        """
+        received_dt = datetime.fromisoformat(
+            msg["receivedDateTime"].replace("Z", "+00:00")
+        )
+
+        sender = msg.get("from", {}).get("emailAddress", {})
+        sender_name = sender.get("name", "")
+        sender_email = sender.get("address", "")
+
+        to_list = [
+            r["emailAddress"]["address"]
+            for r in msg.get("toRecipients", [])
+        ]
+        to_field = ", ".join(to_list)
+
+        cc_list = [
+            r["emailAddress"]["address"]
+            for r in msg.get("ccRecipients", [])
+        ]
+        cc_field = ", ".join(cc_list) if cc_list else None
+
+        reply_to_list = [
+            r["emailAddress"]["address"]
+            for r in msg.get("replyTo", [])
+        ]
+        reply_to_field = ", ".join(reply_to_list) if reply_to_list else None
+
+        body_content = msg.get("body", {}).get("content", "")
+        body_preview = msg.get("bodyPreview", "")
+
+        email_meta = EmailMetadata(
+            AccountName=self.user_email,
+            Entry_ID=msg["id"],
+            Folder="Inbox",
+            Subject=msg.get("subject", ""),
+            SenderName=sender_name,
+            SenderEmailAddress=sender_email,
+            ReceivedTime=received_dt,
+            SentOn=received_dt,
+            To=to_field,
+            Body=body_content,
+            Attachments=[],
+            IsMarkedAsTask=False,
+            UnRead=False,
+            Categories="",
+            ConversationId=msg.get("conversationId"),
+            ConversationIndex=msg.get("conversationIndex"),
+            InternetMessageId=msg.get("internetMessageId"),
+            InReplyTo=msg.get("inReplyTo"),
+            CcRecipients=cc_field,
+            ReplyTo=reply_to_field,
+            BodyPreview=body_preview
+        )
+        return email_meta
+
+    def close(self):
+        """Close pooled HTTP connections."""
+        self.session.close()
+
+    def _get(self, url: str) -> requests.Response:
+        """
+        GET a Graph URL, backing off and retrying on throttling.
+
+        Honors Retry-After when Graph sends it, capped at GRAPH_BACKOFF_MAX;
+        otherwise waits with exponential backoff plus jitter.
+
+        Args:
+            url: Graph URL to request
+
+        Returns:
+            The first response whose status is not transient
+
+        Raises:
+            GraphTransientError: If every attempt was throttled or unavailable
+        """
+        for attempt in range(GRAPH_MAX_ATTEMPTS):
+            response = self.session.get(url, headers=self.headers())
+            if response.status_code not in GRAPH_TRANSIENT_STATUS:
+                return response
+            if attempt == GRAPH_MAX_ATTEMPTS - 1:
+                break
+            try:
+                retry_after = float(response.headers.get("Retry-After", ""))
+                delay = min(GRAPH_BACKOFF_MAX, max(0.0, retry_after))
+            except ValueError:
+                delay = min(GRAPH_BACKOFF_MAX, GRAPH_BACKOFF_BASE * 2 ** attempt)
+                delay += random.uniform(0, delay)
+            logger.warning(
+                f"Graph returned {response.status_code}, retry {attempt + 1}/"
+                f"{GRAPH_MAX_ATTEMPTS - 1} in {delay:.1f}s"
+            )
+            time.sleep(delay)
+        raise GraphTransientError(response.status_code, url)
+
+    def _fetch_page(self, url: str) -> Optional[dict]:
+        """
+        Fetch a single Graph page.
+
+        Args:
+            url: Page URL (initial query or @odata.nextLink)
+
+        Returns:
+            Parsed JSON response, or None on an API error
+
+        Raises:
+            GraphTransientError: If Graph keeps throttling the request
+        """
+        response = self._get(url)
+        if response.status_code != 200:
+            logger.error(f"Graph API Error: {response.status_code} - {response.text}")
+            return None
+        return orjson.loads(response.content)
+
+    def _iter_pages(self, url: str) -> Iterator[dict]:
+        """
+        Walk @odata.nextLink pages, requesting the next page while the caller
+        is still handling the current one.
+
+        Args:
+            url: First page URL
+
+        Yields:
+            Parsed JSON response for each page
+        """
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pending = pool.submit(self._fetch_page, url)
+            while pending is not None:
+                data = pending.result()
+                if data is None:
+                    return
+                next_link = data.get("@odata.nextLink")
+                pending = pool.submit(self._fetch_page, next_link) if next_link else None
+                yield data
+
     # -----------------------------------------------------
     # GET EMAILS
     # -----------------------------------------------------
-    def get_emails(self, start_iso: str, end_iso: str):
+    def get_emails_paged(self, start_iso: str, end_iso: str):
         """
-        Fetch emails from Microsoft Graph API for a date range with paging support.
+        Fetch emails from Microsoft Graph API for a date range, one page at a time.
         
         Args:
             start_iso: Start date in ISO format
             end_iso: End date in ISO format
             
-        Returns:
-            List of EmailMetadata objects
+        Yields:
+            List of EmailMetadata objects for each Graph page
         """
         logger.info(f"Graph: Fetching emails from {start_iso} to {end_iso}")
         self.authenticate()
@@ -101,99 +275,72 @@ class GraphConnector:
 
         logger.info(f"Graph API URL: {url}")
 
-        all_emails = []
-        next_link = url
-
         # Handle paging
-        while next_link:
-            response = requests.get(next_link, headers=self.headers())
-            if response.status_code != 200:
-                logger.error(f"Graph API Error: {response.status_code} - {response.text}")
-                break
-
-            data = response.json()
+        for data in self._iter_pages(url):
             messages = data.get("value", [])
             logger.info(f"Graph returned {len(messages)} messages in this page")
 
+            page = []
             for msg in messages:
                 try:
-                    received_dt = datetime.fromisoformat(
-                        msg["receivedDateTime"].replace("Z", "+00:00")
-                    )
-
-                    sender = msg.get("from", {}).get("emailAddress", {})
-                    sender_name = sender.get("name", "")
-                    sender_email = sender.get("address", "")
-
-                    to_list = [
-                        r["emailAddress"]["address"]
-                        for r in msg.get("toRecipients", [])
-                    ]
-                    to_field = ", ".join(to_list)
-
-                    cc_list = [
-                        r["emailAddress"]["address"]
-                        for r in msg.get("ccRecipients", [])
-                    ]
-                    cc_field = ", ".join(cc_list) if cc_list else None
-
-                    reply_to_list = [
-                        r["emailAddress"]["address"]
-                        for r in msg.get("replyTo", [])
-                    ]
-                    reply_to_field = ", ".join(reply_to_list) if reply_to_list else None
-
-                    body_content = msg.get("body", {}).get("content", "")
-                    body_preview = msg.get("bodyPreview", "")
-
-                    email_meta = EmailMetadata(
-                        AccountName=self.user_email,
-                        Entry_ID=msg["id"],
-                        Folder="Inbox",
-                        Subject=msg.get("subject", ""),
-                        SenderName=sender_name,
-                        SenderEmailAddress=sender_email,
-                        ReceivedTime=received_dt,
-                        SentOn=received_dt,
-                        To=to_field,
-                        Body=body_content,
-                        Attachments=[],
-                        IsMarkedAsTask=False,
-                        UnRead=False,
-                        Categories="",
-                        ConversationId=msg.get("conversationId"),
-                        ConversationIndex=msg.get("conversationIndex"),
-                        InternetMessageId=msg.get("internetMessageId"),
-                        InReplyTo=msg.get("inReplyTo"),
-                        CcRecipients=cc_field,
-                        ReplyTo=reply_to_field,
-                        BodyPreview=body_preview
-                    )
-
-                    all_emails.append(email_meta)
-
+                    page.append(self._to_email_metadata(msg))
                 except Exception as e:
                     logger.error(f"Error converting Graph email: {str(e)}")
                     continue
 
-            # Check for next page
-            next_link = data.get("@odata.nextLink")
-            if next_link:
-                logger.info(f"Fetching next page of results...")
+            yield page
+
+        logger.info("Graph paging complete.")
 
+    async def get_emails_async(self, start_iso: str, end_iso: str):
+        """
+        Async variant of get_emails_paged that keeps blocking HTTP off the event loop.
+        
+        Args:
+            start_iso: Start date in ISO format
+            end_iso: End date in ISO format
+            
+        Yields:
+            List of EmailMetadata objects for each Graph page
+        """
+        async for page in self._iterate_async(self.get_emails_paged(start_iso, end_iso)):
+            yield page
+
+    async def _iterate_async(self, pages):
+        """Drive a blocking page generator from the event loop, one page per executor call."""
+        loop = asyncio.get_running_loop()
+        while (page := await loop.run_in_executor(None, next, pages, None)) is not None:
+            yield page
+
+    def get_emails(self, start_iso: str, end_iso: str):
+        """
+        Fetch emails from Microsoft Graph API for a date range with paging support.
+        
+        Args:
+            start_iso: Start date in ISO format
+            end_iso: End date in ISO format
+            
+        Returns:
+            List of EmailMetadata objects
+        """
+        all_emails = [
+            email
+            for page in self.get_emails_paged(start_iso, end_iso)
+            for email in page
+        ]
         logger.info(f"Successfully converted {len(all_emails)} messages total.")
         return all_emails
 
-    def sync_all_emails(self, delta_link: str = None):
+    def sync_pages(self, delta_link: str = None):
         """
-        Sync all emails using Graph delta query for full mailbox history.
-        This is more efficient than date-range queries for initial sync.
+        Walk a Graph delta query one page at a time.
         
         Args:
             delta_link: Previous delta link to continue from (None for initial sync)
             
-        Returns:
-            Tuple of (list of EmailMetadata objects, new delta_link)
+        Yields:
+            Tuple of (list of EmailMetadata objects, new delta_link); the delta
+            link is only set on the final page
         """
         logger.info("Graph: Starting delta sync for all emails")
         self.authenticate()
@@ -215,89 +362,56 @@ class GraphConnector:
             )
             logger.info(f"Starting new delta sync")
 
-        all_emails = []
-        next_link = url
-        new_delta_link = None
-
-        while next_link:
-            response = requests.get(next_link, headers=self.headers())
-            if response.status_code != 200:
-                logger.error(f"Graph API Error: {response.status_code} - {response.text}")
-                break
-
-            data = response.json()
+        for data in self._iter_pages(url):
             messages = data.get("value", [])
             logger.info(f"Delta sync returned {len(messages)} messages in this page")
 
+            page = []
             for msg in messages:
                 try:
-                    received_dt = datetime.fromisoformat(
-                        msg["receivedDateTime"].replace("Z", "+00:00")
-                    )
-
-                    sender = msg.get("from", {}).get("emailAddress", {})
-                    sender_name = sender.get("name", "")
-                    sender_email = sender.get("address", "")
-
-                    to_list = [
-                        r["emailAddress"]["address"]
-                        for r in msg.get("toRecipients", [])
-                    ]
-                    to_field = ", ".join(to_list)
-
-                    cc_list = [
-                        r["emailAddress"]["address"]
-                        for r in msg.get("ccRecipients", [])
-                    ]
-                    cc_field = ", ".join(cc_list) if cc_list else None
-
-                    reply_to_list = [
-                        r["emailAddress"]["address"]
-                        for r in msg.get("replyTo", [])
-                    ]
-                    reply_to_field = ", ".join(reply_to_list) if reply_to_list else None
-
-                    body_content = msg.get("body", {}).get("content", "")
-                    body_preview = msg.get("bodyPreview", "")
-
-                    email_meta = EmailMetadata(
-                        AccountName=self.user_email,
-                        Entry_ID=msg["id"],
-                        Folder="Inbox",
-                        Subject=msg.get("subject", ""),
-                        SenderName=sender_name,
-                        SenderEmailAddress=sender_email,
-                        ReceivedTime=received_dt,
-                        SentOn=received_dt,
-                        To=to_field,
-                        Body=body_content,
-                        Attachments=[],
-                        IsMarkedAsTask=False,
-                        UnRead=False,
-                        Categories="",
-                        ConversationId=msg.get("conversationId"),
-                        ConversationIndex=msg.get("conversationIndex"),
-                        InternetMessageId=msg.get("internetMessageId"),
-                        InReplyTo=msg.get("inReplyTo"),
-                        CcRecipients=cc_field,
-                        ReplyTo=reply_to_field,
-                        BodyPreview=body_preview
-                    )
-
-                    all_emails.append(email_meta)
-
+                    page.append(self._to_email_metadata(msg))
                 except Exception as e:
                     logger.error(f"Error converting Graph email: {str(e)}")
                     continue
 
-            # Check for next page or delta link
-            next_link = data.get("@odata.nextLink")
-            if not next_link:
-                # Delta sync provides a deltaLink at the end
+            # Delta sync provides a deltaLink on the last page
+            new_delta_link = None
+            if not data.get("@odata.nextLink"):
                 new_delta_link = data.get("@odata.deltaLink")
                 if new_delta_link:
                     logger.info("Delta sync complete, received deltaLink for future syncs")
-                break
+
+            yield page, new_delta_link
+
+    async def sync_pages_async(self, delta_link: str = None):
+        """
+        Async variant of sync_pages that keeps blocking HTTP off the event loop.
+        
+        Args:
+            delta_link: Previous delta link to continue from (None for initial sync)
+            
+        Yields:
+            Tuple of (list of EmailMetadata objects, new delta_link or None)
+        """
+        async for item in self._iterate_async(self.sync_pages(delta_link)):
+            yield item
+
+    def sync_all_emails(self, delta_link: str = None):
+        """
+        Sync all emails using Graph delta query for full mailbox history.
+        This is more efficient than date-range queries for initial sync.
+        
+        Args:
+            delta_link: Previous delta link to continue from (None for initial sync)
+            
+        Returns:
+            Tuple of (list of EmailMetadata objects, new delta_link)
+        """
+        all_emails = []
+        new_delta_link = None
+        for page, page_delta_link in self.sync_pages(delta_link):
+            all_emails.extend(page)
+            new_delta_link = page_delta_link or new_delta_link
 
         logger.info(f"Delta sync complete: {len(all_emails)} messages total")
         return all_emails, new_delta_link
@@ -317,12 +431,12 @@ class GraphConnector:
             self.authenticate()
             url = f"https://graph.microsoft.com/v1.0/users/{self.user_email}/messages/{message_id}/attachments"
 
-            response = requests.get(url, headers=self.headers())
+            response = self._get(url)
             if response.status_code != 200:
                 logger.error(f"Error getting attachments: {response.status_code} - {response.text}")
                 return []
 
-            data = response.json()
+            data = orjson.loads(response.content)
             attachments = data.get("value", [])
 
             attachment_list = []
@@ -377,13 +491,13 @@ class GraphConnector:
             if attachment_type == 'itemAttachment':
                 # Get the attachment to get its name (which is usually the subject)
                 url = f"https://graph.microsoft.com/v1.0/users/{self.user_email}/messages/{message_id}/attachments/{attachment_id}"
-                response = requests.get(url, headers=self.headers())
+                response = self._get(url)
                 
                 if response.status_code != 200:
                     logger.error(f"Error getting itemAttachment: {response.status_code} - {response.text}")
                     return None
                 
-                attachment_data = response.json()
+                attachment_data = orjson.loads(response.content)
                 attachment_name = attachment_data.get('name', '')
                 
                 # For itemAttachments, the name is typically the subject of the embedded message
@@ -399,19 +513,19 @@ class GraphConnector:
                     f"&$orderby=receivedDateTime desc"
                 )
                 
-                search_response = requests.get(search_url, headers=self.headers())
+                search_response = self._get(search_url)
                 item = None
                 
                 if search_response.status_code == 200:
-                    search_data = search_response.json()
+                    search_data = orjson.loads(search_response.content)
                     messages = search_data.get('value', [])
                     if messages:
                         # Found matching message, get full details
                         found_msg_id = messages[0].get('id')
                         msg_url = f"https://graph.microsoft.com/v1.0/users/{self.user_email}/messages/{found_msg_id}?$select=subject,from,receivedDateTime,body,bodyPreview,toRecipients,ccRecipients"
-                        msg_response = requests.get(msg_url, headers=self.headers())
+                        msg_response = self._get(msg_url)
                         if msg_response.status_code == 200:
-                            item = msg_response.json()
+                            item = orjson.loads(msg_response.content)
                             logger.info(f"Found embedded message by exact subject match: {attachment_name}")
                 
                 # If exact match failed, try contains (for forwarded emails with "Fw:" prefix variations)
@@ -431,9 +545,9 @@ class GraphConnector:
                         f"&$orderby=receivedDateTime desc"
                     )
                     
-                    search_response = requests.get(search_url, headers=self.headers())
+                    search_response = self._get(search_url)
                     if search_response.status_code == 200:
-                        search_data = search_response.json()
+                        search_data = orjson.loads(search_response.content)
                         messages = search_data.get('value', [])
                         # Find the best match
                         for msg in messages:
@@ -443,9 +557,9 @@ class GraphConnector:
                                 msg_subject.lower() in clean_subject.lower()):
                                 found_msg_id = msg.get('id')
                                 msg_url = f"https://graph.microsoft.com/v1.0/users/{self.user_email}/messages/{found_msg_id}?$select=subject,from,receivedDateTime,body,bodyPreview,toRecipients,ccRecipients"
-                                msg_response = requests.get(msg_url, headers=self.headers())
+                                msg_response = self._get(msg_url)
                                 if msg_response.status_code == 200:
-                                    item = msg_response.json()
+                                    item = orjson.loads(msg_response.content)
                                     logger.info(f"Found embedded message by partial subject match: {attachment_name}")
                                     break
                 
@@ -509,7 +623,7 @@ Date: {received_time}
             else:
                 # For fileAttachments, download the binary content
                 url = f"https://graph.microsoft.com/v1.0/users/{self.user_email}/messages/{message_id}/attachments/{attachment_id}/$value"
-                response = requests.get(url, headers=self.headers())
+                response = self._get(url)
                 if response.status_code != 200:
                     logger.error(f"Error downloading attachment: {response.status_code} - {response.text}")
                     return None
@@ -5,12 +5,24 @@ from datetime import datetime
 import pytz
 from typing import List, Optional
 import logging
+import os
+import threading
+import time
 from EmailMetadata import EmailMetadata
 import re
 
 # Configure logging
 logger = logging.getLogger('outlook-email.imap')
 
+# Messages requested per FETCH command; 1 restores one round-trip per message
+IMAP_FETCH_WINDOW = max(1, int(os.getenv("IMAP_FETCH_WINDOW", "20")))
+
+# A reused connection is logged out after this many idle seconds (0 disables the timer)
+IMAP_IDLE_TIMEOUT = float(os.getenv("IMAP_IDLE_TIMEOUT", "300"))
+
+# Seconds to wait for the NOOP that checks a reused connection is still alive
+IMAP_NOOP_TIMEOUT = 5.0
+
 class IMAPConnector:
     def __init__(self, email_address: str, password: str, imap_server: str = "outlook.office365.com", imap_port: int = 993):
         """
@@ -27,6 +39,10 @@ class IMAPConnector:
         self.imap_server = imap_server
         self.imap_port = imap_port
         self.mail = None
+        # Guards self.mail between callers and the idle-disconnect timer
+        self._lock = threading.RLock()
+        self._last_used = 0.0
+        self._idle_timer: Optional[threading.Timer] = None
         
     def connect(self, max_retries: int = 3) -> bool:
         """
@@ -49,18 +65,79 @@ class IMAPConnector:
                 logger.error(f"Error connecting to IMAP server (attempt {attempt + 1}/{max_retries}): {str(e)}")
                 if attempt == max_retries - 1:
                     raise
-                import time
                 time.sleep(2)
         return False
     
+    def ensure_connected(self) -> bool:
+        """
+        Reuse the current authenticated connection, reconnecting only if it is gone.
+        
+        A NOOP with a short timeout checks that a kept connection is still
+        alive, which is far cheaper than a new TLS handshake and LOGIN.
+        
+        Returns:
+            bool: True if connected
+        """
+        with self._lock:
+            self._cancel_idle_timer()
+            if self.mail is not None:
+                try:
+                    sock = self.mail.sock
+                    previous_timeout = sock.gettimeout()
+                    sock.settimeout(IMAP_NOOP_TIMEOUT)
+                    try:
+                        self.mail.noop()
+                    finally:
+                        sock.settimeout(previous_timeout)
+                    return True
+                except Exception as e:
+                    logger.info(f"IMAP connection lost, reconnecting: {str(e)}")
+                    self._drop_connection()
+            return self.connect()
+    
+    def release(self) -> None:
+        """Mark the connection idle and schedule its logout after IMAP_IDLE_TIMEOUT."""
+        with self._lock:
+            self._last_used = time.monotonic()
+            self._cancel_idle_timer()
+            if self.mail is not None and IMAP_IDLE_TIMEOUT > 0:
+                self._idle_timer = threading.Timer(IMAP_IDLE_TIMEOUT, self._disconnect_if_idle)
+                self._idle_timer.daemon = True
+                self._idle_timer.start()
+    
+    def _disconnect_if_idle(self) -> None:
+        """Idle timer callback; skips the logout if the connection was used meanwhile."""
+        with self._lock:
+            if self.mail is not None and time.monotonic() - self._last_used >= IMAP_IDLE_TIMEOUT:
+                logger.info("Closing idle IMAP connection")
+                self.disconnect()
+    
+    def _cancel_idle_timer(self) -> None:
+        """Stop a pending idle disconnect."""
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+    
+    def _drop_connection(self) -> None:
+        """Forget a broken connection without a LOGOUT round-trip."""
+        try:
+            self.mail.shutdown()
+        except Exception:
+            pass
+        self.mail = None
+    
     def disconnect(self) -> None:
         """Disconnect from the IMAP server."""
-        try:
-            if self.mail:
-                self.mail.logout()
-                logger.info("Disconnected from IMAP server")
-        except Exception as e:
-            logger.error(f"Error disconnecting from IMAP server: {str(e)}")
+        with self._lock:
+            self._cancel_idle_timer()
+            try:
+                if self.mail:
+                    self.mail.logout()
+                    logger.info("Disconnected from IMAP server")
+            except Exception as e:
+                logger.error(f"Error disconnecting from IMAP server: {str(e)}")
+            finally:
+                self.mail = None
     
     @staticmethod
     def decode_mime_header(header_value: str) -> str:
@@ -143,6 +220,69 @@ class IMAPConnector:
             logger.error(f"Error parsing date '{date_str}': {str(e)}")
             return None
     
+    def _parse_message(
+        self, email_id: bytes, raw: bytes, start_utc: datetime, end_utc: datetime
+    ) -> Optional[EmailMetadata]:
+        """
+        Build EmailMetadata from a fetched RFC 822 message.
+        
+        Args:
+            email_id (bytes): IMAP sequence number of the message
+            raw (bytes): Full message source
+            start_utc (datetime): Start of the accepted date range
+            end_utc (datetime): End of the accepted date range
+            
+        Returns:
+            Optional[EmailMetadata]: Parsed email, or None if it has no date or falls outside the range
+        """
+        msg = email.message_from_bytes(raw)
+        
+        # Extract email metadata
+        subject = self.decode_mime_header(msg.get("Subject", ""))
+        from_header = self.decode_mime_header(msg.get("From", ""))
+        to_header = self.decode_mime_header(msg.get("To", ""))
+        date_header = msg.get("Date", "")
+        
+        # Parse date
+        received_time = self.parse_date(date_header)
+        if not received_time:
+            return None
+        
+        # Check if email is within date range
+        if not (start_utc <= received_time <= end_utc):
+            return None
+        
+        # Extract sender email from "From" header
+        sender_email = from_header
+        sender_name = from_header
+        if '<' in from_header and '>' in from_header:
+            sender_name = from_header.split('<')[0].strip()
+            sender_email = from_header.split('<')[1].split('>')[0].strip()
+        
+        # Get email body
+        body = self.get_email_body(msg)
+        
+        # Generate unique ID (use Message-ID if available)
+        message_id = msg.get("Message-ID", f"{email_id.decode()}_{date_header}")
+        
+        # Create EmailMetadata object
+        return EmailMetadata(
+            AccountName=self.email_address,
+            Entry_ID=message_id,
+            Folder="Inbox",
+            Subject=subject,
+            SenderName=sender_name,
+            SenderEmailAddress=sender_email,
+            ReceivedTime=received_time,
+            SentOn=received_time,  # Use received time as sent time
+            To=to_header,
+            Body=body,
+            Attachments=[],  # Attachments not extracted for now
+            IsMarkedAsTask=False,
+            UnRead=False,
+            Categories=""
+        )
+    
     def get_emails_within_date_range(
         self,
         folder_names: List[str],
@@ -164,10 +304,18 @@ class IMAPConnector:
         """
         email_data = []
         
+        # Held for the whole run so the idle timer cannot log out mid-fetch
+        with self._lock:
+            try:
+                return self._fetch_date_range(start_date, end_date, email_data)
+            finally:
+                self.release()
+    
+    def _fetch_date_range(self, start_date: str, end_date: str, email_data: List[EmailMetadata]) -> List[EmailMetadata]:
+        """Search INBOX and fetch the matching messages into email_data."""
         try:
-            # Connect if not already connected
-            if not self.mail:
-                self.connect()
+            # Reuse the kept connection when it is still alive
+            self.ensure_connected()
             
             # Select INBOX
             self.mail.select("INBOX")
@@ -199,70 +347,31 @@ class IMAPConnector:
             email_ids = messages[0].split()
             logger.info(f"Found {len(email_ids)} emails in INBOX")
             
-            for email_id in email_ids:
+            # One FETCH per window of messages: a single round-trip instead of one per email.
+            # BODY.PEEK[] leaves the \Seen flag alone, unlike RFC822.
+            for i in range(0, len(email_ids), IMAP_FETCH_WINDOW):
+                window = email_ids[i:i + IMAP_FETCH_WINDOW]
                 try:
-                    # Fetch email
-                    status, msg_data = self.mail.fetch(email_id, "(RFC822)")
-                    
-                    if status != "OK":
-                        continue
-                    
-                    # Parse email
-                    for response_part in msg_data:
-                        if isinstance(response_part, tuple):
-                            msg = email.message_from_bytes(response_part[1])
-                            
-                            # Extract email metadata
-                            subject = self.decode_mime_header(msg.get("Subject", ""))
-                            from_header = self.decode_mime_header(msg.get("From", ""))
-                            to_header = self.decode_mime_header(msg.get("To", ""))
-                            date_header = msg.get("Date", "")
-                            
-                            # Parse date
-                            received_time = self.parse_date(date_header)
-                            if not received_time:
-                                continue
-                            
-                            # Check if email is within date range
-                            if not (start_utc <= received_time <= end_utc):
-                                continue
-                            
-                            # Extract sender email from "From" header
-                            sender_email = from_header
-                            sender_name = from_header
-                            if '<' in from_header and '>' in from_header:
-                                sender_name = from_header.split('<')[0].strip()
-                                sender_email = from_header.split('<')[1].split('>')[0].strip()
-                            
-                            # Get email body
-                            body = self.get_email_body(msg)
-                            
-                            # Generate unique ID (use Message-ID if available)
-                            message_id = msg.get("Message-ID", f"{email_id.decode()}_{date_header}")
-                            
-                            # Create EmailMetadata object
-                            email_metadata = EmailMetadata(
-                                AccountName=self.email_address,
-                                Entry_ID=message_id,
-                                Folder="Inbox",
-                                Subject=subject,
-                                SenderName=sender_name,
-                                SenderEmailAddress=sender_email,
-                                ReceivedTime=received_time,
-                                SentOn=received_time,  # Use received time as sent time
-                                To=to_header,
-                                Body=body,
-                                Attachments=[],  # Attachments not extracted for now
-                                IsMarkedAsTask=False,
-                                UnRead=False,
-                                Categories=""
-                            )
-                            
-                            email_data.append(email_metadata)
-                            
+                    status, msg_data = self.mail.fetch(b','.join(window), "(BODY.PEEK[])")
                 except Exception as e:
-                    logger.error(f"Error processing email {email_id}: {str(e)}")
+                    logger.error(f"Error fetching emails {window[0].decode()}-{window[-1].decode()}: {str(e)}")
+                    continue
+                
+                if status != "OK":
                     continue
+                
+                # Responses are matched to messages by the sequence number they carry
+                for response_part in msg_data:
+                    if not isinstance(response_part, tuple):
+                        continue
+                    email_id = response_part[0].split()[0]
+                    try:
+                        email_metadata = self._parse_message(email_id, response_part[1], start_utc, end_utc)
+                        if email_metadata is not None:
+                            email_data.append(email_metadata)
+                    except Exception as e:
+                        logger.error(f"Error processing email {email_id}: {str(e)}")
+                        continue
             
             logger.info(f"Successfully retrieved {len(email_data)} emails")
             
@@ -291,5 +400,6 @@ class IMAPConnector:
     
     def __del__(self):
         """Destructor to ensure connection is closed."""
-        self.disconnect()
+        if hasattr(self, '_lock'):
+            self.disconnect()
 
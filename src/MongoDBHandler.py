@@ -1,13 +1,258 @@
+import hashlib
+import heapq
+import importlib.util
 import logging
+import math
+import os
+import random
+import threading
 import time
-from typing import List, Dict, Any, Optional
-from pymongo import MongoClient
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from bson.binary import Binary
+from pymongo import MongoClient, UpdateOne
 from pymongo.collection import Collection
-from pymongo.errors import DuplicateKeyError
+from pymongo.errors import BulkWriteError, ConnectionFailure, DuplicateKeyError, PyMongoError
+from pymongo.operations import SearchIndexModel
+from pymongo.write_concern import WriteConcern
 
 # Configure logging
 logger = logging.getLogger('outlook-email.mongodb')
 
+try:
+    # BSON vector subtype (pymongo >= 4.10), the only binary form Atlas Vector Search indexes
+    from bson.binary import BinaryVectorDtype, VECTOR_SUBTYPE
+except ImportError:
+    BinaryVectorDtype = None
+    VECTOR_SUBTYPE = None
+
+# Email embeddings are stored int8-quantized; chunk and attachment vectors stay float16
+EMAIL_EMBEDDING_DTYPE = 'int8'
+
+# Atlas Vector Search index on email embeddings; empty disables server-side search
+VECTOR_SEARCH_INDEX = os.getenv('MONGODB_VECTOR_INDEX', '')
+
+# Connection pool per client; sized for concurrent embedding slices plus API requests
+MONGODB_MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', '50'))
+
+
+def _default_compressors() -> str:
+    """Wire compressors in preference order, limited to those installed (zlib is built in)."""
+    available = [
+        name for name, module in (('zstd', 'zstandard'), ('snappy', 'snappy'))
+        if importlib.util.find_spec(module) is not None
+    ]
+    return ','.join(available + ['zlib'])
+
+
+# Compresses embedding-heavy responses on the wire; the server picks the first it supports
+MONGODB_COMPRESSORS = os.getenv('MONGODB_COMPRESSORS') or _default_compressors()
+
+# Index keys covering the reranker's embedding lookup by id, so it is answered from the index alone
+EMBEDDING_COVERING_INDEX = 'id_embedding_cov'
+EMBEDDING_COVERING_FIELDS = ('id', 'embedding', 'embedding_dtype', 'embedding_scale', 'normalized', 'dim')
+
+# Sizing of the in-process filter of email IDs known to be stored
+ID_FILTER_CAPACITY = 100_000
+ID_FILTER_ERROR_RATE = 0.001
+
+# Upserts per bulk_write; keeps each request well under MongoDB's 16 MB / 100k-op limits
+MONGODB_BULK_BATCH = int(os.getenv('MONGODB_BULK_BATCH', '500'))
+
+# 'bulk' for initial backfills: email upserts are acknowledged by the primary without
+# waiting for the journal commit, so batches are not paced by journal flushes
+INGEST_MODE = os.getenv('INGEST_MODE', 'stream').lower()
+
+# Backoff between bulk_write retries: base * 2**attempt seconds, capped, with +/-50% jitter
+BULK_RETRY_BASE_DELAY = 0.1
+BULK_RETRY_MAX_DELAY = 2.0
+
+
+def _is_transient(error: Exception) -> bool:
+    """Whether a write error is worth retrying (network trouble or a server-labelled retryable write)."""
+    if isinstance(error, ConnectionFailure):
+        return True
+    return isinstance(error, PyMongoError) and error.has_error_label('RetryableWriteError')
+
+
+def encode_embedding(embedding, dtype: str = 'float16') -> Dict[str, Any]:
+    """
+    Pack an embedding vector into compact BSON fields.
+
+    With dtype 'int8' the vector is quantized symmetrically: each component is
+    stored as round(v / scale) with scale = max(|v|) / 127. When the driver
+    supports it, int8 vectors use the BSON vector subtype so an Atlas vector
+    index can serve them; the scale does not change cosine similarity.
+
+    Args:
+        embedding: Embedding as a NumPy array or list of floats
+        dtype: Storage dtype for the packed vector ('float16', 'float32' or 'int8')
+
+    Returns:
+        Dict[str, Any]: Document fields (embedding, embedding_dtype, dim and
+        embedding_scale for int8) to merge into a document
+    """
+    if dtype == 'int8':
+        vec = np.asarray(embedding, dtype=np.float32)
+        if vec.size == 0:
+            return {'embedding': [], 'dim': 0}
+        scale = float(np.abs(vec).max()) / 127.0 or 1.0
+        quantized = np.round(vec / scale).astype(np.int8)
+        if BinaryVectorDtype is not None:
+            packed = Binary.from_vector(quantized, BinaryVectorDtype.INT8)
+        else:
+            packed = Binary(quantized.tobytes())
+        return {
+            'embedding': packed,
+            'embedding_dtype': 'int8',
+            'embedding_scale': scale,
+            'dim': int(vec.size)
+        }
+    vec = np.asarray(embedding, dtype=dtype)
+    if vec.size == 0:
+        return {'embedding': [], 'dim': 0}
+    return {
+        'embedding': Binary(vec.tobytes()),
+        'embedding_dtype': dtype,
+        'dim': int(vec.size)
+    }
+
+
+def decode_embedding(doc: Dict[str, Any]) -> np.ndarray:
+    """
+    Unpack the embedding stored on a document into a float32 vector.
+
+    Handles packed Binary vectors (including int8 with a scale) as well as
+    legacy BSON arrays of doubles.
+
+    Args:
+        doc: MongoDB document with an 'embedding' field
+
+    Returns:
+        np.ndarray: float32 vector (empty if the document has no embedding)
+    """
+    embedding = doc.get('embedding')
+    if isinstance(embedding, bytes):
+        # BSON vectors carry a 2-byte dtype/padding header before the data
+        vec = np.frombuffer(
+            embedding, dtype=doc.get('embedding_dtype', 'float16'),
+            offset=_vector_offset(embedding)
+        ).astype(np.float32)
+        if 'embedding_scale' in doc:
+            vec *= doc['embedding_scale']
+        return vec
+    return np.asarray(embedding or [], dtype=np.float32)
+
+
+def _vector_offset(embedding) -> int:
+    """Length of the BSON vector header in front of a packed embedding."""
+    return 2 if isinstance(embedding, Binary) and embedding.subtype == VECTOR_SUBTYPE else 0
+
+
+def embedding_dim(doc: Dict[str, Any]) -> int:
+    """Dimension of the embedding stored on a document, without decoding it."""
+    embedding = doc.get('embedding')
+    if isinstance(embedding, bytes):
+        return doc.get('dim') or len(decode_embedding(doc))
+    return len(embedding or [])
+
+
+def decode_embedding_matrix(docs: List[Dict[str, Any]]) -> np.ndarray:
+    """
+    Unpack the embeddings of several documents into one float32 matrix.
+
+    When every vector is int8, the raw bytes are joined into one contiguous
+    (N, dim) int8 buffer and dequantized in a single multiply instead of
+    once per document.
+
+    Args:
+        docs: MongoDB documents whose embeddings share one dimension
+
+    Returns:
+        np.ndarray: (len(docs), dim) float32 matrix
+    """
+    if docs and all(
+        isinstance(doc.get('embedding'), bytes) and doc.get('embedding_dtype') == 'int8'
+        for doc in docs
+    ):
+        packed = b''.join([doc['embedding'][_vector_offset(doc['embedding']):] for doc in docs])
+        quantized = np.frombuffer(packed, dtype=np.int8).reshape(len(docs), -1)
+        scales = np.array([doc.get('embedding_scale', 1.0) for doc in docs], dtype=np.float32)
+        matrix = quantized.astype(np.float32)
+        matrix *= scales[:, None]
+        return matrix
+    return np.stack([decode_embedding(doc) for doc in docs])
+
+
+def normalize_embedding(embedding) -> np.ndarray:
+    """
+    Scale an embedding to unit length so cosine similarity is a dot product.
+
+    Args:
+        embedding: Embedding as a NumPy array or list of floats
+
+    Returns:
+        np.ndarray: float32 unit vector (all zeros stays all zeros)
+    """
+    vec = np.asarray(embedding, dtype=np.float32)
+    return vec / (np.linalg.norm(vec) + 1e-12)
+
+
+class IdBloomFilter:
+    """
+    Scalable Bloom filter over string IDs.
+
+    Membership tests have no false negatives and about error_rate false
+    positives. Each time the current layer reaches its capacity, a new
+    layer with twice the capacity and a tighter error rate is added, so
+    the overall rate stays near error_rate as the filter grows.
+    """
+
+    def __init__(self, capacity: int = ID_FILTER_CAPACITY, error_rate: float = ID_FILTER_ERROR_RATE):
+        self._capacity = capacity
+        self._error_rate = error_rate
+        self._layers: List[Tuple[np.ndarray, int, int, int]] = []  # (bits, num_bits, num_hashes, capacity)
+        self._count = 0
+        self._add_layer()
+
+    def _add_layer(self) -> None:
+        """Start a new layer; each one halves the error rate of the previous."""
+        capacity = self._capacity * 2 ** len(self._layers)
+        error_rate = self._error_rate / 2 ** (len(self._layers) + 1)
+        num_bits = int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+        self._layers.append((np.zeros((num_bits + 7) // 8, dtype=np.uint8), num_bits, num_hashes, capacity))
+        self._count = 0
+
+    @staticmethod
+    def _positions(item: str, num_bits: int, num_hashes: int) -> np.ndarray:
+        """Bit positions for an item by double hashing one 128-bit digest."""
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return np.array([(h1 + i * h2) % num_bits for i in range(num_hashes)], dtype=np.int64)
+
+    def add(self, item: str) -> None:
+        """Add an ID to the filter."""
+        if item in self:
+            return
+        bits, num_bits, num_hashes, capacity = self._layers[-1]
+        if self._count >= capacity:
+            self._add_layer()
+            bits, num_bits, num_hashes, capacity = self._layers[-1]
+        positions = self._positions(item, num_bits, num_hashes)
+        # .at applies every position, even several landing in the same byte
+        np.bitwise_or.at(bits, positions >> 3, (1 << (positions & 7)).astype(np.uint8))
+        self._count += 1
+
+    def __contains__(self, item: str) -> bool:
+        for bits, num_bits, num_hashes, _ in self._layers:
+            positions = self._positions(item, num_bits, num_hashes)
+            if np.all(bits[positions >> 3] & (1 << (positions & 7)).astype(np.uint8)):
+                return True
+        return False
+
+
 class MongoDBHandler:
     def __init__(self, connection_string: str, collection_name: str) -> None:
         """
@@ -19,12 +264,32 @@ class MongoDBHandler:
         """
         try:
             logger.info(f"Initializing MongoDB connection")
-            self.client = MongoClient(connection_string)
+            self.client = MongoClient(
+                connection_string,
+                maxPoolSize=MONGODB_MAX_POOL_SIZE,
+                compressors=MONGODB_COMPRESSORS
+            )
             self.db = self.client.get_database()
             self.collection_name = collection_name
+            # Email IDs known to be stored; filled from the id index by load_known_ids
+            self._known_ids: Optional[IdBloomFilter] = None
+            self._known_ids_loading: Optional[IdBloomFilter] = None
+            self._known_ids_lock = threading.Lock()
             self.collection = self._get_or_create_collection()
+            # Embedding upserts go through this view; same collection, bulk-mode write concern
+            self._upsert_collection = (
+                self.collection.with_options(write_concern=WriteConcern(w=1, j=False))
+                if INGEST_MODE == 'bulk' else self.collection
+            )
             # Create index on id field
             self.collection.create_index("id", unique=True)
+            # Covering index for vector lookups; partial on packed vectors so legacy
+            # array embeddings do not make it multikey (which would prevent covering)
+            self.collection.create_index(
+                [(field, 1) for field in EMBEDDING_COVERING_FIELDS],
+                name=EMBEDDING_COVERING_INDEX,
+                partialFilterExpression={'embedding': {'$type': 'binData'}}
+            )
 
             # Initialize attachment and chunk collections
             self.attachments_collection = self.db[f"{collection_name}_attachments"]
@@ -54,7 +319,11 @@ class MongoDBHandler:
 
     def add_embeddings(self, embeddings: List[Dict[str, Any]], job_id: Optional[str] = None) -> bool:
         """
-        Add embeddings to the MongoDB collection.
+        Upsert embeddings into the MongoDB collection.
+
+        Documents are written with unordered bulk_write calls of up to
+        MONGODB_BULK_BATCH upserts keyed on 'id', so one failing document
+        does not block the rest of its batch.
 
         Args:
             embeddings (List[Dict]): List of embeddings to add
@@ -64,70 +333,230 @@ class MongoDBHandler:
             bool: True if embeddings were added successfully
         """
         try:
-            # Filter out embeddings with existing IDs
-            new_embeddings = []
+            ops = []
             for embedding in embeddings:
                 if not all(k in embedding for k in ['id', 'embedding', 'document', 'metadata']):
                     raise ValueError("Missing required fields in embedding")
                 
-                try:
-                    # Check if ID already exists
-                    if not self.email_exists(str(embedding['id'])):
-                        # Initialize and sanitize metadata
-                        embedding['metadata'] = embedding.get('metadata', {})
-                        # Ensure all metadata values are primitive types or allowed dicts
-                        for key, value in embedding['metadata'].items():
-                            # Keep 'analysis' as dict for structured storage
-                            if key == 'analysis' and isinstance(value, dict):
-                                continue
-                            elif isinstance(value, (list, dict)):
-                                embedding['metadata'][key] = str(value)
-                            elif value is None:
-                                embedding['metadata'][key] = ''
-                        new_embeddings.append(embedding)
-                except Exception as e:
-                    logger.warning(f"Error checking email existence: {str(e)}")
-                    continue
+                # Initialize and sanitize metadata
+                metadata = embedding.get('metadata') or {}
+                # Ensure all metadata values are primitive types or allowed dicts
+                for key, value in metadata.items():
+                    # Keep 'analysis' as dict for structured storage
+                    if key == 'analysis' and isinstance(value, dict):
+                        continue
+                    elif isinstance(value, (list, dict)):
+                        metadata[key] = str(value)
+                    elif value is None:
+                        metadata[key] = ''
+                embedding['metadata'] = metadata
+                
+                ops.append(UpdateOne(
+                    {'id': str(embedding['id'])},
+                    {'$set': {
+                        **encode_embedding(
+                            normalize_embedding(embedding['embedding']),
+                            dtype=EMAIL_EMBEDDING_DTYPE
+                        ),
+                        'normalized': True,
+                        'document': embedding['document'],
+                        'metadata': metadata
+                    }},
+                    upsert=True
+                ))
             
-            if not new_embeddings:
+            if not ops:
                 logger.info("No new embeddings to add")
                 return True
             
-            logger.info(f"Adding {len(new_embeddings)} embeddings to MongoDB")
-            
-            # Add embeddings with retry logic
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    # Convert embeddings to MongoDB documents
-                    documents = []
-                    for embedding in new_embeddings:
-                        doc = {
-                            'id': str(embedding['id']),
-                            'embedding': embedding['embedding'],
-                            'document': embedding['document'],
-                            'metadata': embedding['metadata']
-                        }
-                        documents.append(doc)
-                    
-                    # Insert documents
-                    self.collection.insert_many(documents)
-                    logger.info("Successfully added embeddings to MongoDB")
-                    return True
-                except DuplicateKeyError:
-                    logger.warning("Duplicate key found, skipping those documents")
-                    return True
-                except Exception as e:
-                    if attempt == max_retries - 1:
-                        logger.error(f"Failed to add embeddings after {max_retries} attempts: {str(e)}")
-                        return False
-                    logger.warning(f"Retry {attempt + 1}/{max_retries} adding embeddings: {str(e)}")
-                    time.sleep(1)  # Wait before retry
+            logger.info(f"Upserting {len(ops)} embeddings to MongoDB")
+            for i in range(0, len(ops), MONGODB_BULK_BATCH):
+                if not self._bulk_upsert(ops[i:i + MONGODB_BULK_BATCH]):
+                    return False
+                self._remember_ids(str(embedding['id']) for embedding in embeddings[i:i + MONGODB_BULK_BATCH])
+            logger.info("Successfully added embeddings to MongoDB")
+            return True
             
         except Exception as e:
             logger.error(f"Error adding embeddings: {str(e)}", exc_info=True)
             return False
 
+    def _bulk_upsert(self, ops: List[UpdateOne], max_retries: int = 3) -> bool:
+        """
+        Run one unordered bulk_write of email upserts with retry logic.
+
+        Duplicate-key errors come from concurrent upserts of the same id and
+        leave the document in place, so they count as success. Other write
+        errors are per-document and would fail again, so they are not
+        retried. Connection failures and retryable-labelled errors are
+        retried with jittered exponential backoff; upserts are idempotent,
+        which makes re-sending the whole batch safe.
+
+        Args:
+            ops (List[UpdateOne]): Upsert operations for one batch
+            max_retries (int): Maximum number of attempts
+
+        Returns:
+            bool: True if every document in the batch was written
+        """
+        for attempt in range(max_retries):
+            try:
+                self._upsert_collection.bulk_write(ops, ordered=False)
+                return True
+            except BulkWriteError as e:
+                errors = e.details.get('writeErrors', [])
+                if errors and all(err.get('code') == 11000 for err in errors):
+                    logger.warning(f"Skipped {len(errors)} duplicate embeddings")
+                    return True
+                logger.error(f"Failed to add embeddings: {len(errors)} write errors: {errors[:3]}")
+                return False
+            except Exception as e:
+                if not _is_transient(e):
+                    logger.error(f"Failed to add embeddings: {str(e)}", exc_info=True)
+                    return False
+                if attempt == max_retries - 1:
+                    logger.error(f"Failed to add embeddings after {max_retries} attempts: {str(e)}")
+                    return False
+                logger.warning(f"Retry {attempt + 1}/{max_retries} adding embeddings: {str(e)}")
+            delay = min(BULK_RETRY_MAX_DELAY, BULK_RETRY_BASE_DELAY * 2 ** attempt)
+            time.sleep(delay * random.uniform(0.5, 1.5))
+        return False
+
+    def ensure_vector_search_index(self, name: str, num_dimensions: int) -> bool:
+        """
+        Create the Atlas Vector Search index on email embeddings if it is missing.
+
+        The index scores by cosine similarity and lets queries filter on 'id'.
+        Only Atlas clusters support search indexes; elsewhere this logs and
+        returns False.
+
+        Args:
+            name (str): Search index name
+            num_dimensions (int): Embedding dimension
+
+        Returns:
+            bool: True if the index exists or was created
+        """
+        try:
+            if any(index.get('name') == name for index in self.collection.list_search_indexes(name)):
+                return True
+            self.collection.create_search_index(SearchIndexModel(
+                definition={'fields': [
+                    {'type': 'vector', 'path': 'embedding',
+                     'numDimensions': num_dimensions, 'similarity': 'cosine'},
+                    {'type': 'filter', 'path': 'id'}
+                ]},
+                name=name,
+                type='vectorSearch'
+            ))
+            logger.info(f"Created vector search index '{name}' ({num_dimensions} dims)")
+            return True
+        except Exception as e:
+            logger.warning(f"Vector search index '{name}' unavailable: {str(e)}")
+            return False
+
+    def normalize_stored_embeddings(self, batch_size: int = 500) -> int:
+        """
+        Rewrite email embeddings stored before normalization to unit length.
+
+        Documents are read in batches and updated with one bulk_write per
+        batch, keeping each vector's storage dtype.
+
+        Args:
+            batch_size (int): Documents per read and bulk write
+
+        Returns:
+            int: Number of documents updated
+        """
+        updated = 0
+        try:
+            projection = {'embedding': 1, 'embedding_dtype': 1, 'embedding_scale': 1}
+            cursor = self.collection.find(
+                {'normalized': {'$ne': True}, 'embedding': {'$exists': True}},
+                projection=projection,
+                batch_size=batch_size
+            )
+            ops = []
+            for doc in cursor:
+                vec = decode_embedding(doc)
+                dtype = doc.get('embedding_dtype', 'float16') if isinstance(doc['embedding'], bytes) else EMAIL_EMBEDDING_DTYPE
+                fields = encode_embedding(normalize_embedding(vec), dtype=dtype)
+                ops.append(UpdateOne({'_id': doc['_id']}, {'$set': {**fields, 'normalized': True}}))
+                if len(ops) >= batch_size:
+                    updated += self.collection.bulk_write(ops, ordered=False).modified_count
+                    ops = []
+            if ops:
+                updated += self.collection.bulk_write(ops, ordered=False).modified_count
+            logger.info(f"Normalized {updated} stored email embeddings")
+            return updated
+        except Exception as e:
+            logger.error(f"Error normalizing stored embeddings: {str(e)}", exc_info=True)
+            return updated
+
+    def _remember_ids(self, ids) -> None:
+        """Record stored email IDs in the known-ID filter, loaded or still loading."""
+        with self._known_ids_lock:
+            known = self._known_ids if self._known_ids is not None else self._known_ids_loading
+            if known is not None:
+                for entry_id in ids:
+                    known.add(entry_id)
+
+    def load_known_ids(self) -> bool:
+        """
+        Build the known-ID filter from the id index.
+
+        Meant to run once at startup on a background thread. The scan holds
+        the filter lock only while adding each batch, so queries are never
+        stuck behind it; until it finishes, filter_known_ids passes IDs through.
+
+        Returns:
+            bool: True if the filter was loaded, False otherwise
+        """
+        known = IdBloomFilter()
+        with self._known_ids_lock:
+            self._known_ids_loading = known
+        try:
+            batch = []
+            for doc in self.collection.find({}, {'id': 1, '_id': 0}):
+                batch.append(str(doc['id']))
+                if len(batch) >= MONGODB_BULK_BATCH:
+                    with self._known_ids_lock:
+                        for entry_id in batch:
+                            known.add(entry_id)
+                    batch = []
+            with self._known_ids_lock:
+                for entry_id in batch:
+                    known.add(entry_id)
+                self._known_ids = known
+                self._known_ids_loading = None
+            logger.info("Loaded known email IDs filter")
+            return True
+        except Exception as e:
+            logger.error(f"Error loading known email IDs: {str(e)}", exc_info=True)
+            with self._known_ids_lock:
+                self._known_ids_loading = None
+            return False
+
+    def filter_known_ids(self, entry_ids: List[str]) -> List[str]:
+        """
+        Drop IDs that have certainly never been stored, without a query.
+
+        The filter is built by load_known_ids and updated by this process's
+        upserts; before it is loaded every ID is passed through. Emails stored
+        by another process after the load are not in it, so only use this
+        where a missed ID is harmless.
+
+        Args:
+            entry_ids (List[str]): Email IDs to check
+
+        Returns:
+            List[str]: IDs that may be stored, in input order
+        """
+        with self._known_ids_lock:
+            if self._known_ids is None:
+                return list(entry_ids)
+            return [entry_id for entry_id in entry_ids if entry_id in self._known_ids]
+
     def email_exists(self, entry_id: str) -> bool:
         """
         Check if an email entry exists.
@@ -189,15 +618,13 @@ class MongoDBHandler:
                 - binary_data: file bytes
                 - metadata: attachment metadata (mime_type, file_size, etc.)
                 - extracted_text: extracted text content
-                - embedding: embedding vector
+                - embedding: embedding vector (stored packed as float16)
                 - chunk_ids: list of chunk IDs
 
         Returns:
             bool: True if successful
         """
         try:
-            from bson.binary import Binary
-
             doc = {
                 'id': str(attachment_data['id']),
                 'email_id': str(attachment_data['email_id']),
@@ -205,7 +632,7 @@ class MongoDBHandler:
                 'binary_data': Binary(attachment_data['binary_data']),
                 'metadata': attachment_data.get('metadata', {}),
                 'extracted_text': attachment_data.get('extracted_text', ''),
-                'embedding': attachment_data.get('embedding', []),
+                **encode_embedding(attachment_data.get('embedding', [])),
                 'chunk_ids': attachment_data.get('chunk_ids', [])
             }
 
@@ -250,7 +677,7 @@ class MongoDBHandler:
                 - chunk_number: chunk sequence number
                 - total_chunks: total number of chunks
                 - text: chunk text content
-                - embedding: embedding vector
+                - embedding: embedding vector (stored packed as float16)
                 - metadata: additional chunk metadata
 
         Returns:
@@ -269,15 +696,20 @@ class MongoDBHandler:
                     'chunk_number': chunk['chunk_number'],
                     'total_chunks': chunk['total_chunks'],
                     'text': chunk['text'],
-                    'embedding': chunk['embedding'],
+                    **encode_embedding(chunk['embedding']),
                     'metadata': chunk.get('metadata', {})
                 }
                 documents.append(doc)
 
-            self.chunks_collection.insert_many(documents)
+            # Unordered so an existing chunk does not stop the rest from being inserted
+            self.chunks_collection.insert_many(documents, ordered=False)
             logger.info(f"Added {len(documents)} chunk embeddings to MongoDB")
             return True
-        except DuplicateKeyError:
+        except (DuplicateKeyError, BulkWriteError) as e:
+            errors = e.details.get('writeErrors', []) if isinstance(e, BulkWriteError) else []
+            if any(err.get('code') != 11000 for err in errors):
+                logger.error(f"Error adding chunk embeddings: {errors[:3]}")
+                return False
             logger.warning("Some chunks already exist, skipping duplicates")
             return True
         except Exception as e:
@@ -302,25 +734,27 @@ class MongoDBHandler:
             chunks = list(self.chunks_collection.find({}, {'_id': 0}))
 
             # Calculate cosine similarity
-            import numpy as np
-
-            query_vec = np.array(query_embedding)
+            query_vec = np.asarray(query_embedding, dtype=np.float32)
             query_norm = np.linalg.norm(query_vec)
 
-            results = []
+            scored = []
             for chunk in chunks:
-                if 'embedding' in chunk and chunk['embedding']:
-                    chunk_vec = np.array(chunk['embedding'])
+                chunk_vec = decode_embedding(chunk)
+                if chunk_vec.size:
                     chunk_norm = np.linalg.norm(chunk_vec)
 
                     if query_norm > 0 and chunk_norm > 0:
                         similarity = np.dot(query_vec, chunk_vec) / (query_norm * chunk_norm)
                         chunk['similarity'] = float(similarity)
-                        results.append(chunk)
+                        scored.append((chunk, chunk_vec))
 
-            # Sort by similarity and return top_k
-            results.sort(key=lambda x: x['similarity'], reverse=True)
-            return results[:top_k]
+            # Keep only the top_k (O(N log K)); same order as a stable full sort
+            top = heapq.nlargest(top_k, scored, key=lambda item: item[0]['similarity'])
+            results = []
+            for chunk, chunk_vec in top:
+                chunk['embedding'] = chunk_vec.tolist()
+                results.append(chunk)
+            return results
 
         except Exception as e:
             logger.error(f"Error searching chunks: {str(e)}", exc_info=True)
@@ -1,11 +1,20 @@
+import asyncio
+import queue
 import sqlite3
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Any, Optional, Tuple
+from itertools import groupby
+from operator import itemgetter
+from typing import Callable, Iterator, List, Dict, Any, Optional, Tuple
 import json
 import sys
 import logging
 import time
 import os
+import numpy as np
+import orjson
 from src.EmailMetadata import EmailMetadata
 
 import logging
@@ -13,6 +22,159 @@ import logging
 # Configure logging
 logger = logging.getLogger('outlook-email.sqlite')
 
+# Column order of EMAIL_UPSERT_SQL parameters (see _email_params)
+EMAIL_COLUMNS = (
+    'id', 'account', 'folder', 'subject', 'sender_name', 'sender_email',
+    'received_time', 'sent_time', 'recipients', 'is_task', 'unread',
+    'categories', 'processed', 'last_updated', 'body', 'attachments',
+    'conversation_id', 'conversation_index', 'internet_message_id'
+)
+
+# Upsert used by the bulk and writer-thread email paths; keeps the processed flag.
+# Positional parameters bind faster than named ones in executemany.
+EMAIL_UPSERT_SQL = '''
+    INSERT INTO emails (
+        id, account, folder, subject, sender_name, sender_email,
+        received_time, sent_time, recipients, is_task, unread,
+        categories, processed, last_updated, body, attachments,
+        conversation_id, conversation_index, internet_message_id
+    ) VALUES (
+        ?, ?, ?, ?, ?, ?,
+        ?, ?, ?, ?, ?,
+        ?, ?, ?, ?, ?,
+        ?, ?, ?
+    )
+    ON CONFLICT(id) DO UPDATE SET
+        account = excluded.account,
+        folder = excluded.folder,
+        subject = excluded.subject,
+        sender_name = excluded.sender_name,
+        sender_email = excluded.sender_email,
+        received_time = excluded.received_time,
+        sent_time = excluded.sent_time,
+        recipients = excluded.recipients,
+        is_task = excluded.is_task,
+        unread = excluded.unread,
+        categories = excluded.categories,
+        last_updated = excluded.last_updated,
+        body = excluded.body,
+        attachments = excluded.attachments,
+        conversation_id = excluded.conversation_id,
+        conversation_index = excluded.conversation_index,
+        internet_message_id = excluded.internet_message_id
+'''
+
+# Attachments with extracted text for an IN (...) list of email IDs, longest first
+EXTRACTED_ATTACHMENTS_SQL = '''
+    SELECT email_id, filename, extracted_text, mime_type, text_length
+    FROM attachments
+    WHERE email_id IN ({placeholders})
+    AND extracted_text IS NOT NULL AND extracted_text != ''
+    ORDER BY text_length DESC
+'''
+
+# Newest-first page of the email listing; answered from idx_recent_listing alone
+RECENT_EMAILS_SQL = '''
+    SELECT id, subject, sender_name, sender_email, received_time, folder
+    FROM emails
+    ORDER BY received_time DESC
+    LIMIT ? OFFSET ?
+'''
+
+# Prepared statements kept per connection (sqlite3 default is 128) and page cache size
+STATEMENT_CACHE_SIZE = 256
+PAGE_CACHE_KIB = 65536
+
+# Bytes of the database file memory-mapped for reads
+MMAP_SIZE = 256 * 1024 * 1024
+
+# NORMAL is durable under WAL except for the last commits before a power loss;
+# set SQLITE_SYNCHRONOUS=FULL where that window matters
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL').upper()
+if SQLITE_SYNCHRONOUS not in ('OFF', 'NORMAL', 'FULL', 'EXTRA'):
+    SQLITE_SYNCHRONOUS = 'NORMAL'
+
+# What to do when the database file is corrupt: 'raise', or 'recreate' to move
+# it aside and start from an empty database
+SQLITE_CORRUPTED_BEHAVIOR = os.getenv('SQLITE_CORRUPTED_BEHAVIOR', 'raise').lower()
+
+# IDs bound per IN (...) list; SQLite builds before 3.32 cap parameters at 999
+MAX_IN_PARAMS = 900
+
+# Writer thread commits whatever is queued every WRITE_FLUSH_INTERVAL seconds or
+# WRITE_BATCH_SIZE statements, whichever comes first
+WRITE_FLUSH_INTERVAL = 0.05
+WRITE_BATCH_SIZE = 500
+
+def _in_chunks(values: List[Any]) -> Iterator[List[Any]]:
+    """Split values into slices that fit one IN (...) list."""
+    for i in range(0, len(values), MAX_IN_PARAMS):
+        yield values[i:i + MAX_IN_PARAMS]
+
+
+def _padded_chunk(chunk: List[Any]) -> List[Any]:
+    """
+    Pad an IN (...) list to a power-of-two length by repeating its last value.
+
+    Repeats do not change an IN match, and the fixed lengths keep the SQL text
+    identical across calls so the connection's statement cache can reuse it.
+    """
+    size = 8
+    while size < len(chunk):
+        size *= 2
+    size = min(size, MAX_IN_PARAMS)
+    return chunk + chunk[-1:] * (size - len(chunk))
+
+
+def _mark_processed(conn: sqlite3.Connection, email_ids: List[str]) -> None:
+    """Flag emails as processed on conn without committing."""
+    now = datetime.now().isoformat()
+    for chunk in _in_chunks(email_ids):
+        conn.execute(f'''
+        UPDATE emails 
+        SET processed = TRUE, 
+            last_updated = ? 
+        WHERE id IN ({','.join('?' * len(chunk))})
+        ''', [now, *chunk])
+
+
+def _read_embedding_cache(
+    conn: sqlite3.Connection, hashes: List[str], model: str, provider: str
+) -> Dict[str, Tuple[np.ndarray, Optional[Dict[str, Any]]]]:
+    """Look up cached embeddings by content hash on the given connection."""
+    cursor = conn.cursor()
+    cached = {}
+    for chunk in _in_chunks(hashes):
+        cursor.execute(f'''
+            SELECT hash, vector, analysis FROM embedding_cache
+            WHERE model = ? AND provider = ? AND hash IN ({','.join('?' * len(chunk))})
+        ''', [model, provider, *chunk])
+        for content_hash, vector, analysis in cursor.fetchall():
+            cached[content_hash] = (
+                np.frombuffer(vector, dtype=np.float32),
+                orjson.loads(analysis) if analysis else None
+            )
+    return cached
+
+
+def _write_embedding_cache(
+    conn: sqlite3.Connection, entries: List[Dict[str, Any]], model: str, provider: str
+) -> None:
+    """Insert or replace embedding cache rows on the given connection (no commit)."""
+    rows = [
+        (
+            entry['hash'], model, provider,
+            np.asarray(entry['embedding'], dtype=np.float32).tobytes(),
+            orjson.dumps(entry['analysis']).decode() if entry.get('analysis') is not None else None
+        )
+        for entry in entries
+    ]
+    conn.executemany('''
+        INSERT OR REPLACE INTO embedding_cache (hash, model, provider, vector, analysis)
+        VALUES (?, ?, ?, ?, ?)
+    ''', rows)
+
+
 class SQLiteHandler:
     def __init__(self, db_path: str) -> None:
         """
@@ -24,15 +186,123 @@ class SQLiteHandler:
         try:
             logger.info(f"Initializing SQLite at {db_path}")
             self.db_path = db_path
-            self.conn = self._create_connection()
-            self.conn.row_factory = sqlite3.Row
-            self._create_tables()
+            # Non-zero while transaction() groups writes on the main connection
+            self._transaction_depth = 0
+            # The main connection belongs to the creating thread; reads from other
+            # threads (the web API's worker pool) get their own read-only connection
+            self._owner_thread = threading.get_ident()
+            self._local = threading.local()
+            self._readers: List[sqlite3.Connection] = []
+            self._readers_lock = threading.Lock()
+            try:
+                self._open()
+            except sqlite3.DatabaseError as e:
+                if SQLITE_CORRUPTED_BEHAVIOR != 'recreate' or not self._is_corrupt(e):
+                    raise
+                self._move_corrupt_database(e)
+                self._open()
+            # Async callers hand writes to a single writer thread with its own connection
+            self._write_queue: queue.Queue = queue.Queue()
+            self._writer = threading.Thread(
+                target=self._writer_loop, name='sqlite-writer', daemon=True
+            )
+            self._writer.start()
             logger.info("SQLite initialized successfully")
         except Exception as e:
             logger.error(f"Error initializing SQLite: {str(e)}", exc_info=True)
             raise
 
-    def _create_connection(self, max_retries: int = 3) -> sqlite3.Connection:
+    def _open(self) -> None:
+        """Open the main connection in WAL mode and create missing tables."""
+        self.conn = self._create_connection()
+        self.conn.row_factory = sqlite3.Row
+        # WAL lets readers proceed during writes
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self._create_tables()
+
+    def _is_corrupt(self, error: sqlite3.DatabaseError) -> bool:
+        """
+        Tell real corruption apart from other errors raised while opening.
+        
+        OperationalError (locked database, I/O errors, unable to open) never
+        counts: the file may be a healthy database in use by another process.
+        
+        Args:
+            error (sqlite3.DatabaseError): Error raised by _open
+            
+        Returns:
+            bool: True if the database file is corrupt
+        """
+        if isinstance(error, sqlite3.OperationalError):
+            return False
+        message = str(error).lower()
+        if 'file is not a database' in message or 'malformed' in message:
+            return True
+        if getattr(self, 'conn', None) is not None:
+            self.conn.close()
+            self.conn = None
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=30.0)
+            try:
+                result = conn.execute('PRAGMA quick_check').fetchone()
+            finally:
+                conn.close()
+        except sqlite3.OperationalError:
+            return False
+        except sqlite3.DatabaseError:
+            return True
+        return result is None or result[0] != 'ok'
+
+    def _move_corrupt_database(self, error: Exception) -> None:
+        """Rename a corrupt database and its WAL files out of the way."""
+        logger.error(f"SQLite database {self.db_path} is corrupt ({str(error)}); recreating it")
+        if getattr(self, 'conn', None) is not None:
+            self.conn.close()
+        suffix = datetime.now().strftime('%Y%m%d%H%M%S')
+        for path in (self.db_path, f"{self.db_path}-wal", f"{self.db_path}-shm"):
+            if os.path.exists(path):
+                os.replace(path, f"{path}.corrupt-{suffix}")
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group writes on the main connection into one BEGIN IMMEDIATE ... COMMIT.
+        
+        Methods that normally commit after each statement defer to the
+        enclosing transaction instead. Nested use joins the outer transaction.
+        Any exception rolls the whole transaction back and is re-raised.
+        """
+        if self._transaction_depth:
+            self._transaction_depth += 1
+            try:
+                yield
+            finally:
+                self._transaction_depth -= 1
+            return
+        
+        self.conn.commit()  # Close any implicit transaction before BEGIN
+        self.conn.execute('BEGIN IMMEDIATE')
+        self._transaction_depth = 1
+        try:
+            yield
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            self._transaction_depth = 0
+
+    def _commit(self) -> None:
+        """Commit unless an enclosing transaction() will."""
+        if not self._transaction_depth:
+            self.conn.commit()
+
+    def _rollback(self) -> None:
+        """Roll back unless inside transaction(), where a failed statement leaves earlier writes intact."""
+        if not self._transaction_depth:
+            self.conn.rollback()
+
+    def _create_connection(self, max_retries: int = 3, check_same_thread: bool = True) -> sqlite3.Connection:
         """Create database connection with retry logic."""
         # Ensure directory exists
         db_dir = os.path.dirname(self.db_path)
@@ -44,17 +314,133 @@ class SQLiteHandler:
             try:
                 # Use isolation_level with a value instead of None to avoid autocommit mode
                 # which can cause locking issues
-                return sqlite3.connect(
+                conn = sqlite3.connect(
                     self.db_path,
                     timeout=30.0,  # 30 second timeout
-                    isolation_level="IMMEDIATE"  # Use explicit transactions instead of autocommit
+                    isolation_level="IMMEDIATE",  # Use explicit transactions instead of autocommit
+                    cached_statements=STATEMENT_CACHE_SIZE,  # Keep hot statements prepared
+                    check_same_thread=check_same_thread
                 )
+                conn.execute(f'PRAGMA synchronous={SQLITE_SYNCHRONOUS}')
+                conn.execute(f'PRAGMA cache_size=-{PAGE_CACHE_KIB}')
+                conn.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+                conn.execute('PRAGMA temp_store=MEMORY')
+                return conn
             except Exception as e:
                 if attempt == max_retries - 1:
                     raise
                 logger.warning(f"Retry {attempt + 1}/{max_retries} connecting to SQLite: {str(e)}")
                 time.sleep(1)
 
+    def _reader(self) -> sqlite3.Connection:
+        """
+        Connection for reads on the calling thread.
+        
+        The owning thread reads through the main connection, so it sees its own
+        open transaction(). Any other thread gets a query-only connection of its
+        own, opened on first use; WAL lets it read while the writers commit.
+        """
+        if threading.get_ident() == self._owner_thread:
+            return self.conn
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Only this thread uses it; close() may shut it from another thread
+            conn = self._create_connection(check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA query_only=ON')
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    def _writer_loop(self) -> None:
+        """Apply queued writes on a dedicated connection, committing them in batches."""
+        conn = self._create_connection()
+        try:
+            stop = False
+            while not stop:
+                item = self._write_queue.get()
+                if item is None:
+                    break
+                batch = [item]
+                deadline = time.monotonic() + WRITE_FLUSH_INTERVAL
+                while len(batch) < WRITE_BATCH_SIZE:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = self._write_queue.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stop = True
+                        break
+                    batch.append(item)
+                self._apply_writes(conn, batch)
+        finally:
+            conn.close()
+
+    def _apply_writes(self, conn: sqlite3.Connection, batch: List[Tuple]) -> None:
+        """
+        Execute a batch of queued writes in one transaction and resolve their futures.
+        
+        Args:
+            conn (sqlite3.Connection): Writer thread connection
+            batch (List[Tuple]): Queued (write function, future) entries
+        """
+        try:
+            results = [write(conn) for write, _ in batch]
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            if len(batch) > 1:
+                # Retry one by one so a bad write only fails its own caller
+                for entry in batch:
+                    self._apply_writes(conn, [entry])
+                return
+            if not batch[0][1].done():
+                batch[0][1].set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _queue_write(self, write: Callable[[sqlite3.Connection], Any]) -> Future:
+        """Queue a function for the writer thread; the future resolves once it commits."""
+        future: Future = Future()
+        self._write_queue.put((write, future))
+        return future
+
+    async def submit_write(self, write: Callable[[sqlite3.Connection], Any]) -> Any:
+        """
+        Queue a function for the writer thread and wait for its transaction to commit.
+        
+        Statements issued by one function always commit or roll back together.
+        
+        Args:
+            write (Callable): Function taking the writer connection
+            
+        Returns:
+            Any: The function's return value
+        """
+        return await asyncio.wrap_future(self._queue_write(write))
+
+    async def submit(self, stmt: str, params: Any = (), many: bool = False) -> int:
+        """
+        Queue a write for the writer thread and wait for it to be committed.
+        
+        Args:
+            stmt (str): SQL statement
+            params (Any): Statement parameters, or a sequence of them when many is True
+            many (bool): Run the statement with executemany
+            
+        Returns:
+            int: Number of rows affected
+        """
+        if many:
+            return await self.submit_write(lambda conn: conn.executemany(stmt, params).rowcount)
+        return await self.submit_write(lambda conn: conn.execute(stmt, params).rowcount)
+
     def _create_tables(self) -> None:
         """Create necessary database tables if they don't exist."""
         cursor = self.conn.cursor()
@@ -116,6 +502,15 @@ class SQLiteHandler:
             cursor.execute('CREATE INDEX idx_conversation_time ON emails(conversation_id, received_time)')
         except sqlite3.OperationalError:
             pass
+        try:
+            # Covers RECENT_EMAILS_SQL so listing pages never read the body-heavy table rows
+            cursor.execute('''
+                CREATE INDEX idx_recent_listing ON emails(
+                    received_time DESC, id, subject, sender_name, sender_email, folder
+                )
+            ''')
+        except sqlite3.OperationalError:
+            pass
         
         # Create metadata table for storing sync state, delta links, etc.
         cursor.execute('''
@@ -126,6 +521,19 @@ class SQLiteHandler:
         )
         ''')
 
+        # Cache of email embeddings keyed by content hash, per embedding model
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS embedding_cache (
+            hash TEXT NOT NULL,
+            model TEXT NOT NULL,
+            provider TEXT NOT NULL,
+            vector BLOB NOT NULL,
+            analysis TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (hash, model, provider)
+        )
+        ''')
+
         # Create attachments table
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS attachments (
@@ -250,6 +658,69 @@ class SQLiteHandler:
 
         self.conn.commit()
 
+    def _email_row(self, email: EmailMetadata) -> Optional[Dict[str, Any]]:
+        """
+        Convert an email into the parameter dictionary used for the emails table.
+        
+        Args:
+            email (EmailMetadata): Email metadata to convert
+            
+        Returns:
+            Optional[Dict]: Row parameters, or None if the email is missing required fields
+        """
+        # Convert email to dict
+        try:
+            email_dict = email.to_dict()
+            logger.debug(f"Processing email: {email_dict.get('Subject', 'No Subject')}")
+        except Exception as e:
+            logger.error(f"Error converting email to dict: {str(e)}")
+            return None
+        
+        try:
+            # Prepare data for insertion/update
+            # Convert datetime objects to ISO format strings
+            received_time = email_dict.get('ReceivedTime')
+            sent_time = email_dict.get('SentOn')
+            
+            if isinstance(received_time, datetime):
+                received_time = received_time.isoformat()
+            if isinstance(sent_time, datetime):
+                sent_time = sent_time.isoformat()
+            
+            data = {
+                'id': email_dict.get('Entry_ID'),
+                'account': email_dict.get('AccountName'),
+                'folder': email_dict.get('Folder'),
+                'subject': email_dict.get('Subject'),
+                'sender_name': email_dict.get('SenderName'),
+                'sender_email': email_dict.get('SenderEmailAddress'),
+                'received_time': received_time,
+                'sent_time': sent_time,
+                'recipients': email_dict.get('To'),
+                'is_task': bool(email_dict.get('IsMarkedAsTask')),
+                'unread': bool(email_dict.get('UnRead')),
+                'categories': email_dict.get('Categories'),
+                'processed': email_dict.get('embedding') is not None and len(email_dict['embedding']) > 0,
+                'last_updated': datetime.now().isoformat(),
+                'body': email_dict.get('Body'),
+                'attachments': email_dict.get('Attachments', ''),
+                'conversation_id': email_dict.get('ConversationId', '') or None,
+                'conversation_index': email_dict.get('ConversationIndex', '') or None,
+                'internet_message_id': email_dict.get('InternetMessageId', '') or None
+            }
+            
+            # Validate required fields
+            required_fields = ['id', 'account', 'folder', 'subject', 'received_time', 'body']
+            missing_fields = [field for field in required_fields if not data[field]]
+            if missing_fields:
+                logger.warning(f"Missing required fields: {', '.join(missing_fields)}")
+                return None
+            
+            return data
+        except Exception as e:
+            logger.error(f"Error preparing data for SQLite: {str(e)}")
+            return None
+
     def add_or_update_email(self, email: EmailMetadata, cursor: Optional[sqlite3.Cursor] = None) -> bool:
         """
         Add or update an email in the database.
@@ -265,56 +736,8 @@ class SQLiteHandler:
             # Use provided cursor or create new one
             cursor = cursor or self.conn.cursor()
             
-            # Convert email to dict
-            try:
-                email_dict = email.to_dict()
-                logger.debug(f"Processing email: {email_dict.get('Subject', 'No Subject')}")
-            except Exception as e:
-                logger.error(f"Error converting email to dict: {str(e)}")
-                return False
-            
-            try:
-                # Prepare data for insertion/update
-                # Convert datetime objects to ISO format strings
-                received_time = email_dict.get('ReceivedTime')
-                sent_time = email_dict.get('SentOn')
-                
-                if isinstance(received_time, datetime):
-                    received_time = received_time.isoformat()
-                if isinstance(sent_time, datetime):
-                    sent_time = sent_time.isoformat()
-                
-                data = {
-                    'id': email_dict.get('Entry_ID'),
-                    'account': email_dict.get('AccountName'),
-                    'folder': email_dict.get('Folder'),
-                    'subject': email_dict.get('Subject'),
-                    'sender_name': email_dict.get('SenderName'),
-                    'sender_email': email_dict.get('SenderEmailAddress'),
-                    'received_time': received_time,
-                    'sent_time': sent_time,
-                    'recipients': email_dict.get('To'),
-                    'is_task': bool(email_dict.get('IsMarkedAsTask')),
-                    'unread': bool(email_dict.get('UnRead')),
-                    'categories': email_dict.get('Categories'),
-                    'processed': bool(email_dict.get('embedding')),
-                    'last_updated': datetime.now().isoformat(),
-                    'body': email_dict.get('Body'),
-                    'attachments': email_dict.get('Attachments', ''),
-                    'conversation_id': email_dict.get('ConversationId', '') or None,
-                    'conversation_index': email_dict.get('ConversationIndex', '') or None,
-                    'internet_message_id': email_dict.get('InternetMessageId', '') or None
-                }
-                
-                # Validate required fields
-                required_fields = ['id', 'account', 'folder', 'subject', 'received_time', 'body']
-                missing_fields = [field for field in required_fields if not data[field]]
-                if missing_fields:
-                    logger.warning(f"Missing required fields: {', '.join(missing_fields)}")
-                    return False
-                
-            except Exception as e:
-                logger.error(f"Error preparing data for SQLite: {str(e)}")
+            data = self._email_row(email)
+            if data is None:
                 return False
             
             # Use UPSERT syntax with retry logic
@@ -375,19 +798,246 @@ class SQLiteHandler:
             self.conn.rollback()
             return False
 
-    def get_unprocessed_emails(self, limit: int = 100) -> List[Dict[str, Any]]:
+    @staticmethod
+    def _email_params(row: Dict[str, Any]) -> Tuple[Any, ...]:
+        """Order an _email_row dictionary as the positional EMAIL_UPSERT_SQL parameters."""
+        return tuple(row[column] for column in EMAIL_COLUMNS)
+
+    def add_or_update_emails_bulk(self, emails: List[EmailMetadata]) -> int:
+        """
+        Add or update multiple emails in a single transaction.
+        
+        Existing rows are refreshed in place; their processed flag is left
+        untouched so already-embedded emails are not queued again.
+        
+        Args:
+            emails (List[EmailMetadata]): Emails to store
+            
+        Returns:
+            int: Number of emails inserted or updated
+        """
+        rows = [row for row in map(self._email_row, emails) if row is not None]
+        if not rows:
+            return 0
+        
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                cursor = self.conn.cursor()
+                if not self.conn.in_transaction:
+                    cursor.execute('BEGIN IMMEDIATE')
+                cursor.executemany(EMAIL_UPSERT_SQL, map(self._email_params, rows))
+                self.conn.commit()
+                logger.info(f"Stored {len(rows)} emails in one transaction")
+                return len(rows)
+            except sqlite3.OperationalError as e:
+                self.conn.rollback()
+                if "database is locked" in str(e) and attempt < max_retries - 1:
+                    logger.warning(f"Database locked, retry {attempt + 1}/{max_retries}")
+                    time.sleep(1)
+                    continue
+                logger.error(f"Error adding emails in bulk: {str(e)}", exc_info=True)
+                return 0
+            except Exception as e:
+                logger.error(f"Error adding emails in bulk: {str(e)}", exc_info=True)
+                self.conn.rollback()
+                return 0
+        return 0
+
+    async def async_add_or_update_email(self, email: EmailMetadata) -> bool:
+        """
+        Add or update an email through the writer thread.
+        
+        Args:
+            email (EmailMetadata): Email metadata to store
+            
+        Returns:
+            bool: True if successful
+        """
+        data = self._email_row(email)
+        if data is None:
+            return False
+        try:
+            await self.submit(EMAIL_UPSERT_SQL, self._email_params(data))
+            return True
+        except Exception as e:
+            logger.error(f"Error adding/updating email: {str(e)}", exc_info=True)
+            return False
+
+    async def async_add_or_update_emails_bulk(self, emails: List[EmailMetadata]) -> int:
+        """
+        Add or update multiple emails through the writer thread.
+        
+        Args:
+            emails (List[EmailMetadata]): Emails to store
+            
+        Returns:
+            int: Number of emails inserted or updated
+        """
+        rows = [row for row in map(self._email_row, emails) if row is not None]
+        if not rows:
+            return 0
+        try:
+            await self.submit(EMAIL_UPSERT_SQL, [self._email_params(row) for row in rows], many=True)
+            return len(rows)
+        except Exception as e:
+            logger.error(f"Error adding emails in bulk: {str(e)}", exc_info=True)
+            return 0
+
+    @staticmethod
+    def _unprocessed_email(row: Dict[str, Any]) -> Dict[str, Any]:
+        """Shape an emails-table row like a get_unprocessed_emails result."""
+        return {
+            'id': row['id'],
+            'AccountName': row['account'],
+            'Folder': row['folder'],
+            'Subject': row['subject'],
+            'SenderName': row['sender_name'],
+            'SenderEmailAddress': row['sender_email'],
+            'ReceivedTime': row['received_time'],
+            'SentOn': row['sent_time'],
+            'To': row['recipients'],
+            'Body': row['body'],
+            'Attachments': row['attachments'] or '',
+            'IsMarkedAsTask': row['is_task'],
+            'UnRead': row['unread'],
+            'Categories': row['categories'],
+        }
+
+    def _write_batch(
+        self,
+        conn: sqlite3.Connection,
+        rows: List[Dict[str, Any]],
+        delta_link: Optional[str],
+        processed_ids: Optional[List[str]],
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """Issue the statements of a commit batch on conn without committing."""
+        pending: List[Dict[str, Any]] = []
+        if rows:
+            # The upsert keeps the processed flag, so look it up in the same
+            # transaction instead of re-reading the rows afterwards
+            done = {
+                row[0]
+                for chunk in _in_chunks([row['id'] for row in rows])
+                for row in conn.execute(
+                    f"SELECT id FROM emails WHERE processed = TRUE "
+                    f"AND id IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                )
+            }
+            conn.executemany(EMAIL_UPSERT_SQL, map(self._email_params, rows))
+            pending = [
+                self._unprocessed_email(row) for row in rows
+                if not row['processed'] and row['id'] not in done
+            ]
+        if delta_link:
+            conn.execute('''
+                INSERT OR REPLACE INTO metadata (key, value, updated_at)
+                VALUES ('graph_delta_link', ?, CURRENT_TIMESTAMP)
+            ''', (delta_link,))
+        if processed_ids:
+            _mark_processed(conn, processed_ids)
+            marked = set(processed_ids)
+            pending = [email for email in pending if email['id'] not in marked]
+        return len(rows), pending
+
+    def commit_batch(
+        self,
+        emails: List[EmailMetadata],
+        delta_link: Optional[str] = None,
+        processed_ids: Optional[List[str]] = None,
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Store emails, the Graph delta link and processed flags in one transaction.
+        
+        Either everything is committed or nothing is, so a crash cannot leave a
+        saved delta link pointing past emails that were never stored.
+        
+        Args:
+            emails (List[EmailMetadata]): Emails to upsert
+            delta_link (Optional[str]): New Graph delta link to save
+            processed_ids (Optional[List[str]]): Email IDs to mark as processed
+            
+        Returns:
+            Tuple[int, List[Dict]]: Number of emails inserted or updated, and the
+            stored emails still needing embeddings in get_unprocessed_emails form
+            ((0, []) on failure)
+        """
+        rows = [row for row in map(self._email_row, emails) if row is not None]
+        try:
+            result = self._write_batch(self.conn, rows, delta_link, processed_ids)
+            self.conn.commit()
+            return result
+        except Exception as e:
+            logger.error(f"Error committing batch: {str(e)}", exc_info=True)
+            self.conn.rollback()
+            return 0, []
+
+    async def async_commit_batch(
+        self,
+        emails: List[EmailMetadata],
+        delta_link: Optional[str] = None,
+        processed_ids: Optional[List[str]] = None,
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Writer-thread variant of commit_batch.
+        
+        Args:
+            emails (List[EmailMetadata]): Emails to upsert
+            delta_link (Optional[str]): New Graph delta link to save
+            processed_ids (Optional[List[str]]): Email IDs to mark as processed
+            
+        Returns:
+            Tuple[int, List[Dict]]: Number of emails stored and those still
+            needing embeddings ((0, []) on failure)
+        """
+        rows = [row for row in map(self._email_row, emails) if row is not None]
+        try:
+            return await self.submit_write(
+                lambda conn: self._write_batch(conn, rows, delta_link, processed_ids)
+            )
+        except Exception as e:
+            logger.error(f"Error committing batch: {str(e)}", exc_info=True)
+            return 0, []
+
+    def get_unprocessed_emails(
+        self, limit: int = 100, email_ids: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
         """
         Get emails that haven't been processed (no embeddings generated).
         
+        Syncs embed what commit_batch returns; this query is for recovering
+        emails left unprocessed by an interrupted run.
+        
         Args:
             limit (int): Maximum number of emails to return
+            email_ids (Optional[List[str]]): Restrict results to these email IDs
             
         Returns:
             List[Dict]: List of unprocessed emails
         """
+        if email_ids is not None and len(email_ids) > MAX_IN_PARAMS:
+            # Query each slice, then apply the ordering and limit across all of them
+            emails = [
+                email
+                for chunk in _in_chunks(email_ids)
+                for email in self.get_unprocessed_emails(limit, chunk)
+            ]
+            emails.sort(key=lambda email: email['ReceivedTime'] or '', reverse=True)
+            return emails[:limit]
+        
         try:
-            cursor = self.conn.cursor()
-            cursor.execute('''
+            id_filter = ''
+            params: List[Any] = []
+            if email_ids is not None:
+                if not email_ids:
+                    return []
+                id_filter = f"AND id IN ({','.join('?' * len(email_ids))})"
+                params.extend(email_ids)
+            params.append(limit)
+            
+            cursor = self._reader().cursor()
+            cursor.execute(f'''
             SELECT 
                 id,
                 account as AccountName,
@@ -404,10 +1054,10 @@ class SQLiteHandler:
                 unread as UnRead,
                 categories as Categories
             FROM emails 
-            WHERE processed = FALSE 
+            WHERE processed = FALSE {id_filter}
             ORDER BY received_time DESC 
             LIMIT ?
-            ''', (limit,))
+            ''', params)
             
             return [dict(row) for row in cursor.fetchall()]
             
@@ -442,6 +1092,72 @@ class SQLiteHandler:
             self.conn.rollback()
             return False
 
+
+    def mark_as_processed_bulk(self, email_ids: List[str]) -> bool:
+        """
+        Mark multiple emails as processed in one transaction.
+        
+        IDs are bound MAX_IN_PARAMS at a time, so any number can be passed.
+        
+        Args:
+            email_ids (List[str]): IDs of the emails to mark
+            
+        Returns:
+            bool: True if successful
+        """
+        if not email_ids:
+            return True
+        try:
+            _mark_processed(self.conn, email_ids)
+            self.conn.commit()
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error marking emails as processed: {str(e)}", exc_info=True)
+            self.conn.rollback()
+            return False
+
+    async def async_mark_as_processed_bulk(self, email_ids: List[str]) -> bool:
+        """
+        Mark multiple emails as processed through the writer thread.
+        
+        Args:
+            email_ids (List[str]): IDs of the emails to mark
+            
+        Returns:
+            bool: True if successful
+        """
+        if not email_ids:
+            return True
+        try:
+            await self.submit_write(lambda conn: _mark_processed(conn, email_ids))
+            return True
+        except Exception as e:
+            logger.error(f"Error marking emails as processed: {str(e)}", exc_info=True)
+            return False
+
+    async def async_mark_as_processed(self, email_id: str) -> bool:
+        """
+        Mark an email as processed through the writer thread.
+        
+        Args:
+            email_id (str): ID of the email to mark
+            
+        Returns:
+            bool: True if successful
+        """
+        try:
+            await self.submit('''
+            UPDATE emails 
+            SET processed = TRUE, 
+                last_updated = ? 
+            WHERE id = ?
+            ''', (datetime.now().isoformat(), email_id))
+            return True
+        except Exception as e:
+            logger.error(f"Error marking email as processed: {str(e)}", exc_info=True)
+            return False
+
     def get_email_by_id(self, email_id: str) -> Optional[Dict[str, Any]]:
         """
         Get a specific email by ID.
@@ -453,7 +1169,7 @@ class SQLiteHandler:
             Optional[Dict]: Email data if found
         """
         try:
-            cursor = self.conn.cursor()
+            cursor = self._reader().cursor()
             cursor.execute('SELECT * FROM emails WHERE id = ?', (email_id,))
             row = cursor.fetchone()
             return dict(row) if row else None
@@ -462,6 +1178,25 @@ class SQLiteHandler:
             logger.error(f"Error getting email by ID: {str(e)}", exc_info=True)
             return None
 
+    def get_recent_emails(self, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        Get a page of email summaries, newest first.
+        
+        Args:
+            limit (int): Number of emails to return
+            offset (int): Number of emails to skip
+            
+        Returns:
+            List[Dict]: id, subject, sender_name, sender_email, received_time and folder per email
+        """
+        try:
+            rows = self._reader().execute(RECENT_EMAILS_SQL, (limit, offset)).fetchall()
+            return [dict(row) for row in rows]
+            
+        except Exception as e:
+            logger.error(f"Error listing recent emails: {str(e)}", exc_info=True)
+            return []
+
     def get_email_count(self) -> int:
         """
         Get total number of emails in database.
@@ -470,7 +1205,7 @@ class SQLiteHandler:
             int: Number of emails
         """
         try:
-            cursor = self.conn.cursor()
+            cursor = self._reader().cursor()
             cursor.execute('SELECT COUNT(*) FROM emails')
             return cursor.fetchone()[0]
             
@@ -491,7 +1226,7 @@ class SQLiteHandler:
             List[Dict[str, Any]]: List of matching emails with rank scores
         """
         try:
-            cursor = self.conn.cursor()
+            cursor = self._reader().cursor()
             
             # Normalize query for case-insensitive search
             # FTS5 is case-sensitive, so we need to handle this
@@ -563,6 +1298,113 @@ class SQLiteHandler:
                 logger.error(f"Error in fallback LIKE search: {str(e2)}", exc_info=True)
                 return []
     
+    def get_email_bodies(self, email_ids: List[str]) -> Dict[str, str]:
+        """
+        Get the bodies of many emails with one IN query per MAX_IN_PARAMS IDs.
+        
+        Args:
+            email_ids (List[str]): Email IDs
+            
+        Returns:
+            Dict[str, str]: Body by email ID, for the IDs that exist
+        """
+        bodies: Dict[str, str] = {}
+        try:
+            cursor = self._reader().cursor()
+            for chunk in _in_chunks(list(dict.fromkeys(email_ids))):
+                params = _padded_chunk(chunk)
+                cursor.execute(
+                    f"SELECT id, body FROM emails WHERE id IN ({','.join('?' * len(params))})",
+                    params
+                )
+                bodies.update(cursor.fetchall())
+            return bodies
+        except Exception as e:
+            logger.error(f"Error fetching email bodies: {str(e)}", exc_info=True)
+            return bodies
+    
+    def search_threads_fts(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Search emails with FTS5 and return the best match of each thread.
+        
+        Emails without a conversation_id count as single-message threads keyed
+        by their own ID. Grouping and ranking happen in SQLite with window
+        functions, so only one row per thread reaches Python. Rows carry an
+        FTS 'snippet' of the best-matching column instead of the full body;
+        use get_email_bodies for the emails that are kept.
+        
+        Args:
+            query (str): Search query (FTS5 syntax supported)
+            limit (int): Maximum number of threads to return
+            
+        Returns:
+            List[Dict[str, Any]]: Best-matching email per thread, with 'snippet',
+            'thread_id', 'thread_rank', 'thread_hits' and 'matched_ids' (every
+            email of the thread that matched), ordered by thread_rank
+        """
+        try:
+            cursor = self._reader().cursor()
+            normalized_query = self._normalize_fts_query(query)
+            
+            cursor.execute('''
+            WITH matches AS (
+                SELECT 
+                    e.id, e.account, e.folder, e.subject, e.sender_name, e.sender_email,
+                    e.received_time, e.sent_time, e.recipients, e.attachments,
+                    e.categories, e.is_task, e.unread, e.conversation_id,
+                    fts.rank AS rank,
+                    snippet(emails_fts, -1, '', '', '...', 64) AS snippet,
+                    COALESCE(NULLIF(e.conversation_id, ''), e.id) AS thread_id
+                FROM emails_fts fts
+                INNER JOIN emails e ON e.rowid = fts.rowid
+                WHERE emails_fts MATCH ?
+            ),
+            ranked AS (
+                SELECT 
+                    *,
+                    ROW_NUMBER() OVER (PARTITION BY thread_id ORDER BY rank) AS thread_pos,
+                    COUNT(*) OVER (PARTITION BY thread_id) AS thread_hits,
+                    json_group_array(id) OVER (PARTITION BY thread_id) AS matched_ids
+                FROM matches
+            )
+            SELECT 
+                id, account, folder, subject, sender_name, sender_email,
+                received_time, sent_time, recipients, attachments,
+                categories, is_task, unread, conversation_id, rank, snippet,
+                thread_id, rank AS thread_rank, thread_hits, matched_ids
+            FROM ranked
+            WHERE thread_pos = 1
+            ORDER BY thread_rank
+            LIMIT ?
+            ''', (normalized_query, limit))
+            
+            columns = [description[0] for description in cursor.description]
+            results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            for result in results:
+                result['matched_ids'] = orjson.loads(result['matched_ids'])
+            
+            logger.info(f"FTS thread search for '{query}' returned {len(results)} threads")
+            if results:
+                return results
+            logger.info("FTS returned no threads, trying case-insensitive LIKE fallback")
+            
+        except Exception as e:
+            logger.error(f"Error performing FTS thread search: {str(e)}", exc_info=True)
+        
+        # The LIKE fallback has no rank; keep the first (most recent) email per thread
+        threads: Dict[str, Dict[str, Any]] = {}
+        for email in self._fallback_like_search(query, limit * 3):
+            thread_id = email.get('conversation_id') or email['id']
+            if thread_id in threads:
+                threads[thread_id]['thread_hits'] += 1
+                threads[thread_id]['matched_ids'].append(email['id'])
+            else:
+                threads[thread_id] = dict(
+                    email, thread_id=thread_id, thread_rank=email['rank'], thread_hits=1,
+                    matched_ids=[email['id']]
+                )
+        return list(threads.values())[:limit]
+    
     def _fallback_like_search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
         """
         Fallback case-insensitive LIKE search when FTS5 returns no results.
@@ -575,7 +1417,7 @@ class SQLiteHandler:
             List[Dict[str, Any]]: List of matching emails
         """
         try:
-            cursor = self.conn.cursor()
+            cursor = self._reader().cursor()
             
             # Extract search terms (remove FTS operators)
             import re
@@ -646,7 +1488,7 @@ class SQLiteHandler:
             return []
             
         try:
-            cursor = self.conn.cursor()
+            cursor = self._reader().cursor()
             cursor.execute('''
             SELECT 
                 id, account, folder, subject, sender_name, sender_email,
@@ -687,6 +1529,85 @@ class SQLiteHandler:
             logger.error(f"Error fetching emails by conversation_id: {str(e)}", exc_info=True)
             return []
 
+    def get_emails_by_conversation_ids(self, conversation_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Get the emails of many conversation threads in one pass.
+        
+        Args:
+            conversation_ids (List[str]): Conversation IDs to fetch
+            
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: Emails by conversation ID, each list
+            ordered by received_time; conversations with no emails are absent
+        """
+        threads: Dict[str, List[Dict[str, Any]]] = {}
+        conversation_ids = [conv_id for conv_id in dict.fromkeys(conversation_ids) if conv_id]
+        if not conversation_ids:
+            return threads
+            
+        try:
+            cursor = self._reader().cursor()
+            for chunk in _in_chunks(conversation_ids):
+                params = _padded_chunk(chunk)
+                cursor.execute(f'''
+                SELECT 
+                    id, account, folder, subject, sender_name, sender_email,
+                    received_time, sent_time, recipients, body, attachments,
+                    categories, is_task, unread, conversation_id, conversation_index,
+                    internet_message_id
+                FROM emails
+                WHERE conversation_id IN ({','.join('?' * len(params))})
+                ORDER BY conversation_id, received_time ASC
+                ''', params)
+                
+                # Rows arrive sorted by conversation, so each thread is one contiguous run
+                for conv_id, rows in groupby(cursor.fetchall(), key=itemgetter('conversation_id')):
+                    threads[conv_id] = [dict(row) for row in rows]
+            
+            logger.info(f"Found emails for {len(threads)} of {len(conversation_ids)} conversations")
+            return threads
+            
+        except Exception as e:
+            logger.error(f"Error fetching emails by conversation_ids: {str(e)}", exc_info=True)
+            return {}
+
+    def get_emails_by_sender(self, sender_email: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Get the most recent emails from a sender address (case-insensitive).
+        
+        Args:
+            sender_email (str): Sender email address
+            limit (int): Maximum number of results to return
+            
+        Returns:
+            List[Dict[str, Any]]: Matching emails, newest first
+        """
+        if not sender_email:
+            return []
+            
+        try:
+            cursor = self._reader().cursor()
+            cursor.execute('''
+            SELECT 
+                id, account, folder, subject, sender_name, sender_email,
+                received_time, sent_time, recipients, body, attachments,
+                categories, is_task, unread, conversation_id
+            FROM emails
+            WHERE sender_email = ? COLLATE NOCASE
+            ORDER BY received_time DESC
+            LIMIT ?
+            ''', (sender_email, limit))
+            
+            columns = [description[0] for description in cursor.description]
+            results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            
+            logger.info(f"Found {len(results)} emails from {sender_email}")
+            return results
+            
+        except Exception as e:
+            logger.error(f"Error fetching emails by sender: {str(e)}", exc_info=True)
+            return []
+
     def _normalize_fts_query(self, query: str) -> str:
         """
         Normalize FTS query for better case-insensitive matching.
@@ -765,7 +1686,7 @@ class SQLiteHandler:
             Optional[str]: Metadata value or None if not found
         """
         try:
-            cursor = self.conn.cursor()
+            cursor = self._reader().cursor()
             cursor.execute('SELECT value FROM metadata WHERE key = ?', (key,))
             row = cursor.fetchone()
             return row[0] if row else None
@@ -797,6 +1718,106 @@ class SQLiteHandler:
             self.conn.rollback()
             return False
 
+    def get_cached_embeddings(
+        self, hashes: List[str], model: str, provider: str
+    ) -> Dict[str, Tuple[np.ndarray, Optional[Dict[str, Any]]]]:
+        """
+        Look up cached email embeddings by content hash.
+        
+        Args:
+            hashes (List[str]): Content hashes to look up
+            model (str): Embedding model name
+            provider (str): Embedding provider
+            
+        Returns:
+            Dict: Mapping of hash to (embedding vector, analysis or None) for hits
+        """
+        if not hashes:
+            return {}
+        try:
+            return _read_embedding_cache(self._reader(), hashes, model, provider)
+        except Exception as e:
+            logger.error(f"Error reading embedding cache: {str(e)}", exc_info=True)
+            return {}
+    
+    def cache_embeddings(self, entries: List[Dict[str, Any]], model: str, provider: str) -> bool:
+        """
+        Store email embeddings in the content-hash cache.
+        
+        Called from a thread other than the owner, the rows go through the
+        writer thread instead of the main connection.
+        
+        Args:
+            entries (List[Dict]): Dictionaries with 'hash', 'embedding' and optional 'analysis'
+            model (str): Embedding model name
+            provider (str): Embedding provider
+            
+        Returns:
+            bool: True if successful
+        """
+        if not entries:
+            return True
+        if threading.get_ident() != self._owner_thread:
+            try:
+                self._queue_write(lambda conn: _write_embedding_cache(conn, entries, model, provider)).result()
+                return True
+            except Exception as e:
+                logger.error(f"Error writing embedding cache: {str(e)}", exc_info=True)
+                return False
+        try:
+            _write_embedding_cache(self.conn, entries, model, provider)
+            self._commit()
+            return True
+        except Exception as e:
+            logger.error(f"Error writing embedding cache: {str(e)}", exc_info=True)
+            self.conn.rollback()
+            return False
+
+    async def async_get_cached_embeddings(
+        self, hashes: List[str], model: str, provider: str
+    ) -> Dict[str, Tuple[np.ndarray, Optional[Dict[str, Any]]]]:
+        """
+        Look up cached email embeddings through the writer thread.
+        
+        Args:
+            hashes (List[str]): Content hashes to look up
+            model (str): Embedding model name
+            provider (str): Embedding provider
+            
+        Returns:
+            Dict: Mapping of hash to (embedding vector, analysis or None) for hits
+        """
+        if not hashes:
+            return {}
+        try:
+            return await self.submit_write(
+                lambda conn: _read_embedding_cache(conn, hashes, model, provider)
+            )
+        except Exception as e:
+            logger.error(f"Error reading embedding cache: {str(e)}", exc_info=True)
+            return {}
+    
+    async def async_cache_embeddings(self, entries: List[Dict[str, Any]], model: str, provider: str) -> bool:
+        """
+        Store email embeddings in the content-hash cache through the writer thread.
+        
+        Args:
+            entries (List[Dict]): Dictionaries with 'hash', 'embedding' and optional 'analysis'
+            model (str): Embedding model name
+            provider (str): Embedding provider
+            
+        Returns:
+            bool: True if successful
+        """
+        if not entries:
+            return True
+        try:
+            await self.submit_write(lambda conn: _write_embedding_cache(conn, entries, model, provider))
+            return True
+        except Exception as e:
+            logger.error(f"Error writing embedding cache: {str(e)}", exc_info=True)
+            return False
+
     def rebuild_fts_index(self) -> bool:
         """
         Rebuild the FTS5 index from scratch.
@@ -838,12 +1859,12 @@ class SQLiteHandler:
                     :extracted_text, :text_length, :page_count, :is_processed, :chunk_count
                 )
             ''', attachment_data)
-            self.conn.commit()
+            self._commit()
             logger.info(f"Added attachment {attachment_data.get('filename')} for email {attachment_data.get('email_id')}")
             return True
         except Exception as e:
             logger.error(f"Error adding attachment: {str(e)}", exc_info=True)
-            self.conn.rollback()
+            self._rollback()
             return False
 
     def get_attachments_by_email(self, email_id: str) -> List[Dict[str, Any]]:
@@ -857,7 +1878,7 @@ class SQLiteHandler:
             List of attachment dictionaries
         """
         try:
-            cursor = self.conn.cursor()
+            cursor = self._reader().cursor()
             cursor.execute('''
                 SELECT * FROM attachments WHERE email_id = ?
             ''', (email_id,))
@@ -867,6 +1888,42 @@ class SQLiteHandler:
             logger.error(f"Error getting attachments: {str(e)}", exc_info=True)
             return []
 
+    def get_extracted_attachments(
+        self, email_ids: List[str], per_email_limit: int = 10
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Get attachments with extracted text for many emails in one pass.
+
+        Args:
+            email_ids: Email IDs to look up
+            per_email_limit: Maximum attachments kept per email, longest text first
+
+        Returns:
+            Dict mapping email ID to its attachment dictionaries
+        """
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        if not email_ids:
+            return grouped
+        try:
+            cursor = self._reader().cursor()
+            for chunk in _in_chunks(list(dict.fromkeys(email_ids))):
+                params = _padded_chunk(chunk)
+                cursor.execute(
+                    EXTRACTED_ATTACHMENTS_SQL.format(placeholders=','.join('?' * len(params))),
+                    params
+                )
+                for row in cursor.fetchall():
+                    attachments = grouped.setdefault(row['email_id'], [])
+                    if len(attachments) < per_email_limit:
+                        attachment = dict(row)
+                        del attachment['email_id']
+                        attachment['text'] = attachment['extracted_text']  # Alias for compatibility
+                        attachments.append(attachment)
+            return grouped
+        except Exception as e:
+            logger.error(f"Error getting attachments for {len(email_ids)} emails: {str(e)}", exc_info=True)
+            return {}
+
     def update_attachment_processing(self, attachment_id: str, extracted_text: str, chunk_count: int) -> bool:
         """
         Update attachment after processing.
@@ -886,12 +1943,12 @@ class SQLiteHandler:
                 SET extracted_text = ?, text_length = ?, chunk_count = ?, is_processed = TRUE
                 WHERE id = ?
             ''', (extracted_text, len(extracted_text), chunk_count, attachment_id))
-            self.conn.commit()
+            self._commit()
             logger.info(f"Updated attachment {attachment_id} processing status")
             return True
         except Exception as e:
             logger.error(f"Error updating attachment: {str(e)}", exc_info=True)
-            self.conn.rollback()
+            self._rollback()
             return False
 
     def add_chunk(self, chunk_data: Dict[str, Any]) -> bool:
@@ -915,11 +1972,41 @@ class SQLiteHandler:
                     :chunk_text, :token_count, :has_embedding
                 )
             ''', chunk_data)
-            self.conn.commit()
+            self._commit()
             return True
         except Exception as e:
             logger.error(f"Error adding chunk: {str(e)}", exc_info=True)
-            self.conn.rollback()
+            self._rollback()
+            return False
+
+    def add_chunks_bulk(self, chunks: List[Dict[str, Any]]) -> bool:
+        """
+        Add multiple document chunks in a single transaction.
+
+        Args:
+            chunks: List of dictionaries with chunk fields (same shape as add_chunk)
+
+        Returns:
+            bool: True if successful
+        """
+        if not chunks:
+            return True
+        try:
+            cursor = self.conn.cursor()
+            cursor.executemany('''
+                INSERT INTO document_chunks (
+                    id, parent_id, parent_type, chunk_number, total_chunks,
+                    chunk_text, token_count, has_embedding
+                ) VALUES (
+                    :id, :parent_id, :parent_type, :chunk_number, :total_chunks,
+                    :chunk_text, :token_count, :has_embedding
+                )
+            ''', chunks)
+            self._commit()
+            return True
+        except Exception as e:
+            logger.error(f"Error adding chunks in bulk: {str(e)}", exc_info=True)
+            self._rollback()
             return False
 
     def get_chunks_by_parent(self, parent_id: str) -> List[Dict[str, Any]]:
@@ -933,7 +2020,7 @@ class SQLiteHandler:
             List of chunk dictionaries
         """
         try:
-            cursor = self.conn.cursor()
+            cursor = self._reader().cursor()
             cursor.execute('''
                 SELECT * FROM document_chunks
                 WHERE parent_id = ?
@@ -957,7 +2044,7 @@ class SQLiteHandler:
             List of attachment dictionaries with parent email info
         """
         try:
-            cursor = self.conn.cursor()
+            cursor = self._reader().cursor()
             cursor.execute('''
                 SELECT
                     a.*,
@@ -981,8 +2068,18 @@ class SQLiteHandler:
     def close(self) -> None:
         """Close the database connection."""
         try:
-            if hasattr(self, 'conn') and self.conn:
+            if getattr(self, '_writer', None) is not None and self._writer.is_alive():
+                # Let queued writes drain before shutting the connection
+                self._write_queue.put(None)
+                self._writer.join(timeout=5)
+            with self._readers_lock:
+                readers, self._readers = self._readers, []
+            for reader in readers:
+                reader.close()
+            if getattr(self, 'conn', None) is not None:
                 self.conn.close()
+                # Makes a second close (e.g. from __del__ on another thread) a no-op
+                self.conn = None
                 logger.info("SQLite connection closed")
         except Exception as e:
             logger.error(f"Error closing database: {str(e)}", exc_info=True)
@@ -1,27 +1,159 @@
 import requests
 import logging
+import os
+import threading
 import time
+import gzip
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
-import json
+import orjson
+from urllib3.util import make_headers
 
 # Configure logging
 logger = logging.getLogger('outlook-email.sarvam')
 
+# Request bodies above this size are gzip-compressed when compression is enabled
+GZIP_MIN_BYTES = 1024
+
+# Concurrent chat/completions requests per client, and an optional request budget (0 = unlimited)
+SARVAM_MAX_CONCURRENCY = int(os.getenv('SARVAM_MAX_CONCURRENCY', '8'))
+SARVAM_REQUESTS_PER_MIN = int(os.getenv('SARVAM_REQUESTS_PER_MIN', '0'))
+
+# Pause used on a 429 when the response carries no Retry-After header
+RATE_LIMIT_DEFAULT_WAIT = 5.0
+
+
+def _header_seconds(headers, name: str) -> Optional[float]:
+    """Parse a numeric rate-limit header, returning None when absent or malformed."""
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class _RateLimiter:
+    """
+    Shared pacing for concurrent Sarvam requests.
+    
+    Spaces request starts to stay within requests_per_min and pauses every
+    worker when the API reports the quota is exhausted (429 + Retry-After, or
+    x-ratelimit-remaining reaching zero).
+    """
+    
+    def __init__(self, requests_per_min: int = 0):
+        self._interval = 60.0 / requests_per_min if requests_per_min > 0 else 0.0
+        self._next_start = 0.0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+    
+    def wait(self) -> None:
+        """Block until the next request may start."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start, self._paused_until)
+            self._next_start = start + self._interval
+        if start > now:
+            time.sleep(start - now)
+    
+    def pause(self, seconds: float) -> None:
+        """Hold back all requests for at least the given number of seconds."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+    
+    def update(self, response: requests.Response) -> None:
+        """Apply the rate-limit headers of a response."""
+        headers = response.headers
+        retry_after = _header_seconds(headers, 'retry-after')
+        if response.status_code == 429:
+            self.pause(retry_after if retry_after is not None else RATE_LIMIT_DEFAULT_WAIT)
+            return
+        remaining = _header_seconds(headers, 'x-ratelimit-remaining')
+        if remaining is not None and remaining < 1:
+            reset = _header_seconds(headers, 'x-ratelimit-reset')
+            if reset is None:
+                reset = retry_after
+            self.pause(reset if reset is not None else RATE_LIMIT_DEFAULT_WAIT)
+
+
 class SarvamClient:
-    def __init__(self, api_key: str, base_url: str = "https://api.sarvam.ai"):
+    def __init__(self, api_key: str, base_url: str = "https://api.sarvam.ai", compress_requests: bool = False,
+                 max_concurrency: int = SARVAM_MAX_CONCURRENCY, requests_per_min: int = SARVAM_REQUESTS_PER_MIN):
         """
         Initialize the Sarvam AI client.
         
         Args:
             api_key (str): Sarvam API subscription key
             base_url (str): Base URL for Sarvam API
+            compress_requests (bool): Gzip request bodies larger than GZIP_MIN_BYTES.
+                Off by default until the endpoint is confirmed to accept Content-Encoding: gzip.
+            max_concurrency (int): Maximum chat/completions requests in flight at once
+            requests_per_min (int): Request budget shared by all workers (0 = unlimited)
         """
         self.api_key = api_key
         self.base_url = base_url
+        self.compress_requests = compress_requests
         self.headers = {
             "API-Subscription-Key": api_key,
-            "Content-Type": "application/json"
+            "Content-Type": "application/json",
+            # Only advertise encodings urllib3 can decode here (br needs the brotli package)
+            "Accept-Encoding": make_headers(accept_encoding=True)["accept-encoding"]
         }
+        self.max_concurrency = max(1, max_concurrency)
+        # One pooled session so concurrent requests reuse keep-alive connections
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._rate_limiter = _RateLimiter(requests_per_min)
+        # Worker threads for analyze_batch, started on demand and reused across batches
+        self._pool = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='sarvam')
+    
+    def _encode_payload(self, payload: Dict[str, Any]) -> tuple:
+        """
+        Serialize a request payload, gzip-compressing large bodies when enabled.
+        
+        Args:
+            payload (Dict[str, Any]): JSON request payload
+            
+        Returns:
+            tuple: (request body bytes, headers to send with it)
+        """
+        body = orjson.dumps(payload)
+        if self.compress_requests and len(body) > GZIP_MIN_BYTES:
+            return gzip.compress(body), {**self.headers, "Content-Encoding": "gzip"}
+        return body, self.headers
+    
+    def post_json(self, path: str, payload: Dict[str, Any], timeout: float = 30,
+                  stream: bool = False) -> requests.Response:
+        """
+        POST a JSON payload over the pooled session, honoring the concurrency and rate limits.
+        
+        Args:
+            path (str): Endpoint path appended to base_url (e.g. "/v1/chat/completions")
+            payload (Dict[str, Any]): JSON request payload
+            timeout (float): Request timeout in seconds
+            stream (bool): Return before the body is read (for server-sent events);
+                the caller must consume or close the response
+            
+        Returns:
+            requests.Response: Raw API response
+        """
+        body, headers = self._encode_payload(payload)
+        self._rate_limiter.wait()
+        with self._slots:
+            response = self.session.post(
+                f"{self.base_url}{path}",
+                headers=headers,
+                data=body,
+                timeout=timeout,
+                stream=stream
+            )
+        self._rate_limiter.update(response)
+        return response
     
     def generate_embeddings(self, texts: List[str], max_retries: int = 3) -> Optional[List[List[float]]]:
         """
@@ -128,15 +260,19 @@ Provide the response in JSON format with keys: summary, key_points, sentiment, c
         for attempt in range(max_retries):
             try:
                 logger.info(f"Analyzing email with Sarvam API (attempt {attempt + 1}/{max_retries})")
-                response = requests.post(
-                    endpoint,
-                    headers=self.headers,
-                    json=payload,
-                    timeout=30
-                )
+                body, headers = self._encode_payload(payload)
+                self._rate_limiter.wait()
+                with self._slots:
+                    response = self.session.post(
+                        endpoint,
+                        headers=headers,
+                        data=body,
+                        timeout=30
+                    )
+                self._rate_limiter.update(response)
                 
                 if response.status_code == 200:
-                    result = response.json()
+                    result = orjson.loads(response.content)
                     
                     # Extract the analysis from the response
                     if "choices" in result and len(result["choices"]) > 0:
@@ -144,8 +280,8 @@ Provide the response in JSON format with keys: summary, key_points, sentiment, c
                         
                         # Try to parse as JSON
                         try:
-                            analysis = json.loads(content)
-                        except json.JSONDecodeError:
+                            analysis = orjson.loads(content)
+                        except orjson.JSONDecodeError:
                             # If not JSON, create structured response
                             analysis = {
                                 "summary": content[:200],
@@ -165,7 +301,7 @@ Provide the response in JSON format with keys: summary, key_points, sentiment, c
                     # Rate limit exceeded
                     logger.warning(f"Rate limit exceeded (attempt {attempt + 1}/{max_retries})")
                     if attempt < max_retries - 1:
-                        time.sleep(5)  # Wait longer for rate limits
+                        # The limiter now holds every worker until Retry-After has passed
                         continue
                     return self._get_default_analysis()
                 
@@ -205,28 +341,25 @@ Provide the response in JSON format with keys: summary, key_points, sentiment, c
     
     def analyze_batch(self, email_contents: List[str], batch_size: int = 5) -> List[Dict[str, Any]]:
         """
-        Analyze multiple emails in batches.
+        Analyze multiple emails concurrently.
+        
+        Requests run on the client's pool of up to max_concurrency threads,
+        over the shared keep-alive session, and are paced by the shared rate
+        limiter instead of a fixed delay between calls.
         
         Args:
             email_contents (List[str]): List of email contents to analyze
-            batch_size (int): Number of emails to process at once
+            batch_size (int): Unused; kept for backward compatibility
             
         Returns:
-            List[Dict[str, Any]]: List of analysis results
+            List[Dict[str, Any]]: List of analysis results, in input order
         """
-        results = []
-        
-        for i in range(0, len(email_contents), batch_size):
-            batch = email_contents[i:i + batch_size]
-            
-            for content in batch:
-                analysis = self.analyze_email(content)
-                results.append(analysis)
-                
-                # Small delay between requests to avoid rate limiting
-                time.sleep(0.5)
+        if not email_contents:
+            return []
+        if len(email_contents) == 1 or self.max_concurrency == 1:
+            return [self.analyze_email(content) for content in email_contents]
         
-        return results
+        return list(self._pool.map(self.analyze_email, email_contents))
     
     def test_connection(self) -> bool:
         """
@@ -244,10 +377,10 @@ Provide the response in JSON format with keys: summary, key_points, sentiment, c
                 "max_tokens": 10
             }
             
-            response = requests.post(
+            response = self.session.post(
                 endpoint,
                 headers=self.headers,
-                json=payload,
+                data=orjson.dumps(payload),
                 timeout=10
             )
             
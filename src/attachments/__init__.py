@@ -11,7 +11,7 @@ from .document_extractors import (
     DocumentExtractorFactory
 )
 
-from .chunking import DocumentChunker
+from .chunking import Chunk, DocumentChunker
 
 __all__ = [
     'PDFExtractor',
@@ -20,5 +20,6 @@ __all__ = [
     'PPTXExtractor',
     'TextExtractor',
     'DocumentExtractorFactory',
+    'Chunk',
     'DocumentChunker'
 ]
@@ -5,12 +5,30 @@ Downloads, extracts text, chunks, generates embeddings, and stores attachments.
 import logging
 import uuid
 import os
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
 from src.attachments.document_extractors import DocumentExtractorFactory
-from src.attachments.chunking import DocumentChunker
+from src.attachments.chunking import Chunk, DocumentChunker
 
 logger = logging.getLogger('outlook-email.attachment-handler')
 
+# MIME types to assume from the filename extension when Graph reports none
+EXT_TO_MIME = {
+    '.msg': 'application/vnd.ms-outlook',
+    '.pdf': 'application/pdf',
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    '.doc': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    '.xls': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    '.pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+    '.ppt': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+    '.txt': 'text/plain',
+    '.csv': 'text/plain',
+    '.html': 'text/plain',
+    '.xml': 'text/plain',
+    '.json': 'text/plain',
+}
+
 
 class AttachmentHandler:
     """Orchestrates attachment download, processing, and storage."""
@@ -45,8 +63,15 @@ class AttachmentHandler:
         3. Download attachment binary
         4. Extract text using appropriate extractor
         5. Chunk if document is long (>1000 tokens)
-        6. Generate embeddings for chunks or full document
-        7. Store in SQLite + MongoDB
+        6. Generate embeddings for chunks or full document and store them in MongoDB
+        7. Store the SQLite rows for every attachment in one transaction
+
+        Each attachment is extracted as soon as it is downloaded. Short ones
+        are embedded and stored right away; long ones keep only their text
+        until they are chunked together in one chunk_documents call, so no
+        more than one binary is held at a time. Downloads, extraction and
+        embedding all happen before the SQLite transaction, so the database
+        write lock is only held for the inserts.
 
         Args:
             email_id: Email ID in our database
@@ -66,7 +91,8 @@ class AttachmentHandler:
 
             logger.info(f"Found {len(attachments)} attachments for email {email_id}")
 
-            processed_count = 0
+            pending_rows = []
+            long_items = []
 
             for att in attachments:
                 try:
@@ -87,20 +113,9 @@ class AttachmentHandler:
                     
                     # If no MIME type or it's None/null, try to detect by filename extension
                     if not mime_type or mime_type == 'None' or str(mime_type).lower() == 'none':
-                        filename_lower = filename.lower()
-                        if filename_lower.endswith('.msg'):
-                            mime_type = 'application/vnd.ms-outlook'
-                        elif filename_lower.endswith('.pdf'):
-                            mime_type = 'application/pdf'
-                        elif filename_lower.endswith(('.docx', '.doc')):
-                            mime_type = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-                        elif filename_lower.endswith(('.xlsx', '.xls')):
-                            mime_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-                        elif filename_lower.endswith(('.pptx', '.ppt')):
-                            mime_type = 'application/vnd.openxmlformats-officedocument.presentationml.presentation'
-                        elif filename_lower.endswith(('.txt', '.csv', '.html', '.xml', '.json')):
-                            mime_type = 'text/plain'
-                        else:
+                        ext = os.path.splitext(filename)[1].lower()
+                        mime_type = EXT_TO_MIME.get(ext)
+                        if mime_type is None:
                             # If no extension and MIME is None, assume it might be a .msg file (embedded email)
                             # These are typically embedded email messages from Outlook
                             mime_type = 'application/vnd.ms-outlook'
@@ -114,14 +129,45 @@ class AttachmentHandler:
                         logger.info(f"Skipping unsupported attachment type {mime_type}: {filename}")
                         continue
 
-                    # Process the attachment
-                    if self._process_single_attachment(email_id, message_id, att):
-                        processed_count += 1
+                    # Download and extract the attachment
+                    item = self._download_attachment(message_id, att)
+                    if item is None:
+                        continue
+                    if item['extracted_text'] and self.chunker.should_chunk(item['extracted_text']):
+                        # Chunked attachments store no binary; keep only the text for batch chunking
+                        del item['binary_data']
+                        long_items.append(item)
+                        continue
+                    rows = self._process_single_attachment(email_id, item)
+                    if rows is not None:
+                        pending_rows.append(rows)
 
                 except Exception as e:
                     logger.error(f"Error processing attachment {att.get('name')}: {str(e)}", exc_info=True)
                     continue
 
+            # Chunk every long document of the email in one batch
+            chunk_lists = self.chunker.chunk_documents([
+                (item['extracted_text'], {'filename': item['filename'], 'mime_type': item['mime_type']})
+                for item in long_items
+            ])
+            for item, chunks in zip(long_items, chunk_lists):
+                item['chunks'] = chunks
+                rows = self._process_single_attachment(email_id, item)
+                if rows is not None:
+                    pending_rows.append(rows)
+
+            # One commit for all attachment and chunk rows of the email
+            processed_count = 0
+            with self.sqlite.transaction():
+                for attachment_row, chunk_rows in pending_rows:
+                    if chunk_rows:
+                        self.sqlite.add_chunks_bulk(chunk_rows)
+                    if self.sqlite.add_attachment(attachment_row):
+                        processed_count += 1
+                    else:
+                        logger.error(f"Failed to store attachment metadata in SQLite: {attachment_row['filename']}")
+
             logger.info(f"Successfully processed {processed_count}/{len(attachments)} attachments for email {email_id}")
             return processed_count
 
@@ -129,24 +175,22 @@ class AttachmentHandler:
             logger.error(f"Error processing email attachments: {str(e)}", exc_info=True)
             return 0
 
-    def _process_single_attachment(
+    def _download_attachment(
         self,
-        email_id: str,
         message_id: str,
         attachment_info: Dict[str, Any]
-    ) -> bool:
+    ) -> Optional[Dict[str, Any]]:
         """
-        Process a single attachment.
+        Download a single attachment and extract its text.
 
         Args:
-            email_id: Email ID
             message_id: Graph API message ID
             attachment_info: Attachment metadata from Graph API
 
         Returns:
-            bool: True if successful
+            Optional[Dict]: filename, mime_type, binary_data, file_size,
+            extracted_text and page_count, or None if the download failed
         """
-        attachment_id = str(uuid.uuid4())
         filename = attachment_info.get('name', 'unknown')
         mime_type = attachment_info.get('contentType', '')
 
@@ -158,7 +202,7 @@ class AttachmentHandler:
             binary_data = self.graph.download_attachment(message_id, attachment_info['id'], attachment_type)
             if not binary_data:
                 logger.error(f"Failed to download attachment: {filename}")
-                return False
+                return None
 
             # Step 2: Extract text
             extracted = self._extract_text(binary_data, mime_type, filename)
@@ -173,24 +217,61 @@ class AttachmentHandler:
 
             logger.info(f"Extracted {len(extracted_text)} characters from {filename}")
 
-            # Step 3: Determine if chunking is needed
-            should_chunk = self.chunker.should_chunk(extracted_text)
+            return {
+                'filename': filename,
+                'mime_type': mime_type,
+                'binary_data': binary_data,
+                'file_size': len(binary_data),
+                'extracted_text': extracted_text,
+                'page_count': page_count
+            }
+
+        except Exception as e:
+            logger.error(f"Error downloading attachment {filename}: {str(e)}", exc_info=True)
+            return None
+
+    def _process_single_attachment(
+        self,
+        email_id: str,
+        item: Dict[str, Any]
+    ) -> Optional[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+        """
+        Embed a downloaded attachment and store it in MongoDB.
+
+        The SQLite rows are returned rather than written so the caller can
+        insert them for the whole email in one short transaction.
+
+        Args:
+            email_id: Email ID
+            item: Downloaded attachment from _download_attachment; long texts
+                arrive with 'chunks' set and their binary_data already dropped
+
+        Returns:
+            Optional[Tuple]: (attachment row, chunk rows) for SQLite, or None on failure
+        """
+        attachment_id = str(uuid.uuid4())
+        filename = item['filename']
+        mime_type = item['mime_type']
+        binary_data = item.get('binary_data')
+        file_size = item['file_size']
+        extracted_text = item['extracted_text']
+        page_count = item['page_count']
 
-            chunk_ids = []
+        try:
+            # Step 3: Chunks were created by the caller when chunking is needed
+            chunks = item.get('chunks')
+
+            chunk_rows = []
             chunk_count = 0
 
-            if should_chunk and extracted_text:
-                # Step 4: Create chunks
-                chunks = self.chunker.chunk_document(
-                    extracted_text,
-                    {'filename': filename, 'mime_type': mime_type}
-                )
+            if chunks:
+                # Step 4: Chunks for the long document
                 chunk_count = len(chunks)
 
                 logger.info(f"Created {chunk_count} chunks for {filename}")
 
                 # Step 5: Process chunks (generate embeddings and store)
-                chunk_ids = self._process_chunks(chunks, attachment_id, email_id)
+                chunk_rows = self._process_chunks(chunks, attachment_id, email_id)
             else:
                 # Single chunk - generate embedding for full document
                 if extracted_text:
@@ -206,7 +287,7 @@ class AttachmentHandler:
                     'binary_data': binary_data,
                     'metadata': {
                         'mime_type': mime_type,
-                        'file_size': len(binary_data),
+                        'file_size': file_size,
                         'page_count': page_count
                     },
                     'extracted_text': extracted_text,
@@ -216,14 +297,14 @@ class AttachmentHandler:
 
                 if not mongo_success:
                     logger.error(f"Failed to store attachment in MongoDB: {filename}")
-                    return False
+                    return None
 
-            # Step 6: Store attachment metadata in SQLite
-            sqlite_success = self.sqlite.add_attachment({
+            # Step 6: Attachment metadata row for SQLite
+            attachment_row = {
                 'id': attachment_id,
                 'email_id': email_id,
                 'filename': filename,
-                'file_size': len(binary_data),
+                'file_size': file_size,
                 'mime_type': mime_type,
                 'storage_id': attachment_id,  # MongoDB document ID
                 'extracted_text': extracted_text[:5000] if extracted_text else '',  # Truncate for SQLite
@@ -231,18 +312,14 @@ class AttachmentHandler:
                 'page_count': page_count,
                 'is_processed': True,
                 'chunk_count': chunk_count
-            })
-
-            if not sqlite_success:
-                logger.error(f"Failed to store attachment metadata in SQLite: {filename}")
-                return False
+            }
 
             logger.info(f"Successfully processed attachment: {filename}")
-            return True
+            return attachment_row, chunk_rows
 
         except Exception as e:
             logger.error(f"Error in _process_single_attachment for {filename}: {str(e)}", exc_info=True)
-            return False
+            return None
 
     def _extract_text(self, binary_data: bytes, mime_type: str, filename: str = '') -> Dict[str, Any]:
         """
@@ -270,70 +347,69 @@ class AttachmentHandler:
 
     def _process_chunks(
         self,
-        chunks: List[Dict[str, Any]],
+        chunks: List[Chunk],
         attachment_id: str,
         email_id: str
-    ) -> List[str]:
+    ) -> List[Dict[str, Any]]:
         """
-        Generate embeddings and store chunks.
+        Generate embeddings and store chunks in MongoDB.
 
         Args:
-            chunks: List of chunk dictionaries
+            chunks: Chunks from DocumentChunker.chunk_document
             attachment_id: Parent attachment ID
             email_id: Root email ID
 
         Returns:
-            List of chunk IDs
+            List of chunk rows for SQLite (written by the caller)
         """
         try:
-            chunk_ids = []
             chunks_with_embeddings = []
+            sqlite_rows = []
+
+            # Materialize each chunk's text once; it feeds the model and both stores
+            chunk_texts = [chunk.chunk_text for chunk in chunks]
 
-            for chunk in chunks:
-                chunk_id = f"{attachment_id}_chunk_{chunk['chunk_number']}"
+            # Embed every chunk in one batched model call before touching storage
+            embeddings = self._generate_embeddings(chunk_texts)
 
-                # Generate embedding for chunk
-                embedding = self._generate_embedding(chunk['chunk_text'])
+            for chunk, chunk_text, embedding in zip(chunks, chunk_texts, embeddings):
+                chunk_id = f"{attachment_id}_chunk_{chunk.chunk_number}"
 
                 # Prepare chunk document for MongoDB
-                chunk_doc = {
+                chunks_with_embeddings.append({
                     'id': chunk_id,
                     'parent_id': attachment_id,
                     'email_id': email_id,
-                    'chunk_number': chunk['chunk_number'],
-                    'total_chunks': chunk['total_chunks'],
-                    'text': chunk['chunk_text'],
+                    'chunk_number': chunk.chunk_number,
+                    'total_chunks': chunk.total_chunks,
+                    'text': chunk_text,
                     'embedding': embedding,
-                    'metadata': chunk.get('metadata', {})
-                }
-
-                chunks_with_embeddings.append(chunk_doc)
-                chunk_ids.append(chunk_id)
+                    'metadata': chunk.metadata
+                })
 
-                # Also store chunk metadata in SQLite
-                self.sqlite.add_chunk({
+                # Chunk metadata row for SQLite
+                sqlite_rows.append({
                     'id': chunk_id,
                     'parent_id': attachment_id,
                     'parent_type': 'attachment',
-                    'chunk_number': chunk['chunk_number'],
-                    'total_chunks': chunk['total_chunks'],
-                    'chunk_text': chunk['chunk_text'][:1000],  # Truncate for SQLite
-                    'token_count': chunk.get('token_count', 0),
+                    'chunk_number': chunk.chunk_number,
+                    'total_chunks': chunk.total_chunks,
+                    'chunk_text': chunk_text[:1000],  # Truncate for SQLite
+                    'token_count': chunk.token_count,
                     'has_embedding': True
                 })
 
-            # Batch insert chunks to MongoDB
             if chunks_with_embeddings:
                 self.mongo.add_chunk_embeddings(chunks_with_embeddings)
 
-            logger.info(f"Processed {len(chunk_ids)} chunks with embeddings")
-            return chunk_ids
+            logger.info(f"Processed {len(sqlite_rows)} chunks with embeddings")
+            return sqlite_rows
 
         except Exception as e:
             logger.error(f"Error processing chunks: {str(e)}", exc_info=True)
             return []
 
-    def _generate_embedding(self, text: str) -> List[float]:
+    def _generate_embedding(self, text: str) -> np.ndarray:
         """
         Generate embedding for text.
 
@@ -341,22 +417,51 @@ class AttachmentHandler:
             text: Text to embed
 
         Returns:
-            Embedding vector
+            float16 embedding vector (stored packed in MongoDB)
         """
         try:
             if self.embedding_model is None:
                 logger.warning("No embedding model available, using empty embedding")
-                return []
+                return np.empty(0, dtype=np.float16)
 
             # Generate embedding using sentence-transformers
             embedding = self.embedding_model.encode(
                 text,
                 normalize_embeddings=True,
+                convert_to_numpy=True,
                 show_progress_bar=False
             )
 
-            return embedding.tolist()
+            return embedding.astype(np.float16)
 
         except Exception as e:
             logger.error(f"Error generating embedding: {str(e)}", exc_info=True)
-            return []
+            return np.empty(0, dtype=np.float16)
+
+    def _generate_embeddings(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Generate embeddings for several texts in one model call.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            float16 embedding vectors in input order (empty vectors if no model is available)
+        """
+        try:
+            if self.embedding_model is None:
+                logger.warning("No embedding model available, using empty embeddings")
+                return [np.empty(0, dtype=np.float16) for _ in texts]
+
+            embeddings = self.embedding_model.encode(
+                texts,
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+
+            return list(embeddings.astype(np.float16))
+
+        except Exception as e:
+            logger.error(f"Error generating embeddings: {str(e)}", exc_info=True)
+            return [np.empty(0, dtype=np.float16) for _ in texts]
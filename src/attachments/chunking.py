@@ -2,12 +2,259 @@
 Intelligent document chunking with semantic boundary detection.
 Splits long documents into manageable chunks while preserving context.
 """
+import heapq
 import logging
-import re
-from typing import List, Dict, Any
+from bisect import bisect_left
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Iterator, List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from src.attachments.worker_pool import discard_process_pool, get_process_pool
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional (pip install .[accel]); the planner runs as plain Python
+    njit = None
 
 logger = logging.getLogger('outlook-email.chunking')
 
+# Split markers; boundaries fall just after the marker
+PARAGRAPH_MARKERS = ('\n\n', '\r\n\r\n')
+SENTENCE_MARKERS = ('. ', '! ', '? ')
+
+# Documents shorter than this many chunk sizes use the boundary-list-free fast path
+FAST_PATH_MAX_CHUNKS = 64
+
+# Distinct texts whose boundary lists are memoized. Each entry keeps its text alive,
+# and only long documents reach the boundary-list path, so keep this small.
+BOUNDARY_CACHE_SIZE = 8
+
+# Batches smaller than this are chunked in-process (task pickling would dominate)
+PARALLEL_MIN_DOCUMENTS = 4
+
+# Spacing of the word-boundary fallback (first space in every window of this size)
+WORD_BOUNDARY_STRIDE = 100
+
+
+def _find_all(text: str, marker: str) -> Iterator[int]:
+    """
+    Yield the position just after every occurrence of marker, in order.
+
+    Overlapping occurrences count (a run of three newlines gives two paragraph
+    boundaries), so whether a position is a boundary depends only on the text
+    around it. DocumentChunker's fast path relies on that.
+    """
+    step = len(marker)
+    pos = text.find(marker)
+    while pos != -1:
+        yield pos + step
+        pos = text.find(marker, pos + 1)
+
+
+def _find_word_boundaries(text: str) -> Iterator[int]:
+    """Yield the first space at or after each WORD_BOUNDARY_STRIDE offset, in order."""
+    text_len = len(text)
+    window = 0
+    while window < text_len:
+        pos = text.find(' ', window)
+        if pos == -1:
+            return
+        yield pos
+        # Windows up to pos would all find this same space; skip past them
+        window = (pos // WORD_BOUNDARY_STRIDE + 1) * WORD_BOUNDARY_STRIDE
+
+
+@lru_cache(maxsize=BOUNDARY_CACHE_SIZE)
+def _detect_boundaries_cached(text: str) -> Tuple[int, ...]:
+    """
+    Detect semantic boundaries in text, memoized per text.
+
+    Boundaries do not depend on chunk_size or overlap, so re-chunking the same
+    text with different settings reuses one scan. Strings are immutable, and
+    str caches its hash, so repeat lookups cost one dict probe.
+
+    Returns:
+        Tuple of character positions that are good split points, ascending
+    """
+    streams = [_find_all(text, marker) for marker in PARAGRAPH_MARKERS + SENTENCE_MARKERS]
+    streams.append(_find_word_boundaries(text))
+
+    boundaries = []
+    last = -1
+    for pos in heapq.merge(*streams):
+        if pos != last:
+            boundaries.append(pos)
+            last = pos
+
+    return tuple(boundaries)
+
+
+def _plan_chunks(bounds: np.ndarray, text_len: int, chunk_size: int, overlap: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute chunk (start, end) positions over a sorted boundary array.
+
+    Each chunk ends at the first boundary at or after start + chunk_size, or at
+    start + chunk_size if that boundary is more than chunk_size // 2 further on.
+    The next chunk starts overlap characters before the previous end.
+
+    Kept to plain integer/array operations (np.searchsorted is supported by
+    numba) so it can be compiled when numba is installed.
+
+    Args:
+        bounds: Sorted boundary positions
+        text_len: Length of the text being chunked
+        chunk_size: Target chunk size in characters
+        overlap: Overlap between chunks in characters
+
+    Returns:
+        Tuple of (starts, ends) position arrays
+    """
+    max_chunks = text_len // max(chunk_size - overlap, 1) + 2
+    starts = np.empty(max_chunks, dtype=np.int64)
+    ends = np.empty(max_chunks, dtype=np.int64)
+    n_bounds = len(bounds)
+    slack = chunk_size // 2
+
+    count = 0
+    current = 0
+    while current < text_len:
+        target = current + chunk_size
+        if target >= text_len:
+            end = text_len
+        else:
+            idx = np.searchsorted(bounds, target, side='left')
+            if idx < n_bounds and bounds[idx] <= target + slack:
+                end = bounds[idx]
+            else:
+                end = target
+
+        starts[count] = current
+        ends[count] = end
+        count += 1
+        current = end - overlap if end < text_len else end
+
+    return starts[:count], ends[:count]
+
+
+if njit is not None:
+    _plan_chunks = njit(cache=True)(_plan_chunks)
+
+
+@dataclass(slots=True)
+class Chunk:
+    """
+    One chunk of a document, stored as offsets into the shared source text.
+
+    chunk_text is sliced from the source only when accessed, so a chunked
+    document holds one copy of its text rather than one per chunk.
+    Supports item access (chunk['chunk_text'], chunk.get(...)) for callers
+    written against the earlier dict form; to_dict() gives a plain dict.
+    """
+    source: str = field(repr=False)
+    chunk_number: int
+    total_chunks: int
+    start_position: int
+    end_position: int
+    token_count: int
+    metadata: Dict[str, Any]
+
+    @property
+    def chunk_text(self) -> str:
+        """The chunk content, materialized from the source text."""
+        return self.source[self.start_position:self.end_position].strip()
+
+    def __getitem__(self, key: str) -> Any:
+        if key == 'source' or key not in CHUNK_KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert to the plain dictionary form (e.g. for JSON serialization).
+
+        Returns:
+            Dictionary with the chunk fields, chunk_text materialized
+        """
+        return {key: getattr(self, key) for key in CHUNK_FIELDS}
+
+
+# Fields exposed through Chunk item access and to_dict()
+CHUNK_FIELDS = (
+    'chunk_number', 'total_chunks', 'chunk_text', 'start_position',
+    'end_position', 'token_count', 'metadata'
+)
+CHUNK_KEYS = frozenset(CHUNK_FIELDS)
+
+
+# Per-chunk record layout for array output (see DocumentChunker.chunk_document_array)
+CHUNK_DTYPE = np.dtype([
+    ('start', '<i4'),
+    ('end', '<i4'),
+    ('chunk_num', '<i4'),
+    ('tok', '<i4')
+])
+
+
+@dataclass(slots=True)
+class ChunkArray:
+    """
+    A document's chunk layout as one structured array over the source text.
+
+    positions holds CHUNK_DTYPE records, so offsets can be filtered, sorted or
+    batched with NumPy before any chunk text is materialized.
+    """
+    source: str = field(repr=False)
+    positions: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def texts(self) -> List[str]:
+        """Materialize every chunk's text (stripped, as Chunk.chunk_text)."""
+        source = self.source
+        return [source[start:end].strip() for start, end in zip(self.positions['start'].tolist(), self.positions['end'].tolist())]
+
+    def as_dicts(self, doc_metadata: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Convert to the dictionary form produced by Chunk.to_dict().
+
+        Args:
+            doc_metadata: Metadata to attach to each chunk
+
+        Returns:
+            List of chunk dictionaries
+        """
+        doc_metadata = doc_metadata or {}
+        total = len(self.positions)
+        return [
+            {
+                'chunk_number': chunk_num,
+                'total_chunks': total,
+                'chunk_text': text,
+                'start_position': start,
+                'end_position': end,
+                'token_count': tok,
+                'metadata': {**doc_metadata, 'overlap_chars': overlap}
+            }
+            for (start, end, chunk_num, tok), text, overlap in zip(
+                self.positions.tolist(), self.texts(), self._overlaps())
+        ]
+
+    def _overlaps(self) -> List[int]:
+        """Overlap of each chunk with its predecessor, in characters."""
+        starts = self.positions['start']
+        ends = self.positions['end']
+        return [0] + (ends[:-1] - starts[1:]).tolist()
+
 
 class DocumentChunker:
     """
@@ -28,14 +275,20 @@ class DocumentChunker:
         Args:
             chunk_size: Target size per chunk in characters (~600 chars = ~800 tokens)
             overlap: Overlap between chunks in characters
+
+        Raises:
+            ValueError: If chunk_size is not positive or overlap is outside [0, chunk_size)
         """
+        # Each chunk must advance past the previous one; the planner sizes its
+        # output arrays on that assumption
+        if chunk_size <= 0 or not 0 <= overlap < chunk_size:
+            raise ValueError(
+                f"Chunk overlap must satisfy 0 <= overlap < chunk_size (got chunk_size={chunk_size}, overlap={overlap})"
+            )
         self.chunk_size = chunk_size
         self.overlap = overlap
 
-        # Sentence boundary patterns
-        self.sentence_endings = re.compile(r'[.!?]+\s+')
-
-    def chunk_document(self, text: str, doc_metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def chunk_document(self, text: str, doc_metadata: Dict[str, Any]) -> List[Chunk]:
         """
         Chunk document respecting semantic boundaries.
 
@@ -50,7 +303,7 @@ class DocumentChunker:
             doc_metadata: Metadata about the document (type, filename, etc.)
 
         Returns:
-            List of chunk dictionaries with:
+            List of Chunk objects with:
                 - chunk_number: Sequence number (0-indexed)
                 - total_chunks: Total number of chunks
                 - chunk_text: The chunk content
@@ -64,26 +317,94 @@ class DocumentChunker:
 
         # If text is shorter than chunk size, return as single chunk
         if len(text) <= self.chunk_size:
-            return [{
-                'chunk_number': 0,
-                'total_chunks': 1,
-                'chunk_text': text,
-                'start_position': 0,
-                'end_position': len(text),
-                'token_count': self._estimate_tokens(text),
-                'metadata': {**doc_metadata, 'is_single_chunk': True}
-            }]
-
-        # Step 1: Detect boundaries
-        boundaries = self._detect_boundaries(text)
+            return [Chunk(
+                source=text,
+                chunk_number=0,
+                total_chunks=1,
+                start_position=0,
+                end_position=len(text),
+                token_count=(len(text) * 3) >> 2,  # _estimate_tokens, inlined
+                metadata={**doc_metadata, 'is_single_chunk': True}
+            )]
 
-        # Step 2: Create chunks respecting boundaries
-        chunks = self._create_chunks_with_boundaries(text, boundaries, doc_metadata)
+        starts, ends = self._plan(text)
+        chunks = self._build_chunks(text, starts, ends, doc_metadata)
 
-        logger.info(f"Created {len(chunks)} chunks for document (avg size: {sum(len(c['chunk_text']) for c in chunks) // len(chunks)} chars)")
+        logger.info(f"Created {len(chunks)} chunks for document (avg size: {sum(c.end_position - c.start_position for c in chunks) // len(chunks)} chars)")
 
         return chunks
 
+    def chunk_document_array(self, text: str) -> ChunkArray:
+        """
+        Chunk a document into a structured position array instead of Chunk objects.
+
+        Uses the same layout as chunk_document; no chunk text is sliced until
+        ChunkArray.texts() or as_dicts() is called.
+
+        Args:
+            text: Document text to chunk
+
+        Returns:
+            ChunkArray over text
+        """
+        if not text:
+            return ChunkArray(source='', positions=np.empty(0, dtype=CHUNK_DTYPE))
+
+        if len(text) <= self.chunk_size:
+            starts, ends = [0], [len(text)]
+        else:
+            starts, ends = self._plan(text)
+
+        positions = np.empty(len(starts), dtype=CHUNK_DTYPE)
+        positions['start'] = starts
+        positions['end'] = ends
+        positions['chunk_num'] = np.arange(len(starts))
+        positions['tok'] = ((positions['end'] - positions['start']) * 3) >> 2  # _estimate_tokens
+        return ChunkArray(source=text, positions=positions)
+
+    def _plan(self, text: str) -> Tuple[List[int], List[int]]:
+        """
+        Plan chunk (start, end) positions for a text longer than chunk_size.
+
+        Args:
+            text: Text to chunk
+
+        Returns:
+            Tuple of (starts, ends) position lists
+        """
+        if len(text) < FAST_PATH_MAX_CHUNKS * self.chunk_size:
+            # Short-to-medium documents: probe only the slack window after each target
+            return self._plan_chunks_fast(text)
+
+        # Step 1: Detect boundaries (memoized; the tuple is shared, not copied)
+        boundaries = _detect_boundaries_cached(text)
+
+        # Step 2: Plan chunks respecting boundaries
+        bounds = np.fromiter(boundaries, dtype=np.int32, count=len(boundaries))
+        starts, ends = _plan_chunks(bounds, len(text), self.chunk_size, self.overlap)
+        return starts.tolist(), ends.tolist()
+
+    def chunk_documents(self, items: List[Tuple[str, Dict[str, Any]]]) -> List[List[Chunk]]:
+        """
+        Chunk several documents, spreading them across the shared worker pool.
+
+        Args:
+            items: List of (text, doc_metadata) pairs
+
+        Returns:
+            List of chunk lists, in input order
+        """
+        pool = get_process_pool() if len(items) >= PARALLEL_MIN_DOCUMENTS else None
+        if pool is not None:
+            texts = [text for text, _ in items]
+            metas = [doc_metadata for _, doc_metadata in items]
+            try:
+                return list(pool.map(self.chunk_document, texts, metas, chunksize=4))
+            except BrokenProcessPool as e:
+                logger.warning(f"Parallel chunking failed, falling back to serial: {str(e)}")
+                discard_process_pool(pool)
+        return [self.chunk_document(text, doc_metadata) for text, doc_metadata in items]
+
     def _detect_boundaries(self, text: str) -> List[int]:
         """
         Detect semantic boundaries in text.
@@ -93,37 +414,21 @@ class DocumentChunker:
         2. Sentence boundaries (periods, etc.)
         3. Word boundaries (spaces)
 
+        Each marker is located with str.find and the already-sorted streams are
+        merged in one pass, so no regex engine or final sort is needed. Results
+        are memoized per text (see _detect_boundaries_cached).
+
         Returns:
             List of character positions that are good split points
         """
-        boundaries = []
-
-        # Paragraph boundaries (double newlines)
-        para_pattern = re.compile(r'\n\s*\n')
-        for match in para_pattern.finditer(text):
-            boundaries.append(match.end())
-
-        # Sentence boundaries (periods, exclamation, question marks)
-        for match in self.sentence_endings.finditer(text):
-            boundaries.append(match.end())
-
-        # Word boundaries (spaces) - add every 100 characters as fallback
-        for i in range(0, len(text), 100):
-            next_space = text.find(' ', i)
-            if next_space != -1 and next_space not in boundaries:
-                boundaries.append(next_space)
-
-        # Sort and deduplicate
-        boundaries = sorted(set(boundaries))
-
-        return boundaries
+        return list(_detect_boundaries_cached(text))
 
     def _create_chunks_with_boundaries(
         self,
         text: str,
         boundaries: List[int],
         doc_metadata: Dict[str, Any]
-    ) -> List[Dict[str, Any]]:
+    ) -> List[Chunk]:
         """
         Create chunks respecting semantic boundaries.
 
@@ -135,51 +440,105 @@ class DocumentChunker:
         Returns:
             List of chunks with overlap
         """
-        chunks = []
-        text_len = len(text)
-        current_pos = 0
-        chunk_num = 0
+        bounds = np.fromiter(boundaries, dtype=np.int32, count=len(boundaries))
+        starts, ends = _plan_chunks(bounds, len(text), self.chunk_size, self.overlap)
 
-        while current_pos < text_len:
-            # Find the end position for this chunk
-            target_end = current_pos + self.chunk_size
+        return self._build_chunks(text, starts.tolist(), ends.tolist(), doc_metadata)
 
-            if target_end >= text_len:
-                # Last chunk
-                chunk_text = text[current_pos:]
-                end_pos = text_len
-            else:
-                # Find the nearest boundary after target_end
-                end_pos = self._find_nearest_boundary(boundaries, target_end)
+    def _plan_chunks_fast(self, text: str) -> Tuple[List[int], List[int]]:
+        """
+        Plan chunk positions without building the full boundary list.
 
-                # If no boundary found or too far, use target_end
-                if end_pos is None or end_pos > target_end + (self.chunk_size // 2):
-                    end_pos = target_end
+        For each target end, looks for the first boundary in
+        [target, target + chunk_size // 2] with bounded str.find calls.
+        Returns exactly the positions _plan_chunks would return over
+        _detect_boundaries(text).
 
-                chunk_text = text[current_pos:end_pos]
+        Args:
+            text: Text to chunk
 
-            # Add chunk
-            chunks.append({
-                'chunk_number': chunk_num,
-                'total_chunks': 0,  # Will update after creating all chunks
-                'chunk_text': chunk_text.strip(),
-                'start_position': current_pos,
-                'end_position': end_pos,
-                'token_count': self._estimate_tokens(chunk_text),
-                'metadata': {
+        Returns:
+            Tuple of (starts, ends) position lists
+        """
+        text_len = len(text)
+        chunk_size = self.chunk_size
+        overlap = self.overlap
+        slack = chunk_size // 2
+        markers = PARAGRAPH_MARKERS + SENTENCE_MARKERS
+
+        starts = []
+        ends = []
+        current = 0
+        while current < text_len:
+            target = current + chunk_size
+            if target >= text_len:
+                end = text_len
+            else:
+                limit = target + slack
+                end = target
+                best = limit + 1
+
+                # Marker boundaries sit just after the marker, so it may start before target
+                for marker in markers:
+                    pos = text.find(marker, target - len(marker), limit)
+                    if pos != -1 and pos + len(marker) < best:
+                        best = pos + len(marker)
+
+                # Word boundaries are the first space of a stride window; if target's own
+                # window already has a space before target, the next candidate is the
+                # next window's first space
+                window = target - target % WORD_BOUNDARY_STRIDE
+                if text.find(' ', window, target) == -1:
+                    pos = text.find(' ', target, limit + 1)
+                else:
+                    pos = text.find(' ', window + WORD_BOUNDARY_STRIDE, limit + 1)
+                if pos != -1 and pos < best:
+                    best = pos
+
+                if best <= limit:
+                    end = best
+
+            starts.append(current)
+            ends.append(end)
+            current = end - overlap if end < text_len else end
+
+        return starts, ends
+
+    def _build_chunks(
+        self,
+        text: str,
+        starts: List[int],
+        ends: List[int],
+        doc_metadata: Dict[str, Any]
+    ) -> List[Chunk]:
+        """
+        Build Chunk objects from planned positions.
+
+        Args:
+            text: Original text
+            starts: Chunk start positions
+            ends: Chunk end positions
+            doc_metadata: Document metadata
+
+        Returns:
+            List of chunks
+        """
+        # The plan fixes the chunk count up front, so total_chunks is set at construction
+        total = len(starts)
+        chunks = []
+        for chunk_num, (start_pos, end_pos) in enumerate(zip(starts, ends)):
+            chunks.append(Chunk(
+                source=text,
+                chunk_number=chunk_num,
+                total_chunks=total,
+                start_position=start_pos,
+                end_position=end_pos,
+                token_count=((end_pos - start_pos) * 3) >> 2,  # _estimate_tokens, inlined
+                metadata={
                     **doc_metadata,
                     'overlap_chars': self.overlap if chunk_num > 0 else 0
                 }
-            })
-
-            # Move to next chunk with overlap
-            current_pos = end_pos - self.overlap if end_pos < text_len else end_pos
-            chunk_num += 1
-
-        # Update total_chunks for all chunks
-        total = len(chunks)
-        for chunk in chunks:
-            chunk['total_chunks'] = total
+            ))
 
         return chunks
 
@@ -194,23 +553,8 @@ class DocumentChunker:
         Returns:
             Nearest boundary position or None if not found
         """
-        # Binary search for nearest boundary >= position
-        left, right = 0, len(boundaries) - 1
-
-        while left <= right:
-            mid = (left + right) // 2
-            if boundaries[mid] < position:
-                left = mid + 1
-            elif boundaries[mid] > position:
-                right = mid - 1
-            else:
-                return boundaries[mid]
-
-        # Return the boundary at 'left' if it exists
-        if left < len(boundaries):
-            return boundaries[left]
-
-        return None
+        idx = bisect_left(boundaries, position)
+        return boundaries[idx] if idx < len(boundaries) else None
 
     def _estimate_tokens(self, text: str) -> int:
         """
@@ -224,7 +568,7 @@ class DocumentChunker:
         Returns:
             Estimated token count
         """
-        return int(len(text) * 0.75)
+        return (len(text) * 3) >> 2
 
     def should_chunk(self, text: str) -> bool:
         """
@@ -3,11 +3,86 @@ Document extractors for various file formats.
 Supports PDF, DOCX, XLSX, PPTX, and text files.
 """
 import logging
-from typing import Dict, Any, Optional
+import os
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, List, Optional, Tuple
 from io import BytesIO
+from src.attachments.worker_pool import ATTACHMENT_WORKERS, discard_process_pool, get_process_pool
 
 logger = logging.getLogger('outlook-email.extractors')
 
+# PDFs with at least this many pages are split across the shared worker pool; every
+# page-range task ships its own copy of the file, so larger files are read serially
+PDF_PARALLEL_MIN_PAGES = 64
+PDF_PARALLEL_MAX_BYTES = 16 * 1024 * 1024
+
+
+def _extract_pdf_pages(pdf_bytes: bytes, start: int, stop: int) -> List[Tuple[int, str]]:
+    """
+    Extract plain text for a contiguous page range.
+
+    Opens its own document so it can run in a worker process
+    (PyMuPDF objects cannot be shared across threads or processes).
+
+    Args:
+        pdf_bytes: PDF file content as bytes
+        start: First page index (inclusive)
+        stop: Last page index (exclusive)
+
+    Returns:
+        List of (page index, page text) tuples
+    """
+    import fitz  # PyMuPDF
+
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as pdf_document:
+        return _read_pdf_pages(pdf_document, start, stop)
+
+
+def _read_pdf_pages(pdf_document, start: int, stop: int) -> List[Tuple[int, str]]:
+    """Read plain text for pages [start, stop) of an open PyMuPDF document."""
+    import fitz  # PyMuPDF
+
+    # Plain-text mode in content-stream order; mediabox clipping matches the default flags
+    text_flags = fitz.TEXT_PRESERVE_LIGATURES | fitz.TEXT_PRESERVE_WHITESPACE | fitz.TEXT_MEDIABOX_CLIP
+
+    return [
+        (page_num, pdf_document[page_num].get_text("text", sort=False, flags=text_flags))
+        for page_num in range(start, stop)
+    ]
+
+
+def _html_to_text(html_body) -> str:
+    """
+    Strip HTML to its text nodes, one stripped node per line.
+
+    Uses lxml's C parser (installed with python-docx) and falls back to
+    BeautifulSoup, then to the raw HTML. Output matches BeautifulSoup's
+    get_text(separator='\\n', strip=True).
+
+    Args:
+        html_body: HTML as str or bytes
+
+    Returns:
+        str: Text content
+    """
+    try:
+        import lxml.html
+
+        root = lxml.html.fromstring(html_body)
+        for element in list(root.iter('script', 'style')):
+            element.drop_tree()
+        return '\n'.join(text.strip() for text in root.itertext() if text.strip())
+    except Exception:
+        pass
+
+    try:
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html_body, 'html.parser')
+        return soup.get_text(separator='\n', strip=True)
+    except Exception:
+        # Fallback to raw HTML if BeautifulSoup fails
+        return html_body if isinstance(html_body, str) else html_body.decode('utf-8', errors='replace')
+
 
 class PDFExtractor:
     """Extract text from PDF files using PyMuPDF (text-based PDFs only)."""
@@ -32,12 +107,12 @@ class PDFExtractor:
             pdf_document = fitz.open(stream=pdf_bytes, filetype="pdf")
 
             # Extract text from all pages
-            text_parts = []
-            for page_num in range(pdf_document.page_count):
-                page = pdf_document[page_num]
-                text = page.get_text()
-                if text.strip():
-                    text_parts.append(f"[Page {page_num + 1}]\n{text}")
+            page_texts = self._extract_pages(pdf_document, pdf_bytes)
+            text_parts = [
+                f"[Page {page_num + 1}]\n{text}"
+                for page_num, text in page_texts
+                if text.strip()
+            ]
 
             full_text = "\n\n".join(text_parts)
 
@@ -69,14 +144,67 @@ class PDFExtractor:
                 'error': str(e)
             }
 
+    def _extract_pages(self, pdf_document, pdf_bytes: bytes) -> List[Tuple[int, str]]:
+        """
+        Extract page texts, splitting long documents across the shared worker pool.
+
+        Args:
+            pdf_document: Open PyMuPDF document
+            pdf_bytes: PDF file content as bytes (re-opened by each worker)
+
+        Returns:
+            List of (page index, page text) tuples in page order
+        """
+        page_count = pdf_document.page_count
+        if page_count < PDF_PARALLEL_MIN_PAGES or len(pdf_bytes) > PDF_PARALLEL_MAX_BYTES:
+            return _read_pdf_pages(pdf_document, 0, page_count)
+        pool = get_process_pool()
+        if pool is None:
+            return _read_pdf_pages(pdf_document, 0, page_count)
+
+        step = -(-page_count // ATTACHMENT_WORKERS)  # ceil division
+        ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+
+        try:
+            futures = [pool.submit(_extract_pdf_pages, pdf_bytes, start, stop) for start, stop in ranges]
+            return [page for future in futures for page in future.result()]
+        except Exception as e:
+            logger.warning(f"Parallel PDF extraction failed, falling back to serial: {str(e)}")
+            if isinstance(e, BrokenProcessPool):
+                discard_process_pool(pool)
+            return _read_pdf_pages(pdf_document, 0, page_count)
+
+
+# WordprocessingML / OPC core-properties namespaces for the DOCX XML fast path
+DOCX_NS = {
+    'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
+    'cp': 'http://schemas.openxmlformats.org/package/2006/metadata/core-properties',
+    'dc': 'http://purl.org/dc/elements/1.1/',
+    'mc': 'http://schemas.openxmlformats.org/markup-compatibility/2006'
+}
+
+# Run content read by the DOCX fast path, as python-docx's run.text reads it. Text under
+# mc:Fallback duplicates the mc:Choice branch, so only the choice is kept
+DOCX_RUN_CONTENT_XPATH = (
+    './/w:r/*[self::w:t or self::w:tab or self::w:br or self::w:cr][not(ancestor::mc:Fallback)]'
+)
+DOCX_RUN_BREAKS = {
+    f"{{{DOCX_NS['w']}}}tab": '\t',
+    f"{{{DOCX_NS['w']}}}br": '\n',
+    f"{{{DOCX_NS['w']}}}cr": '\n',
+}
+
 
 class DOCXExtractor:
-    """Extract text from Word documents using python-docx."""
+    """Extract text from Word documents (raw XML via lxml, python-docx fallback)."""
 
     def extract(self, docx_bytes: bytes) -> Dict[str, Any]:
         """
         Extract text from DOCX file.
 
+        Reads word/document.xml directly with lxml, which ships with python-docx,
+        and falls back to the python-docx object model if that fails.
+
         Args:
             docx_bytes: DOCX file content as bytes
 
@@ -87,38 +215,16 @@ class DOCXExtractor:
                 - metadata: Document metadata
         """
         try:
-            from docx import Document
-
-            # Open DOCX from bytes
-            doc = Document(BytesIO(docx_bytes))
-
-            # Extract text from paragraphs
-            paragraphs = []
-            for para in doc.paragraphs:
-                text = para.text.strip()
-                if text:
-                    paragraphs.append(text)
-
-            # Extract text from tables
-            table_texts = []
-            for table in doc.tables:
-                for row in table.rows:
-                    row_text = ' | '.join(cell.text.strip() for cell in row.cells if cell.text.strip())
-                    if row_text:
-                        table_texts.append(row_text)
+            try:
+                paragraphs, table_texts, metadata = self._extract_xml(docx_bytes)
+            except Exception as e:
+                logger.info(f"DOCX XML fast path unavailable, using python-docx: {str(e)}")
+                paragraphs, table_texts, metadata = self._extract_docx(docx_bytes)
 
             full_text = "\n\n".join(paragraphs)
             if table_texts:
                 full_text += "\n\n[Tables]\n" + "\n".join(table_texts)
 
-            metadata = {
-                'paragraph_count': len(paragraphs),
-                'table_count': len(doc.tables),
-                'author': doc.core_properties.author or '',
-                'title': doc.core_properties.title or '',
-                'subject': doc.core_properties.subject or ''
-            }
-
             logger.info(f"Extracted {len(full_text)} characters from DOCX with {metadata['paragraph_count']} paragraphs")
 
             return {
@@ -136,9 +242,114 @@ class DOCXExtractor:
                 'error': str(e)
             }
 
+    def _extract_xml(self, docx_bytes: bytes) -> Tuple[List[str], List[str], Dict[str, Any]]:
+        """
+        Extract body paragraphs, table rows and core properties from the raw package XML.
+
+        Args:
+            docx_bytes: DOCX file content as bytes
+
+        Returns:
+            Tuple of (paragraphs, table row texts, metadata)
+        """
+        import zipfile
+        from lxml import etree
+
+        with zipfile.ZipFile(BytesIO(docx_bytes)) as package:
+            body = etree.fromstring(package.read('word/document.xml')).find('w:body', DOCX_NS)
+            try:
+                core = etree.fromstring(package.read('docProps/core.xml'))
+            except KeyError:
+                core = None
+
+        def node_text(node) -> str:
+            # w:t text, with tabs and line breaks kept so words don't run together
+            return ''.join(
+                DOCX_RUN_BREAKS.get(child.tag, child.text or '')
+                for child in node.xpath(DOCX_RUN_CONTENT_XPATH, namespaces=DOCX_NS)
+            ).strip()
+
+        def cell_text(cell) -> str:
+            # Cell paragraphs are newline-separated, as in python-docx's cell.text
+            return '\n'.join(map(node_text, cell.iterfind('w:p', DOCX_NS))).strip()
+
+        # Top-level paragraphs only; paragraphs inside tables are reported with the tables
+        paragraphs = [text for text in map(node_text, body.iterfind('w:p', DOCX_NS)) if text]
+
+        tables = body.findall('w:tbl', DOCX_NS)
+        table_texts = []
+        for table in tables:
+            for row in table.iterfind('w:tr', DOCX_NS):
+                row_text = ' | '.join(text for text in map(cell_text, row.iterfind('w:tc', DOCX_NS)) if text)
+                if row_text:
+                    table_texts.append(row_text)
+
+        def core_prop(tag: str) -> str:
+            if core is None:
+                return ''
+            return core.findtext(tag, default='', namespaces=DOCX_NS) or ''
+
+        metadata = {
+            'paragraph_count': len(paragraphs),
+            'table_count': len(tables),
+            'author': core_prop('dc:creator'),
+            'title': core_prop('dc:title'),
+            'subject': core_prop('dc:subject')
+        }
+
+        return paragraphs, table_texts, metadata
+
+    def _extract_docx(self, docx_bytes: bytes) -> Tuple[List[str], List[str], Dict[str, Any]]:
+        """
+        Extract body paragraphs, table rows and core properties with python-docx.
+
+        Args:
+            docx_bytes: DOCX file content as bytes
+
+        Returns:
+            Tuple of (paragraphs, table row texts, metadata)
+        """
+        from docx import Document
+
+        # Open DOCX from bytes
+        doc = Document(BytesIO(docx_bytes))
+
+        # Extract text from paragraphs
+        paragraphs = []
+        for para in doc.paragraphs:
+            text = para.text.strip()
+            if text:
+                paragraphs.append(text)
+
+        # Extract text from tables
+        table_texts = []
+        for table in doc.tables:
+            for row in table.rows:
+                row_text = ' | '.join(cell.text.strip() for cell in row.cells if cell.text.strip())
+                if row_text:
+                    table_texts.append(row_text)
+
+        metadata = {
+            'paragraph_count': len(paragraphs),
+            'table_count': len(doc.tables),
+            'author': doc.core_properties.author or '',
+            'title': doc.core_properties.title or '',
+            'subject': doc.core_properties.subject or ''
+        }
+
+        return paragraphs, table_texts, metadata
+
+
+def _format_sheet_row(row) -> str:
+    """Join the non-blank cells of a spreadsheet row with ' | '."""
+    # Stringify each non-empty cell once, then drop blank strings
+    row_values = [text for text in (str(cell) for cell in row if cell is not None)
+                  if text and not text.isspace()]
+    return ' | '.join(row_values)
+
 
 class XLSXExtractor:
-    """Extract text from Excel files using openpyxl."""
+    """Extract text from Excel files using python-calamine when installed, else openpyxl."""
 
     def extract(self, xlsx_bytes: bytes) -> Dict[str, Any]:
         """
@@ -154,27 +365,18 @@ class XLSXExtractor:
                 - metadata: Workbook metadata
         """
         try:
-            from openpyxl import load_workbook
-
-            # Open XLSX from bytes
-            wb = load_workbook(BytesIO(xlsx_bytes), read_only=True, data_only=True)
+            try:
+                sheets = self._read_calamine(xlsx_bytes)
+            except ImportError:
+                sheets = self._read_openpyxl(xlsx_bytes)
+            except Exception as e:
+                logger.info(f"calamine could not read workbook, using openpyxl: {str(e)}")
+                sheets = self._read_openpyxl(xlsx_bytes)
 
             sheet_texts = []
             sheet_data = []
 
-            for sheet_name in wb.sheetnames:
-                sheet = wb[sheet_name]
-
-                # Extract cell values
-                rows_text = []
-                row_count = 0
-                for row in sheet.iter_rows(values_only=True):
-                    row_count += 1
-                    # Filter out None values and convert to string
-                    row_values = [str(cell) for cell in row if cell is not None and str(cell).strip()]
-                    if row_values:
-                        rows_text.append(' | '.join(row_values))
-
+            for sheet_name, rows_text, row_count in sheets:
                 sheet_text = f"[Sheet: {sheet_name}]\n" + "\n".join(rows_text)
                 sheet_texts.append(sheet_text)
 
@@ -185,13 +387,12 @@ class XLSXExtractor:
 
             full_text = "\n\n".join(sheet_texts)
 
+            sheet_names = [sheet_name for sheet_name, _, _ in sheets]
             metadata = {
-                'sheet_count': len(wb.sheetnames),
-                'sheet_names': wb.sheetnames
+                'sheet_count': len(sheet_names),
+                'sheet_names': sheet_names
             }
 
-            wb.close()
-
             logger.info(f"Extracted {len(full_text)} characters from XLSX with {metadata['sheet_count']} sheets")
 
             return {
@@ -209,6 +410,70 @@ class XLSXExtractor:
                 'error': str(e)
             }
 
+    def _read_calamine(self, xlsx_bytes: bytes) -> List[Tuple[str, List[str], int]]:
+        """
+        Read sheet rows with python-calamine (Rust; also reads legacy .xls and .xlsb).
+
+        Args:
+            xlsx_bytes: Workbook content as bytes
+
+        Returns:
+            List of (sheet name, formatted row texts, row count) tuples
+
+        Raises:
+            ImportError: If python-calamine is not installed
+        """
+        from python_calamine import CalamineWorkbook
+
+        wb = CalamineWorkbook.from_filelike(BytesIO(xlsx_bytes))
+
+        sheets = []
+        for sheet_name in wb.sheet_names:
+            rows = wb.get_sheet_by_name(sheet_name).to_python()
+            rows_text = []
+            for row in rows:
+                # calamine reports every number as float; print whole numbers as openpyxl does
+                row_text = _format_sheet_row(
+                    int(cell) if type(cell) is float and cell.is_integer() else cell
+                    for cell in row
+                )
+                if row_text:
+                    rows_text.append(row_text)
+            sheets.append((sheet_name, rows_text, len(rows)))
+
+        return sheets
+
+    def _read_openpyxl(self, xlsx_bytes: bytes) -> List[Tuple[str, List[str], int]]:
+        """
+        Read sheet rows with openpyxl in read-only mode.
+
+        Args:
+            xlsx_bytes: XLSX file content as bytes
+
+        Returns:
+            List of (sheet name, formatted row texts, row count) tuples
+        """
+        from openpyxl import load_workbook
+
+        # Open XLSX from bytes
+        wb = load_workbook(BytesIO(xlsx_bytes), read_only=True, data_only=True)
+
+        sheets = []
+        try:
+            for sheet_name in wb.sheetnames:
+                rows_text = []
+                row_count = 0
+                for row in wb[sheet_name].values:
+                    row_count += 1
+                    row_text = _format_sheet_row(row)
+                    if row_text:
+                        rows_text.append(row_text)
+                sheets.append((sheet_name, rows_text, row_count))
+        finally:
+            wb.close()
+
+        return sheets
+
 
 class PPTXExtractor:
     """Extract text from PowerPoint files using python-pptx."""
@@ -232,18 +497,7 @@ class PPTXExtractor:
             # Open PPTX from bytes
             prs = Presentation(BytesIO(pptx_bytes))
 
-            slide_texts = []
-
-            for slide_num, slide in enumerate(prs.slides, 1):
-                slide_parts = [f"[Slide {slide_num}]"]
-
-                # Extract text from all shapes
-                for shape in slide.shapes:
-                    if hasattr(shape, "text") and shape.text.strip():
-                        slide_parts.append(shape.text.strip())
-
-                slide_text = "\n".join(slide_parts)
-                slide_texts.append(slide_text)
+            slide_texts = [self._slide_text(slide_num, slide) for slide_num, slide in enumerate(prs.slides, 1)]
 
             full_text = "\n\n".join(slide_texts)
 
@@ -272,6 +526,30 @@ class PPTXExtractor:
             }
 
 
+    def _slide_text(self, slide_num: int, slide) -> str:
+        """
+        Collect the text of every shape on a slide.
+
+        Args:
+            slide_num: 1-based slide number
+            slide: python-pptx Slide
+
+        Returns:
+            Slide text prefixed with a [Slide n] marker
+        """
+        slide_parts = [f"[Slide {slide_num}]"]
+
+        for shape in slide.shapes:
+            # has_text_frame is a cheap element check; hasattr(shape, "text") builds
+            # (and for bare autoshapes, inserts) a text frame just to probe for it
+            if shape.has_text_frame:
+                text = shape.text_frame.text.strip()
+                if text:
+                    slide_parts.append(text)
+
+        return "\n".join(slide_parts)
+
+
 class MSGExtractor:
     """Extract text from Outlook .msg files using extract-msg, or from embedded message text."""
 
@@ -331,18 +609,16 @@ class MSGExtractor:
             
             # Try to process as .msg file using extract-msg
             import extract_msg
-            from io import BytesIO
-            import tempfile
-            import os
-
-            # extract-msg requires a file path, so we need to write to temp file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.msg') as tmp_file:
-                tmp_file.write(msg_bytes)
-                tmp_path = tmp_file.name
 
+            tmp_path = None
             try:
-                # Open the .msg file
-                msg = extract_msg.Message(tmp_path)
+                # extract-msg reads OLE files from file-like objects; older releases need a path
+                try:
+                    msg = extract_msg.Message(BytesIO(msg_bytes))
+                except (TypeError, AttributeError) as e:
+                    logger.info(f"In-memory .msg open failed, retrying from a temp file: {str(e)}")
+                    tmp_path = self._write_temp_msg(msg_bytes)
+                    msg = extract_msg.Message(tmp_path)
 
                 # Extract email content
                 text_parts = []
@@ -373,14 +649,7 @@ class MSGExtractor:
                 # Use HTML body if available (usually more complete), otherwise plain text
                 if html_body:
                     # Strip HTML tags for cleaner text
-                    try:
-                        from bs4 import BeautifulSoup
-                        soup = BeautifulSoup(html_body, 'html.parser')
-                        body_text = soup.get_text(separator='\n', strip=True)
-                        text_parts.append(body_text)
-                    except Exception:
-                        # Fallback to raw HTML if BeautifulSoup fails
-                        text_parts.append(html_body)
+                    text_parts.append(_html_to_text(html_body))
                 elif body:
                     text_parts.append(body)
 
@@ -417,10 +686,11 @@ class MSGExtractor:
 
             finally:
                 # Clean up temp file
-                try:
-                    os.unlink(tmp_path)
-                except Exception:
-                    pass
+                if tmp_path:
+                    try:
+                        os.unlink(tmp_path)
+                    except Exception:
+                        pass
 
         except Exception as e:
             logger.error(f"Error extracting .msg file: {str(e)}", exc_info=True)
@@ -431,6 +701,36 @@ class MSGExtractor:
             }
 
 
+    def _write_temp_msg(self, msg_bytes: bytes) -> str:
+        """
+        Write .msg bytes to a temporary file for extract-msg versions that need a path.
+
+        Args:
+            msg_bytes: .msg file content as bytes
+
+        Returns:
+            str: Path of the temporary file (caller removes it)
+        """
+        import tempfile
+
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.msg') as tmp_file:
+            tmp_file.write(msg_bytes)
+            return tmp_file.name
+
+
+# Byte-order marks, longest first so UTF-32 LE is not mistaken for UTF-16 LE
+TEXT_BOMS = (
+    (b'\xff\xfe\x00\x00', 'utf-32'),
+    (b'\x00\x00\xfe\xff', 'utf-32'),
+    (b'\xef\xbb\xbf', 'utf-8-sig'),
+    (b'\xff\xfe', 'utf-16'),
+    (b'\xfe\xff', 'utf-16'),
+)
+
+# Bytes handed to the encoding detector when strict decoding fails
+ENCODING_SNIFF_BYTES = 64 * 1024
+
+
 class TextExtractor:
     """Extract text from plain text files."""
 
@@ -449,15 +749,18 @@ class TextExtractor:
                 - metadata: Text file metadata
         """
         try:
+            # A byte-order mark settles the encoding without scanning the content
+            bom_encoding = next((enc for bom, enc in TEXT_BOMS if text_bytes.startswith(bom)), None)
+            if bom_encoding:
+                encoding = bom_encoding
+
             # Try specified encoding first
             try:
                 text = text_bytes.decode(encoding)
             except UnicodeDecodeError:
-                # Fallback to chardet for encoding detection
+                # Fall back to detection on a bounded prefix
                 try:
-                    import chardet
-                    detected = chardet.detect(text_bytes)
-                    encoding = detected['encoding'] or 'utf-8'
+                    encoding = self._detect_encoding(text_bytes[:ENCODING_SNIFF_BYTES])
                     text = text_bytes.decode(encoding, errors='replace')
                     logger.info(f"Detected encoding: {encoding}")
                 except Exception:
@@ -492,6 +795,30 @@ class TextExtractor:
             }
 
 
+    def _detect_encoding(self, sample: bytes) -> str:
+        """
+        Guess the encoding of a byte sample.
+
+        Uses charset_normalizer (installed with requests) and falls back to chardet.
+
+        Args:
+            sample: Leading bytes of the file
+
+        Returns:
+            str: Encoding name
+        """
+        try:
+            from charset_normalizer import from_bytes
+            best = from_bytes(sample).best()
+            if best is not None:
+                return best.encoding
+        except ImportError:
+            pass
+
+        import chardet
+        return chardet.detect(sample)['encoding'] or 'utf-8'
+
+
 class DocumentExtractorFactory:
     """Factory to select appropriate extractor based on MIME type."""
 
@@ -513,6 +840,25 @@ class DocumentExtractorFactory:
         'application/json': TextExtractor
     }
 
+    EXT_TO_EXTRACTOR = {
+        '.msg': MSGExtractor,
+        '.pdf': PDFExtractor,
+        '.docx': DOCXExtractor,
+        '.doc': DOCXExtractor,
+        '.xlsx': XLSXExtractor,
+        '.xls': XLSXExtractor,
+        '.pptx': PPTXExtractor,
+        '.ppt': PPTXExtractor,
+        '.txt': TextExtractor,
+        '.csv': TextExtractor,
+        '.html': TextExtractor,
+        '.xml': TextExtractor,
+        '.json': TextExtractor
+    }
+
+    # Extractors are stateless, so one shared instance per class is enough
+    _INSTANCES = {extractor_class: extractor_class() for extractor_class in set(MIME_TO_EXTRACTOR.values())}
+
     @staticmethod
     def get_extractor(mime_type: str, filename: str = '') -> Optional[Any]:
         """
@@ -523,28 +869,16 @@ class DocumentExtractorFactory:
             filename: Optional filename to detect type by extension
 
         Returns:
-            Extractor class instance or None if not supported
+            Shared extractor instance or None if not supported
         """
         extractor_class = DocumentExtractorFactory.MIME_TO_EXTRACTOR.get(mime_type)
-        
+
         # If no MIME type match, try to detect by file extension
         if not extractor_class and filename:
-            filename_lower = filename.lower()
-            if filename_lower.endswith('.msg'):
-                extractor_class = MSGExtractor
-            elif filename_lower.endswith('.pdf'):
-                extractor_class = PDFExtractor
-            elif filename_lower.endswith(('.docx', '.doc')):
-                extractor_class = DOCXExtractor
-            elif filename_lower.endswith(('.xlsx', '.xls')):
-                extractor_class = XLSXExtractor
-            elif filename_lower.endswith(('.pptx', '.ppt')):
-                extractor_class = PPTXExtractor
-            elif filename_lower.endswith(('.txt', '.csv', '.html', '.xml', '.json')):
-                extractor_class = TextExtractor
-        
+            extractor_class = DocumentExtractorFactory.EXT_TO_EXTRACTOR.get(os.path.splitext(filename)[1].lower())
+
         if extractor_class:
-            return extractor_class()
+            return DocumentExtractorFactory._INSTANCES[extractor_class]
         else:
             logger.warning(f"No extractor found for MIME type: {mime_type}, filename: {filename}")
             return None
@@ -563,14 +897,9 @@ class DocumentExtractorFactory:
         """
         if mime_type in DocumentExtractorFactory.MIME_TO_EXTRACTOR:
             return True
-        
+
         # Check by file extension if MIME type not found
-        if filename:
-            filename_lower = filename.lower()
-            if filename_lower.endswith(('.msg', '.pdf', '.docx', '.doc', '.xlsx', '.xls', '.pptx', '.ppt', '.txt', '.csv', '.html', '.xml', '.json')):
-                return True
-        
-        return False
+        return bool(filename) and os.path.splitext(filename)[1].lower() in DocumentExtractorFactory.EXT_TO_EXTRACTOR
 
     @staticmethod
     def get_supported_types() -> list:
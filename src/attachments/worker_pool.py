@@ -0,0 +1,63 @@
+"""
+Shared process pool for CPU-bound attachment work (PDF pages, chunking).
+"""
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+logger = logging.getLogger('outlook-email.attachment-pool')
+
+# Worker processes shared by PDF page extraction and batch chunking
+ATTACHMENT_WORKERS = min(8, os.cpu_count() or 1)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Return the long-lived attachment pool, starting it on first use.
+
+    Workers are started with the 'spawn' method: the servers already run the
+    SQLite writer and executor threads, and a child forked from a
+    multi-threaded process can deadlock on locks held at fork time.
+
+    Returns:
+        Optional[ProcessPoolExecutor]: The shared pool, or None on single-core hosts
+    """
+    global _pool
+    if ATTACHMENT_WORKERS < 2:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=ATTACHMENT_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pool
+
+
+def discard_process_pool(pool: ProcessPoolExecutor) -> None:
+    """
+    Drop a pool that failed (e.g. a worker died) so the next call starts a fresh one.
+
+    Args:
+        pool: The pool returned by get_process_pool
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+@atexit.register
+def _shutdown_pool() -> None:
+    """Stop the worker processes when the interpreter exits."""
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
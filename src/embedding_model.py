@@ -0,0 +1,193 @@
+"""
+Process-wide sentence-transformers model loading.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger('outlook-email.embedding')
+
+# Device for the sentence-transformers model: auto (CUDA, then MPS, then CPU), cpu, cuda or mps
+EMBEDDING_DEVICE = os.getenv('EMBEDDING_DEVICE', 'auto').lower()
+# Run the model in half precision on CUDA
+EMBEDDING_FP16 = os.getenv('EMBEDDING_FP16', 'true').lower() == 'true'
+# Intra-op threads for CPU encoding; 4-8 is usually the sweet spot
+EMBEDDING_CPU_THREADS = int(os.getenv('EMBEDDING_CPU_THREADS', str(min(8, os.cpu_count() or 1))))
+# Inference backend: torch, or onnx / openvino (sentence-transformers >= 3.2, .[onnx] / .[openvino])
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch').lower()
+# Model file inside the repo for the onnx/openvino backends, e.g. onnx/model_qint8_avx512_vnni.onnx
+EMBEDDING_MODEL_FILE = os.getenv('EMBEDDING_MODEL_FILE', '')
+# Concurrent single-query encodes are merged into one forward of up to this many texts
+QUERY_BATCH_MAX = int(os.getenv('QUERY_BATCH_MAX', '16'))
+# How long the first query of a batch waits for others to join
+QUERY_BATCH_DELAY = float(os.getenv('QUERY_BATCH_DELAY_MS', '5')) / 1000
+
+
+def _embedding_device() -> str:
+    """Pick the device for the embedding model from EMBEDDING_DEVICE and what torch can see."""
+    if EMBEDDING_DEVICE != 'auto':
+        return EMBEDDING_DEVICE
+    try:
+        import torch
+    except ImportError:
+        return 'cpu'
+    if torch.cuda.is_available():
+        return 'cuda'
+    mps = getattr(torch.backends, 'mps', None)
+    if mps is not None and mps.is_available():
+        return 'mps'
+    return 'cpu'
+
+
+@lru_cache(maxsize=2)
+def get_embedding_model(model_name: str, device: Optional[str] = None):
+    """
+    Load a sentence-transformers model once per process and device.
+    
+    Every caller asking for the same model shares one instance, so the
+    weights are loaded (and moved to the GPU) once. CUDA models are cast to
+    FP16 when EMBEDDING_FP16 is set; on CPU the torch thread count is capped
+    at EMBEDDING_CPU_THREADS. With EMBEDDING_BACKEND onnx or openvino the
+    model runs on that runtime instead of eager PyTorch, optionally from an
+    exported (e.g. INT8-quantized) EMBEDDING_MODEL_FILE. The model runs one
+    tiny encode before it is returned so the first real request does not pay
+    the warm-up.
+    
+    Args:
+        model_name (str): Model name or path
+        device (Optional[str]): Device to use (None = EMBEDDING_DEVICE / auto-detect)
+        
+    Returns:
+        SentenceTransformer: Loaded model
+    """
+    from sentence_transformers import SentenceTransformer
+    
+    device = device or _embedding_device()
+    if device == 'cpu':
+        import torch
+        torch.set_num_threads(EMBEDDING_CPU_THREADS)
+    if EMBEDDING_BACKEND == 'torch':
+        model = SentenceTransformer(model_name, device=device)
+        half = device == 'cuda' and EMBEDDING_FP16
+        if half:
+            model = model.half()
+    else:
+        model_kwargs = {'file_name': EMBEDDING_MODEL_FILE} if EMBEDDING_MODEL_FILE else None
+        model = SentenceTransformer(
+            model_name, device=device, backend=EMBEDDING_BACKEND, model_kwargs=model_kwargs
+        )
+        half = False
+    model.encode(["warm up"], show_progress_bar=False)
+    logger.info(
+        f"Embedding model {model_name} on {device} ({EMBEDDING_BACKEND}"
+        f"{', fp16' if half else ''}{', ' + EMBEDDING_MODEL_FILE if EMBEDDING_MODEL_FILE else ''})"
+    )
+    return model
+
+
+class EncodeBatcher:
+    """
+    Merge concurrent one-sentence encode calls into batched model forwards.
+    
+    Wraps a model and exposes the same encode(). Calls with a single
+    sentence are queued for a worker thread, which waits up to max_delay
+    after the first one for others (with the same encode options) to
+    arrive and encodes up to max_batch of them together. Calls with more
+    than one sentence, or with unhashable options, go straight to the
+    model. Other attributes are forwarded to the wrapped model.
+    """
+    
+    def __init__(self, model, max_batch: int = QUERY_BATCH_MAX, max_delay: float = QUERY_BATCH_DELAY):
+        """
+        Initialize the batcher and start its worker thread.
+        
+        Args:
+            model: Model with a sentence-transformers style encode()
+            max_batch (int): Maximum sentences per forward
+            max_delay (float): Seconds to wait for a batch to fill
+        """
+        self.model = model
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: queue.Queue = queue.Queue()
+        self._worker = threading.Thread(target=self._worker_loop, name='encode-batcher', daemon=True)
+        self._worker.start()
+    
+    def __getattr__(self, name: str) -> Any:
+        if name == 'model':
+            raise AttributeError(name)
+        return getattr(self.model, name)
+    
+    def encode(self, sentences, **kwargs) -> np.ndarray:
+        """
+        Encode sentences, batching single-sentence calls with concurrent ones.
+        
+        Args:
+            sentences: Sentence or list of sentences
+            **kwargs: Options passed to the model's encode()
+            
+        Returns:
+            np.ndarray: One embedding row per sentence
+        """
+        if isinstance(sentences, str) or len(sentences) != 1 or self.max_batch <= 1:
+            return self.model.encode(sentences, **kwargs)
+        # The options key groups queued calls; build it here so the worker never sees a bad one
+        options = tuple(sorted(kwargs.items()))
+        try:
+            hash(options)
+        except TypeError:
+            return self.model.encode(sentences, **kwargs)
+        future: Future = Future()
+        self._queue.put((sentences[0], options, future))
+        return future.result()[np.newaxis]
+    
+    def close(self) -> None:
+        """Stop the worker thread once queued calls are done."""
+        self._queue.put(None)
+        self._worker.join(timeout=5)
+    
+    def _worker_loop(self) -> None:
+        """Collect queued sentences into batches and encode them."""
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            # Calls only share a forward when their encode options match
+            groups: Dict[Tuple, List[Tuple[str, Future]]] = {}
+            for sentence, options, future in batch:
+                groups.setdefault(options, []).append((sentence, future))
+            for options, entries in groups.items():
+                self._encode_group(entries, dict(options))
+    
+    def _encode_group(self, entries: List[Tuple[str, Future]], options: Dict[str, Any]) -> None:
+        """Run one forward for a group of queued sentences and resolve their futures."""
+        try:
+            embeddings = self.model.encode([sentence for sentence, _ in entries], **options)
+        except Exception as e:
+            for _, future in entries:
+                future.set_exception(e)
+            return
+        for (_, future), embedding in zip(entries, embeddings):
+            future.set_result(np.asarray(embedding))
@@ -0,0 +1,132 @@
+"""
+In-process caches for the RAG query path.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries can also expire after a fixed age.
+
+    The least recently used entry is evicted once max_items is exceeded.
+    Expired entries are dropped when they are next looked up.
+    """
+
+    def __init__(
+        self,
+        max_items: int = 1024,
+        ttl_sec: Optional[float] = None,
+        timer: Callable[[], float] = time.monotonic
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            max_items (int): Maximum number of entries kept
+            ttl_sec (Optional[float]): Entry lifetime in seconds (None = no expiry)
+            timer (Callable): Clock used for expiry, in seconds
+        """
+        self.max_items = max_items
+        self.ttl_sec = ttl_sec
+        self._timer = timer
+        self._entries: OrderedDict = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Look up a key, refreshing its LRU position.
+
+        Args:
+            key (Hashable): Cache key
+            default (Any): Returned when the key is missing or expired
+
+        Returns:
+            Any: Cached value or default
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            stored_at, value = entry
+            if self.ttl_sec is not None and self._timer() - stored_at > self.ttl_sec:
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Store a value, evicting the least recently used entry when full.
+
+        Args:
+            key (Hashable): Cache key
+            value (Any): Value to cache
+        """
+        with self._lock:
+            self._entries[key] = (self._timer(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        """Drop a key if present."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SingleFlight:
+    """
+    Coalesce overlapping calls for the same key into one execution.
+    
+    The first caller for a key runs the function; callers arriving while it
+    is still running wait for and share its result (or exception). Nothing
+    is kept once the call finishes, so this complements TTLCache rather
+    than replacing it.
+    """
+    
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+    
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        Run fn for key unless an identical call is already in flight.
+        
+        Args:
+            key (Hashable): Identity of the call
+            fn (Callable): Zero-argument function producing the result
+            
+        Returns:
+            Any: Result of fn, shared by every overlapping caller
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        
+        if not leader:
+            return future.result()
+        
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
@@ -1,32 +1,135 @@
 """
 MongoDB vector search and reranking helpers.
 """
+import hashlib
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from typing import List, Dict, Any, Optional
-from src.MongoDBHandler import MongoDBHandler
+from typing import List, Dict, Any, Optional, Tuple
+from pymongo.errors import OperationFailure
+from src.MongoDBHandler import (
+    MongoDBHandler, VECTOR_SEARCH_INDEX, EMBEDDING_COVERING_FIELDS, decode_embedding_matrix, embedding_dim
+)
+from src.rag.caches import TTLCache
+
+try:
+    from numba import njit, prange
+except ImportError:  # numba is optional (pip install .[accel]); scoring stays on NumPy/BLAS
+    njit = None
+    prange = range
 
 logger = logging.getLogger('outlook-email.rag.vectors')
 
+# Query embeddings remembered per reranker (least recently used evicted first)
+QUERY_CACHE_SIZE = 1024
+
+# Provider name under which query embeddings share the SQLite embedding cache with emails
+QUERY_EMBEDDING_PROVIDER = 'query'
+
+# Rerank results reused for a repeated (query embedding, candidates, top_k); 0 disables
+RERANK_CACHE_SIZE = 4096
+RERANK_CACHE_TTL = float(os.getenv('RERANK_CACHE_TTL', '30'))
+
+# Fields needed to decode and score a stored email embedding
+EMBEDDING_PROJECTION = {
+    '_id': 0,
+    'id': 1,
+    'embedding': 1,
+    'embedding_dtype': 1,
+    'embedding_scale': 1,
+    'normalized': 1,
+    'dim': 1,
+    'metadata': 1
+}
+
+# The same fields minus metadata, all keys of the covering index
+COVERED_PROJECTION = {'_id': 0, **{field: 1 for field in EMBEDDING_COVERING_FIELDS}}
+
+# Packed candidate vectors kept in memory by email ID, so hot emails skip the MongoDB fetch;
+# ~0.5 KB each at 384 int8 dims. The TTL bounds staleness after an email is re-embedded
+VECTOR_CACHE_SIZE = int(os.getenv('RERANK_VECTOR_CACHE_SIZE', '50000'))
+VECTOR_CACHE_TTL = float(os.getenv('RERANK_VECTOR_CACHE_TTL', '600'))
+
+# Large candidate sets are fetched as parallel $in queries of this many IDs each; every
+# cursor returns its chunk in one batch instead of the default 101-document first batch
+FETCH_CHUNK_SIZE = 500
+FETCH_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix='rerank-fetch')
+
+# Candidate count from which the compiled kernel (when numba is installed) replaces NumPy scoring
+NUMBA_MIN_CANDIDATES = 2048
+
+
+def _score_rows(matrix: np.ndarray, query_unit: np.ndarray, needs_norm: np.ndarray) -> np.ndarray:
+    """
+    Cosine similarity of each row of matrix with a unit-length query.
+
+    Rows flagged in needs_norm are normalized on the fly, in the same pass
+    as the dot product, so no normalized copy of the matrix is made.
+
+    Args:
+        matrix: (N, D) float32 candidate embeddings
+        query_unit: (D,) float32 unit-length query
+        needs_norm: (N,) bool, True for rows not stored unit-length
+
+    Returns:
+        np.ndarray: (N,) float32 similarities
+    """
+    out = np.empty(matrix.shape[0], dtype=np.float32)
+    for i in prange(matrix.shape[0]):
+        dot = 0.0
+        sq = 0.0
+        for j in range(matrix.shape[1]):
+            v = matrix[i, j]
+            dot += v * query_unit[j]
+            sq += v * v
+        out[i] = dot / (np.sqrt(sq) + 1e-12) if needs_norm[i] else dot
+    return out
+
+
+if njit is not None:
+    _score_rows = njit(parallel=True, fastmath=True, cache=True)(_score_rows)
+
 
 class VectorReranker:
     """Helper class for vector-based reranking of email search results."""
     
-    def __init__(self, mongodb_handler: MongoDBHandler, embedding_model=None):
+    def __init__(self, mongodb_handler: MongoDBHandler, embedding_model=None,
+                 embedding_cache=None, model_name: Optional[str] = None):
         """
         Initialize the vector reranker.
         
         Args:
             mongodb_handler (MongoDBHandler): MongoDB handler
             embedding_model: Sentence-transformers model for query embedding
+            embedding_cache: Optional SQLiteHandler whose embedding cache keeps
+                query embeddings across restarts (needs model_name)
+            model_name (Optional[str]): Name of embedding_model, part of the cache key
         """
         self.mongodb = mongodb_handler
+        self.embedding_cache = embedding_cache if model_name else None
+        self.model_name = model_name
+        # Bound once; the handler's collection is fixed for its lifetime
+        self._collection = mongodb_handler.collection
         self.embedding_model = embedding_model
+        # Switched off after the first failure on a server without Atlas search
+        self.use_vector_search = bool(VECTOR_SEARCH_INDEX)
+        # Keyed by (model identity, whitespace-normalized query)
+        self._query_cache = TTLCache(max_items=QUERY_CACHE_SIZE)
+        self._query_cache_model: Optional[int] = None
+        # Keyed by (query vector bytes, candidate IDs, top_k). Embeddings are rewritten by
+        # the ingestion process, which cannot reach these caches, so the TTLs bound staleness
+        self._rerank_cache = TTLCache(max_items=RERANK_CACHE_SIZE, ttl_sec=RERANK_CACHE_TTL)
+        # Covered-projection documents (packed vector, dtype, scale) by email ID
+        self._vector_cache = TTLCache(max_items=VECTOR_CACHE_SIZE, ttl_sec=VECTOR_CACHE_TTL)
     
     def rerank(self, email_ids: List[str], query_embedding: List[float], top_k: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Rerank emails by cosine similarity with query embedding.
         
+        A repeated call with the same query vector, candidates and top_k
+        within RERANK_CACHE_TTL seconds is answered from memory.
+        
         Args:
             email_ids (List[str]): List of email IDs to rerank
             query_embedding (List[float]): Query embedding vector
@@ -40,37 +143,228 @@ class VectorReranker:
         
         logger.info(f"Reranking {len(email_ids)} emails using vector similarity")
         
-        # Fetch embeddings from MongoDB
-        scored_emails = []
+        # Convert and normalize the query once; both scoring paths reuse it
+        query_vec = np.asarray(query_embedding, dtype=np.float32)
+        query_unit = query_vec / (np.linalg.norm(query_vec) + 1e-12)
+        
+        cache_key = None
+        if RERANK_CACHE_TTL > 0:
+            cache_key = (query_vec.tobytes(), tuple(email_ids), top_k)
+            cached = self._rerank_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Rerank cache hit for {len(email_ids)} emails")
+                return [dict(result) for result in cached]
+        
+        results = self._rerank_uncached(email_ids, query_vec, query_unit, top_k)
+        if cache_key is not None and results:
+            self._rerank_cache.set(cache_key, results)
+            return [dict(result) for result in results]
+        return results
+    
+    def _rerank_uncached(
+        self, email_ids: List[str], query_vec: np.ndarray, query_unit: np.ndarray, top_k: Optional[int]
+    ) -> List[Dict[str, Any]]:
+        """Score the candidates with Atlas Vector Search or locally; see rerank()."""
+        if self.use_vector_search:
+            results = self._vector_search(email_ids, query_unit, top_k)
+            if results is not None:
+                logger.info(f"Reranked to {len(results)} emails with Atlas Vector Search")
+                return results
+        
+        # With a top_k cut, score from the covering index and fetch metadata for the winners only
+        lookup_metadata = top_k is not None and 0 <= top_k < len(email_ids)
+        try:
+            docs = self._fetch_embeddings(email_ids, with_metadata=not lookup_metadata)
+        except Exception as e:
+            logger.error(f"Error getting embeddings for {len(email_ids)} emails: {str(e)}")
+            return []
+        
+        candidates = []
         for email_id in email_ids:
+            doc = docs.get(email_id)
+            if doc and 'embedding' in doc:
+                dim = embedding_dim(doc)
+                if dim != query_vec.size:
+                    logger.warning(f"Skipping email {email_id}: embedding has {dim} dims, query has {query_vec.size}")
+                    continue
+                candidates.append((email_id, doc))
+        
+        if not candidates:
+            logger.info("Reranked to 0 emails")
+            return []
+        
+        # Cosine similarity for all candidates as one matrix-vector product;
+        # vectors stored unit-length skip the norm
+        matrix = decode_embedding_matrix([doc for _, doc in candidates])
+        raw = np.array([not doc.get('normalized') for _, doc in candidates])
+        if njit is not None and len(candidates) >= NUMBA_MIN_CANDIDATES:
+            # Fused multi-core kernel; avoids copying the unnormalized rows
+            sims = _score_rows(np.ascontiguousarray(matrix), query_unit.astype(np.float32), raw)
+        else:
+            if raw.any():
+                matrix[raw] /= np.linalg.norm(matrix[raw], axis=1, keepdims=True) + 1e-12
+            sims = matrix @ query_unit
+        
+        # Best first, ties kept in input order; only the top_k are fully sorted.
+        # Ties at the cut are filled in input order rather than left to argpartition
+        order = np.arange(len(sims))
+        if top_k is not None and 0 <= top_k < len(sims):
+            if top_k == 0:
+                order = order[:0]
+            else:
+                cutoff = -np.partition(-sims, top_k - 1)[top_k - 1]
+                above = np.flatnonzero(sims > cutoff)
+                tied = np.flatnonzero(sims == cutoff)[:top_k - len(above)]
+                order = np.concatenate((above, tied))
+        order = order[np.lexsort((order, -sims[order]))]
+        
+        # Candidate docs may be shared with the vector cache, so metadata is kept
+        # in its own map instead of being written onto them
+        if lookup_metadata and len(order):
             try:
-                # Get embedding from MongoDB
-                doc = self.mongodb.collection.find_one({'id': email_id})
-                if doc and 'embedding' in doc:
-                    email_embedding = doc['embedding']
-                    
-                    # Compute cosine similarity
-                    similarity = self._cosine_similarity(query_embedding, email_embedding)
-                    
-                    scored_emails.append({
-                        'id': email_id,
-                        'similarity': similarity,
-                        'metadata': doc.get('metadata', {})
-                    })
+                metadata = self._fetch_metadata([candidates[i][0] for i in order])
             except Exception as e:
-                logger.error(f"Error getting embedding for email {email_id}: {str(e)}")
-                continue
-        
-        # Sort by similarity (descending)
-        scored_emails.sort(key=lambda x: x['similarity'], reverse=True)
+                logger.error(f"Error getting metadata for {len(order)} emails: {str(e)}")
+                return []
+        else:
+            metadata = {email_id: doc.get('metadata', {}) for email_id, doc in candidates}
         
-        # Return top_k if specified
-        if top_k is not None:
-            scored_emails = scored_emails[:top_k]
+        scored_emails = [
+            {
+                'id': candidates[i][0],
+                'similarity': float(sims[i]),
+                'metadata': metadata.get(candidates[i][0], {})
+            }
+            for i in order
+        ]
         
         logger.info(f"Reranked to {len(scored_emails)} emails")
         return scored_emails
     
+    def _fetch_embeddings(self, email_ids: List[str], with_metadata: bool) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetch stored embeddings for the candidate emails.
+        
+        Without metadata the query is covered by the embedding index, which
+        holds packed vectors only; IDs it does not return are looked up again
+        in case they carry legacy array embeddings. More than FETCH_CHUNK_SIZE
+        IDs are split into chunks fetched concurrently over the connection pool.
+        Vectors fetched without metadata are kept in an in-process cache of
+        VECTOR_CACHE_SIZE emails, and only IDs missing from it are queried.
+        
+        Args:
+            email_ids (List[str]): Candidate email IDs
+            with_metadata (bool): Include each email's metadata
+            
+        Returns:
+            Dict[str, Dict[str, Any]]: Documents keyed by email ID
+        """
+        if with_metadata:
+            return self._find_by_ids(email_ids, {}, EMBEDDING_PROJECTION)
+        
+        docs = {}
+        uncached = []
+        for email_id in email_ids:
+            doc = self._vector_cache.get(email_id) if VECTOR_CACHE_SIZE > 0 else None
+            if doc is not None:
+                docs[email_id] = doc
+            else:
+                uncached.append(email_id)
+        if not uncached:
+            return docs
+        
+        fetched = self._find_by_ids(uncached, {'embedding': {'$type': 'binData'}}, COVERED_PROJECTION)
+        # Legacy emails were stored long before this process started, so the
+        # known-ID filter has them; IDs never embedded skip the second query
+        missing = self.mongodb.filter_known_ids([email_id for email_id in uncached if email_id not in fetched])
+        if missing:
+            fetched.update(self._find_by_ids(missing, {}, COVERED_PROJECTION))
+        if VECTOR_CACHE_SIZE > 0:
+            for email_id, doc in fetched.items():
+                self._vector_cache.set(email_id, doc)
+        docs.update(fetched)
+        return docs
+    
+    def _find_by_ids(self, email_ids: List[str], extra_filter: Dict[str, Any],
+                     projection: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Run an $in find over email_ids, in parallel chunks when there are many, keyed by email ID."""
+        ids = list(dict.fromkeys(email_ids))
+        
+        def fetch(chunk: List[str]) -> List[Dict[str, Any]]:
+            return list(self._collection.find(
+                {'id': {'$in': chunk}, **extra_filter}, projection=projection, batch_size=len(chunk)
+            ))
+        
+        if len(ids) <= FETCH_CHUNK_SIZE:
+            return {doc['id']: doc for doc in fetch(ids)}
+        chunks = [ids[i:i + FETCH_CHUNK_SIZE] for i in range(0, len(ids), FETCH_CHUNK_SIZE)]
+        return {doc['id']: doc for part in FETCH_POOL.map(fetch, chunks) for doc in part}
+    
+    def _fetch_metadata(self, email_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch metadata for the given emails in one query, keyed by email ID."""
+        cursor = self._collection.find(
+            {'id': {'$in': list(email_ids)}},
+            projection={'_id': 0, 'id': 1, 'metadata': 1}
+        )
+        return {doc['id']: doc.get('metadata', {}) for doc in cursor}
+    
+    def _vector_search(self, email_ids: List[str], query_embedding: np.ndarray, top_k: Optional[int]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Score candidates server-side with Atlas $vectorSearch.
+        
+        The search is exact over the candidate IDs, so it ranks the same set
+        the client-side path would, without transferring the vectors.
+        
+        Args:
+            email_ids (List[str]): List of email IDs to rerank
+            query_embedding (np.ndarray): Unit-length float32 query vector
+            top_k (Optional[int]): Number of top results to return (None = all)
+            
+        Returns:
+            Optional[List[Dict[str, Any]]]: Reranked emails, or None to fall back
+            to client-side scoring
+        """
+        ids = list(dict.fromkeys(email_ids))
+        limit = len(ids) if top_k is None else min(top_k, len(ids))
+        if limit <= 0:
+            return []
+        
+        pipeline = [
+            {'$vectorSearch': {
+                'index': VECTOR_SEARCH_INDEX,
+                'path': 'embedding',
+                'queryVector': query_embedding.tolist(),
+                'filter': {'id': {'$in': ids}},
+                'exact': True,
+                'limit': limit
+            }},
+            {'$project': {'_id': 0, 'id': 1, 'metadata': 1, 'score': {'$meta': 'vectorSearchScore'}}}
+        ]
+        try:
+            docs = list(self._collection.aggregate(pipeline))
+        except OperationFailure as e:
+            logger.warning(f"Atlas Vector Search not available, scoring locally: {str(e)}")
+            self.use_vector_search = False
+            return None
+        except Exception as e:
+            logger.error(f"Error running vector search: {str(e)}")
+            return None
+        
+        # Vectors stored before the BSON vector format are not indexed
+        if len(docs) < limit:
+            logger.debug(f"Vector search matched {len(docs)}/{limit} candidates, scoring locally")
+            return None
+        
+        # Atlas reports cosine as (1 + cos) / 2; convert back to cosine
+        return [
+            {
+                'id': doc['id'],
+                'similarity': 2.0 * doc['score'] - 1.0,
+                'metadata': doc.get('metadata', {})
+            }
+            for doc in docs
+        ]
+    
     def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
         """
         Compute cosine similarity between two vectors.
@@ -82,24 +376,25 @@ class VectorReranker:
         Returns:
             float: Cosine similarity score
         """
-        # Convert to numpy arrays
-        v1 = np.array(vec1)
-        v2 = np.array(vec2)
+        v1 = np.asarray(vec1, dtype=np.float32)
+        v2 = np.asarray(vec2, dtype=np.float32)
         
-        # Compute cosine similarity
-        dot_product = np.dot(v1, v2)
         norm1 = np.linalg.norm(v1)
         norm2 = np.linalg.norm(v2)
-        
         if norm1 == 0 or norm2 == 0:
             return 0.0
         
-        return float(dot_product / (norm1 * norm2))
+        return float(np.dot(v1, v2) / (norm1 * norm2))
     
     def embed_query(self, query: str) -> Optional[List[float]]:
         """
         Generate embedding for a query string.
         
+        Repeated queries (ignoring surrounding and repeated whitespace) are
+        answered from a per-reranker LRU cache of QUERY_CACHE_SIZE entries,
+        then from the SQLite embedding cache when one was given, before the
+        model is run.
+        
         Args:
             query (str): Query text
             
@@ -110,6 +405,22 @@ class VectorReranker:
             logger.warning("No embedding model available for query embedding")
             return None
         
+        key = (id(self.embedding_model), ' '.join(query.split()))
+        cached = self._query_cache.get(key)
+        if cached is not None:
+            return list(cached)
+        
+        query_hash = None
+        if self.embedding_cache is not None:
+            query_hash = hashlib.blake2b(key[1].encode('utf-8'), digest_size=16).hexdigest()
+            stored = self.embedding_cache.get_cached_embeddings(
+                [query_hash], self.model_name, QUERY_EMBEDDING_PROVIDER
+            )
+            if query_hash in stored:
+                embedding = stored[query_hash][0].tolist()
+                self._remember_query(key, embedding)
+                return embedding
+        
         try:
             # Generate embedding with normalization
             embedding_array = self.embedding_model.encode(
@@ -117,10 +428,25 @@ class VectorReranker:
                 normalize_embeddings=True,
                 show_progress_bar=False
             )
-            return embedding_array[0].tolist()
+            embedding = embedding_array[0].tolist()
         except Exception as e:
             logger.error(f"Error embedding query: {str(e)}")
             return None
+        
+        if query_hash is not None:
+            self.embedding_cache.cache_embeddings(
+                [{'hash': query_hash, 'embedding': embedding}], self.model_name, QUERY_EMBEDDING_PROVIDER
+            )
+        self._remember_query(key, embedding)
+        return embedding
+    
+    def _remember_query(self, key: Tuple[int, str], embedding: List[float]) -> None:
+        """Store a query embedding in the in-process cache."""
+        # A swapped model invalidates everything cached for the old one
+        if self._query_cache_model != key[0]:
+            self._query_cache.clear()
+            self._query_cache_model = key[0]
+        self._query_cache.set(key, tuple(embedding))
 
 
 
@@ -1,17 +1,51 @@
 """
 Query service for RAG-based email search with Sarvam AI.
 """
+import html
 import logging
 import os
 import re
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+import orjson
+from typing import Iterator, List, Dict, Any, Optional, Tuple
 from collections import defaultdict
 from src.rag.sqlite_search import EmailSearcher
 from src.rag.mongo_vectors import VectorReranker
 from src.SarvamClient import SarvamClient
+from src.rag.caches import SingleFlight, TTLCache
+from src.SQLiteHandler import SQLiteHandler
 
 logger = logging.getLogger('outlook-email.rag.query')
 
+# Patterns used on every email body and question, compiled once
+_TAG_RE = re.compile(r'<[^>]+>')
+_KEYWORD_RE = re.compile(r'\b[\w-]+\b')
+_STOP_WORDS = frozenset({
+    'the', 'what', 'when', 'where', 'who', 'why', 'how', 'with', 'about', 'from', 'for', 'and', 'or',
+    'but', 'did', 'happened', 'said', 'say', 'give', 'me', 'brief', 'tell', 'show', 'find', 'search', 'query'
+})
+
+# Literal lookups answered straight from SQLite, without reranking or Sarvam
+_QUOTED_PHRASE_RE = re.compile(r'^"(.+)"$')
+# Graph message IDs are URL-safe base64; requiring a digit keeps long plain words out
+_EMAIL_ID_RE = re.compile(r'^(?=.*\d)[A-Za-z0-9_=-]{20,}$')
+_SENDER_RE = re.compile(r'^from:\s*(\S+@\S+)$', re.IGNORECASE)
+
+# Chat model used for answer generation
+SARVAM_MODEL = os.getenv('SARVAM_MODEL', 'sarvam-m')
+
+# Prompt context budget (~6k tokens); emails past it are not cleaned or included
+MAX_CONTEXT_CHARS = int(os.getenv('MAX_CONTEXT_CHARS', '24000'))
+# Share of the context that attachment excerpts may take in total
+MAX_ATTACHMENT_CONTEXT_CHARS = 8000
+
+# Embeds the question while SQLite retrieval runs, so the vector is ready for reranking
+EMBED_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix='query-embed')
+
+# Answers reused for repeated questions; 0 disables the cache
+ANSWER_CACHE_TTL = float(os.getenv('ANSWER_CACHE_TTL', '60'))
+ANSWER_CACHE_SIZE = 512
+
 
 def clean_html_body(html_content: str) -> str:
     """
@@ -27,27 +61,27 @@ def clean_html_body(html_content: str) -> str:
     if not html_content:
         return ""
     
-    import html
-    
-    # Decode HTML entities
+    # Decode HTML entities (tags may themselves be entity-encoded)
     text = html.unescape(html_content)
     
     # Remove HTML tags using regex (simple approach)
-    text = re.sub(r'<[^>]+>', '', text)
+    if '<' in text:
+        text = _TAG_RE.sub('', text)
     
     # Decode HTML entities again (in case they were in attributes)
     text = html.unescape(text)
     
-    # Clean up whitespace
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'\n\s*\n', '\n\n', text)
+    # Collapse and trim whitespace in one C-level pass; str.split() splits on
+    # exactly the characters \s matches
+    text = ' '.join(text.split())
     
-    # Remove common email artifacts
-    text = text.replace('&nbsp;', ' ')
-    text = text.replace('&amp;', '&')
-    text = text.replace('&lt;', '<')
-    text = text.replace('&gt;', '>')
-    text = text.replace('&quot;', '"')
+    # Remove common email artifacts left by double-encoded entities
+    if '&' in text:
+        text = text.replace('&nbsp;', ' ')
+        text = text.replace('&amp;', '&')
+        text = text.replace('&lt;', '<')
+        text = text.replace('&gt;', '>')
+        text = text.replace('&quot;', '"')
     
     return text.strip()
 
@@ -63,7 +97,8 @@ class QueryService:
         email_searcher: EmailSearcher,
         vector_reranker: VectorReranker,
         sarvam_client: SarvamClient,
-        enable_vector_rerank: bool = True
+        enable_vector_rerank: bool = True,
+        sqlite_handler: Optional[SQLiteHandler] = None
     ):
         """
         Initialize the query service.
@@ -73,75 +108,207 @@ class QueryService:
             vector_reranker (VectorReranker): Vector reranking helper
             sarvam_client (SarvamClient): Sarvam AI client for answer generation
             enable_vector_rerank (bool): Whether to use vector reranking
+            sqlite_handler (SQLiteHandler, optional): Handler for attachment lookups;
+                defaults to the searcher's handler
         """
         self.searcher = email_searcher
+        self.sqlite = sqlite_handler or getattr(email_searcher, 'sqlite', None)
         self.reranker = vector_reranker
         self.sarvam = sarvam_client
         self.enable_vector_rerank = enable_vector_rerank
+        # Keyed by (normalized question, top_k, enable_vector_rerank)
+        self._answer_cache = TTLCache(max_items=ANSWER_CACHE_SIZE, ttl_sec=ANSWER_CACHE_TTL)
+        # Concurrent identical questions share one retrieval and Sarvam call
+        self._inflight = SingleFlight()
     
     def query(
         self,
         question: str,
-        top_k: int = 8
+        top_k: int = 8,
+        force_refresh: bool = False
     ) -> Dict[str, Any]:
         """
         Process a user question and return an answer grounded in emails.
         Uses thread-aware retrieval to provide full conversation context.
         
+        Successful answers are reused for ANSWER_CACHE_TTL seconds when the
+        same question (ignoring case and extra whitespace) is asked again,
+        and identical questions asked concurrently share one computation.
+        
         Args:
             question (str): User's question
             top_k (int): Number of threads to retrieve
+            force_refresh (bool): Ignore and replace any cached answer
             
         Returns:
             Dict[str, Any]: Response with answer, citations, and retrieved emails
         """
+        key = self._answer_cache_key(question, top_k)
+        if ANSWER_CACHE_TTL > 0 and not force_refresh:
+            cached = self._answer_cache.get(key)
+            if cached is not None:
+                logger.info(f"Answer cache hit for query: '{question}'")
+                return dict(cached)
+        
+        result, cacheable = self._inflight.do(key, lambda: self._answer_question(question, top_k))
+        if ANSWER_CACHE_TTL > 0 and cacheable:
+            self._answer_cache.set(key, result)
+        return dict(result)
+    
+    def query_stream(
+        self,
+        question: str,
+        top_k: int = 8,
+        force_refresh: bool = False
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Process a user question, streaming the answer as Sarvam generates it.
+        
+        Yields a 'context' event once retrieval is done (success, citations,
+        retrieved_emails), then 'token' events with answer text, then a 'done'
+        event with the full answer. All SQLite work happens before the first
+        event is yielded. Completed answers share the query() answer cache.
+        
+        Args:
+            question (str): User's question
+            top_k (int): Number of threads to retrieve
+            force_refresh (bool): Ignore and replace any cached answer
+            
+        Yields:
+            Dict[str, Any]: Stream events, each with a 'type' key
+        """
+        key = self._answer_cache_key(question, top_k)
+        cached = None
+        if ANSWER_CACHE_TTL > 0 and not force_refresh:
+            cached = self._answer_cache.get(key)
+        
+        if cached is not None:
+            logger.info(f"Answer cache hit for query: '{question}'")
+            response, prompt, cacheable = dict(cached), None, False
+        else:
+            response, prompt, cacheable = self._prepare_answer(question, top_k)
+        
+        yield {
+            "type": "context",
+            "success": response["success"],
+            "citations": response["citations"],
+            "retrieved_emails": response["retrieved_emails"]
+        }
+        
+        if prompt is None:
+            answer = response["answer"]
+            yield {"type": "token", "text": answer}
+        else:
+            logger.info("Step 8: Streaming answer with Sarvam")
+            parts = []
+            try:
+                for text in self._stream_answer(prompt):
+                    parts.append(text)
+                    yield {"type": "token", "text": text}
+            except Exception as e:
+                logger.error(f"Error streaming answer: {str(e)}")
+                error = f"I found relevant emails but encountered an error generating the answer: {str(e)}"
+                parts.append(error)
+                yield {"type": "token", "text": error}
+                cacheable = False
+            answer = "".join(parts)
+            response["answer"] = answer
+        
+        if ANSWER_CACHE_TTL > 0 and cacheable:
+            self._answer_cache.set(key, response)
+        yield {"type": "done", "answer": answer}
+    
+    def _answer_cache_key(self, question: str, top_k: int) -> Tuple[str, int, bool]:
+        """Cache key for a question: case and extra whitespace are ignored."""
+        return (' '.join(question.split()).casefold(), top_k, self.enable_vector_rerank)
+    
+    def _answer_question(self, question: str, top_k: int) -> Tuple[Dict[str, Any], bool]:
+        """
+        Run retrieval and answer generation for a question.
+        
+        Args:
+            question (str): User's question
+            top_k (int): Number of threads to retrieve
+            
+        Returns:
+            Tuple[Dict[str, Any], bool]: (response, whether it may be cached);
+            failed searches and failed answer generation are not cached
+        """
+        response, prompt, cacheable = self._prepare_answer(question, top_k)
+        if prompt is None:
+            return response, cacheable
+        
+        # Step 8: Call Sarvam for answer generation
+        logger.info("Step 8: Generating answer with Sarvam")
+        try:
+            answer_response = self._generate_answer(prompt)
+            response["answer"] = answer_response.get(
+                'answer', 'I apologize, but I encountered an error generating the answer.'
+            )
+            answered = not answer_response.get('error')
+        except Exception as e:
+            logger.error(f"Error generating answer: {str(e)}")
+            response["answer"] = f"I found relevant emails but encountered an error generating the answer: {str(e)}"
+            answered = False
+        
+        return response, answered
+    
+    def _prepare_answer(self, question: str, top_k: int) -> Tuple[Dict[str, Any], Optional[str], bool]:
+        """
+        Retrieve emails for a question and build the answer prompt.
+        
+        Args:
+            question (str): User's question
+            top_k (int): Number of threads to retrieve
+            
+        Returns:
+            Tuple[Dict[str, Any], Optional[str], bool]: (response, prompt, cacheable).
+            When prompt is None the response is already final (no matches, or a
+            literal lookup); otherwise its answer still has to be generated.
+        """
         logger.info(f"Processing query: '{question}' (top_k={top_k})")
         
+        intent = self._classify_intent(question)
+        if intent != 'semantic':
+            response, cacheable = self._answer_literal(question, intent, top_k)
+            return response, None, cacheable
+        
+        # Start the query embedding now; it overlaps FTS and thread retrieval and is
+        # cached by the reranker, so questions that end up not reranked lose little
+        embedding_future = None
+        if self.enable_vector_rerank and self.reranker.embedding_model is not None:
+            embedding_future = EMBED_POOL.submit(self.reranker.embed_query, question)
+        
         # Extract keywords once for reuse
         keywords = self._extract_keywords(question)
+        # Cleaned bodies by email ID; relevance, context and citations all need them
+        cleaned_bodies: Dict[str, str] = {}
         logger.info(f"Extracted keywords: {keywords}")
+        relevance_terms = self._relevance_terms(keywords)
         
         # Step 1: Build enhanced FTS query for better recall
         logger.info("Step 1: Building enhanced FTS query")
-        enhanced_query = self._build_enhanced_query(question)
+        enhanced_query = self._build_enhanced_query(question, keywords)
         logger.info(f"Enhanced query: '{enhanced_query}'")
         
-        # Step 2: FTS search with expanded results
-        logger.info("Step 2: FTS search")
-        fts_results = self.searcher.search(enhanced_query, top_k=top_k * 3)  # Get more for thread grouping
+        # Step 2: FTS search, grouped by conversation in SQLite
+        logger.info("Step 2: FTS thread search")
+        top_threads = self.searcher.search_threads(enhanced_query, top_k=top_k)
         
-        if not fts_results:
+        if not top_threads:
             logger.warning("No emails found matching query")
             return {
                 "success": False,
                 "answer": "I couldn't find any relevant emails to answer your question.",
                 "citations": [],
                 "retrieved_emails": []
-            }
-        
-        logger.info(f"FTS returned {len(fts_results)} results")
-        
-        # Step 3: Group by conversation_id and select top threads
-        logger.info("Step 3: Grouping by conversation_id")
-        thread_groups = defaultdict(list)
-        for email in fts_results:
-            conv_id = email.get('conversation_id')
-            if conv_id:
-                thread_groups[conv_id].append(email)
-            else:
-                # Emails without conversation_id are treated as single-message threads
-                thread_groups[email['id']].append(email)
+            }, None, False
         
-        # Select top threads (by highest rank in thread)
-        top_threads = []
-        for conv_id, emails in thread_groups.items():
-            # Sort by rank (lower is better in FTS5)
-            emails_sorted = sorted(emails, key=lambda x: x.get('rank', 999999))
-            top_threads.append((conv_id, emails_sorted[0]))  # Store best match per thread
-        
-        # Sort threads by best match rank
-        top_threads.sort(key=lambda x: x[1].get('rank', 999999))
-        top_thread_ids = [conv_id for conv_id, _ in top_threads[:top_k]]
+        # Step 3: Threads arrive ranked by their best match
+        top_thread_ids = [thread['thread_id'] for thread in top_threads]
+        best_by_thread = {thread['thread_id']: thread for thread in top_threads}
+        # Emails the FTS query itself matched need no Python relevance re-check
+        fts_matched_ids = {email_id for thread in top_threads for email_id in thread.get('matched_ids', ())}
         
         logger.info(f"Selected {len(top_thread_ids)} top threads")
         
@@ -151,11 +318,14 @@ class QueryService:
         thread_metadata = {}
         processed_email_ids = set()
         
+        # One query for every real conversation; single-email threads are keyed
+        # by an email ID and have nothing more to fetch
+        emails_by_thread = self.searcher.get_threads_emails(
+            [thread['thread_id'] for thread in top_threads if thread.get('conversation_id')]
+        )
+        
         for conv_id in top_thread_ids:
-            # Check if this is a real conversation_id or a single email ID
-            # Real conversation_ids are typically longer UUIDs, single email IDs are message IDs
-            # Try to fetch thread first
-            thread_emails = self.searcher.get_thread_emails(conv_id)
+            thread_emails = emails_by_thread.get(conv_id)
             
             if thread_emails:
                 # This is a real conversation - filter thread emails for relevance
@@ -163,7 +333,9 @@ class QueryService:
                 for email in thread_emails:
                     if email['id'] not in processed_email_ids:
                         # Only include emails that match the search query
-                        if self._is_email_relevant(email, keywords):
+                        if email['id'] in fts_matched_ids or self._is_email_relevant(
+                            email, relevance_terms, cleaned_bodies
+                        ):
                             relevant_thread_emails.append(email)
                             processed_email_ids.add(email['id'])
                 
@@ -176,10 +348,10 @@ class QueryService:
                     }
             else:
                 # No thread found - this is a single email (no conversation_id)
-                single_email = next((e for e in fts_results if e['id'] == conv_id or (not e.get('conversation_id') and e['id'] == conv_id)), None)
+                single_email = best_by_thread.get(conv_id)
                 if single_email and single_email['id'] not in processed_email_ids:
                     # Only include if relevant
-                    if self._is_email_relevant(single_email, keywords):
+                    if self._is_email_relevant(single_email, relevance_terms, cleaned_bodies):
                         all_thread_emails.append(single_email)
                         processed_email_ids.add(single_email['id'])
                         thread_metadata[conv_id] = {
@@ -187,14 +359,22 @@ class QueryService:
                             'subject': single_email.get('subject', 'No Subject')
                         }
         
+        # Thread search returns snippets only; load bodies for the emails kept
+        missing_bodies = [email['id'] for email in all_thread_emails if 'body' not in email]
+        if missing_bodies:
+            bodies = self.searcher.get_bodies(missing_bodies)
+            for email in all_thread_emails:
+                if 'body' not in email:
+                    email['body'] = bodies.get(email['id'], '')
+        
         logger.info(f"Fetched {len(all_thread_emails)} relevant emails across {len(thread_metadata)} threads")
         
         # Step 5: Optional vector reranking on thread level
         final_thread_emails = all_thread_emails
-        if self.enable_vector_rerank and self.reranker.embedding_model is not None and len(all_thread_emails) > top_k * 5:
+        if embedding_future is not None and len(all_thread_emails) > top_k * 5:
             logger.info("Step 5: Vector reranking thread emails")
             try:
-                query_embedding = self.reranker.embed_query(question)
+                query_embedding = embedding_future.result()
                 if query_embedding:
                     email_ids = [email['id'] for email in all_thread_emails]
                     reranked = self.reranker.rerank(email_ids, query_embedding, top_k=top_k * 5)
@@ -217,30 +397,96 @@ class QueryService:
         
         # Step 6: Build thread-aware context
         logger.info("Step 6: Building thread-aware context")
-        context = self._build_thread_context(final_thread_emails, thread_metadata)
+        context = self._build_thread_context(final_thread_emails, thread_metadata, cleaned_bodies)
         prompt = self._build_prompt(question, context)
         
-        # Step 7: Call Sarvam for answer generation
-        logger.info("Step 7: Generating answer with Sarvam")
-        try:
-            answer_response = self._generate_answer(prompt)
-            answer = answer_response.get('answer', 'I apologize, but I encountered an error generating the answer.')
-            raw_citations = answer_response.get('citations', [])
-        except Exception as e:
-            logger.error(f"Error generating answer: {str(e)}")
-            answer = f"I found relevant emails but encountered an error generating the answer: {str(e)}"
-            raw_citations = []
+        # Step 7: Build citations from threads (filtered for relevance)
+        logger.info("Step 7: Building citations")
+        # Every email here already passed the relevance filter in step 4
+        citations = self._build_citations(final_thread_emails, None, [], cleaned_bodies)
         
-        # Step 8: Build citations from threads (filtered for relevance)
-        logger.info("Step 8: Building citations")
-        citations = self._build_citations(final_thread_emails, keywords, raw_citations)
+        return {
+            "success": True,
+            "answer": "",
+            "citations": citations,
+            "retrieved_emails": final_thread_emails[:top_k * 10]  # Return more for thread context
+        }, prompt, True
+    
+    @staticmethod
+    def _classify_intent(question: str) -> str:
+        """
+        Classify a question as a literal lookup or a semantic question.
+        
+        Args:
+            question (str): User's question
+            
+        Returns:
+            str: 'literal_phrase' for a quoted phrase, 'id_lookup' for a bare
+            email ID, 'sender_lookup' for 'from:address', otherwise 'semantic'
+        """
+        text = question.strip()
+        if _QUOTED_PHRASE_RE.match(text):
+            return 'literal_phrase'
+        if _EMAIL_ID_RE.match(text):
+            return 'id_lookup'
+        if _SENDER_RE.match(text):
+            return 'sender_lookup'
+        return 'semantic'
+    
+    def _answer_literal(self, question: str, intent: str, top_k: int) -> Tuple[Dict[str, Any], bool]:
+        """
+        Answer a literal lookup from the matching emails directly.
+        
+        Reranking and answer generation are skipped; the answer is built from
+        the top hit's subject and snippet.
+        
+        Args:
+            question (str): User's question
+            intent (str): Intent from _classify_intent
+            top_k (int): Number of emails to return
+            
+        Returns:
+            Tuple[Dict[str, Any], bool]: (response, whether it may be cached)
+        """
+        text = question.strip()
+        logger.info(f"Literal lookup ({intent}), skipping reranking and answer generation")
+        
+        if intent == 'literal_phrase':
+            hits = self.searcher.search_phrase(_QUOTED_PHRASE_RE.match(text).group(1), top_k=top_k)
+        elif intent == 'id_lookup':
+            email = self.searcher.get_email(text)
+            hits = [email] if email else []
+        else:
+            hits = self.searcher.search_sender(_SENDER_RE.match(text).group(1), top_k=top_k)
+        hits = hits[:top_k]
+        
+        if not hits:
+            logger.warning("No emails found for literal lookup")
+            return {
+                "success": False,
+                "answer": "I couldn't find any relevant emails to answer your question.",
+                "citations": [],
+                "retrieved_emails": []
+            }, False
+        
+        cleaned_bodies: Dict[str, str] = {}
+        citations = self._build_citations(hits, None, [], cleaned_bodies)
+        top = citations[0]
+        sender = f"{top.get('sender') or ''} <{top.get('sender_email') or ''}>".strip()
+        answer = (
+            f"Found {len(hits)} matching email{'s' if len(hits) != 1 else ''}. "
+            f"Top match: \"{top.get('subject') or 'No Subject'}\" from {sender} "
+            f"on {top.get('received_time') or 'unknown date'}."
+        )
+        if top.get('snippet'):
+            answer += f"\n\n{top['snippet']}"
         
         return {
             "success": True,
             "answer": answer,
             "citations": citations,
-            "retrieved_emails": final_thread_emails[:top_k * 10]  # Return more for thread context
-        }
+            "retrieved_emails": hits
+        }, True
     
     def _extract_keywords(self, question: str) -> List[str]:
         """
@@ -253,26 +499,27 @@ class QueryService:
             List[str]: List of keywords
         """
         # Extract potential keywords (proper nouns, hyphenated terms, etc.)
-        words = re.findall(r'\b[\w-]+\b', question.lower())
+        words = _KEYWORD_RE.findall(question.lower())
         
         # Filter for meaningful keywords (length > 2, not common stop words)
-        stop_words = {'the', 'what', 'when', 'where', 'who', 'why', 'how', 'with', 'about', 'from', 'for', 'and', 'or', 'but', 'did', 'happened', 'said', 'say', 'give', 'me', 'brief', 'tell', 'show', 'find', 'search', 'query'}
-        keywords = [w for w in words if len(w) > 2 and w not in stop_words]
+        keywords = [w for w in words if len(w) > 2 and w not in _STOP_WORDS]
         
         return keywords
     
-    def _build_enhanced_query(self, question: str) -> str:
+    def _build_enhanced_query(self, question: str, keywords: Optional[List[str]] = None) -> str:
         """
         Build an enhanced FTS query with better recall.
         Extracts keywords, handles variations, and builds OR queries.
         
         Args:
             question (str): Original question
+            keywords (List[str], optional): Keywords already extracted from question
             
         Returns:
             str: Enhanced FTS query
         """
-        keywords = self._extract_keywords(question)
+        if keywords is None:
+            keywords = self._extract_keywords(question)
         
         # Build OR query for better recall
         if len(keywords) > 1:
@@ -294,13 +541,56 @@ class QueryService:
         
         return enhanced
     
-    def _is_email_relevant(self, email: Dict[str, Any], keywords: List[str]) -> bool:
+    @staticmethod
+    def _relevance_terms(keywords: List[str]) -> List[str]:
+        """
+        Reduce keywords to the smallest set with the same substring-match result.
+        
+        A keyword containing a shorter keyword can only match where the
+        shorter one does, so it is dropped, as are duplicates.
+        
+        Args:
+            keywords (List[str]): Search keywords
+            
+        Returns:
+            List[str]: Keywords to test, shortest first
+        """
+        terms: List[str] = []
+        for keyword in sorted(set(keywords), key=len):
+            if not any(term in keyword for term in terms):
+                terms.append(keyword)
+        return terms
+    
+    @staticmethod
+    def _cleaned_body(email: Dict[str, Any], cleaned_bodies: Optional[Dict[str, str]] = None) -> str:
+        """
+        Return the email body with HTML removed, cleaning each email at most once per cache.
+        
+        Args:
+            email (Dict[str, Any]): Email with an optional 'body'
+            cleaned_bodies (Dict[str, str], optional): Per-query cache keyed by email ID
+            
+        Returns:
+            str: Cleaned plain text
+        """
+        email_id = email.get('id')
+        if cleaned_bodies is None or email_id is None:
+            return clean_html_body(email.get('body', '') or '')
+        cleaned = cleaned_bodies.get(email_id)
+        if cleaned is None:
+            cleaned = cleaned_bodies[email_id] = clean_html_body(email.get('body', '') or '')
+        return cleaned
+    
+    def _is_email_relevant(
+        self, email: Dict[str, Any], keywords: List[str], cleaned_bodies: Optional[Dict[str, str]] = None
+    ) -> bool:
         """
         Check if an email is relevant to the search query by checking if it contains any keywords.
         
         Args:
             email (Dict[str, Any]): Email to check
             keywords (List[str]): List of search keywords
+            cleaned_bodies (Dict[str, str], optional): Per-query cache of cleaned bodies
             
         Returns:
             bool: True if email is relevant
@@ -308,17 +598,17 @@ class QueryService:
         if not keywords:
             return True  # If no keywords, include all
         
-        # Get email text (subject + body)
-        subject = (email.get('subject', '') or '').lower()
-        body = (email.get('body', '') or '').lower()
-        body_cleaned = clean_html_body(body).lower()
+        # An FTS snippet means the search already matched this email
+        if email.get('snippet'):
+            return True
         
-        # Check if any keyword appears in subject or body
-        for keyword in keywords:
-            if keyword in subject or keyword in body_cleaned:
-                return True
+        # A subject match needs no body cleaning at all
+        subject = (email.get('subject', '') or '').lower()
+        if any(keyword in subject for keyword in keywords):
+            return True
         
-        return False
+        body_cleaned = self._cleaned_body(email, cleaned_bodies).lower()
+        return any(keyword in body_cleaned for keyword in keywords)
     
     def _build_context(self, emails: List[Dict[str, Any]]) -> str:
         """
@@ -342,7 +632,10 @@ Body: {email.get('body', '')[:500]}...
         
         return "\n---\n".join(context_parts)
     
-    def _build_thread_context(self, emails: List[Dict[str, Any]], thread_metadata: Dict[str, Dict]) -> str:
+    def _build_thread_context(
+        self, emails: List[Dict[str, Any]], thread_metadata: Dict[str, Dict],
+        cleaned_bodies: Optional[Dict[str, str]] = None
+    ) -> str:
         """
         Build thread-aware context string from retrieved emails.
         Groups emails by conversation and presents them chronologically.
@@ -350,6 +643,7 @@ Body: {email.get('body', '')[:500]}...
         Args:
             emails (List[Dict[str, Any]]): Retrieved emails (may include full threads)
             thread_metadata (Dict[str, Dict]): Metadata about threads
+            cleaned_bodies (Dict[str, str], optional): Per-query cache of cleaned bodies
             
         Returns:
             str: Formatted thread context string
@@ -369,13 +663,42 @@ Body: {email.get('body', '')[:500]}...
         for conv_id in threads:
             threads[conv_id].sort(key=lambda x: x.get('received_time', ''))
         
+        # Attachments for every email in the context, fetched in one query
+        attachments_by_email = self._get_attachments_bulk(
+            [email['id'] for email in emails if email.get('id')]
+        )
+        
         context_parts = []
         thread_num = 1
+        # Characters of context and of attachment excerpts used so far
+        running_chars = 0
+        attachment_chars = 0
+        included = 0
+        
+        def add(part: str) -> None:
+            nonlocal running_chars
+            context_parts.append(part)
+            running_chars += len(part)
+        
+        def add_attachments(email_id: Optional[str], indent: str) -> None:
+            nonlocal attachment_chars
+            attachments = attachments_by_email.get(email_id) if email_id else None
+            if not attachments or attachment_chars >= MAX_ATTACHMENT_CONTEXT_CHARS:
+                return
+            add(f"{indent}Attachments:")
+            for att in attachments[:5]:  # Limit to 5 attachments per email
+                att_text = att.get('extracted_text', '') or att.get('text', '')
+                if att_text and attachment_chars < MAX_ATTACHMENT_CONTEXT_CHARS:
+                    att_preview = att_text[:500] + ('...' if len(att_text) > 500 else '')
+                    add(f"{indent}  - {att.get('filename', 'unknown')}: {att_preview}")
+                    attachment_chars += len(att_preview)
         
         # Process threads
         for conv_id, thread_emails in threads.items():
+            if running_chars >= MAX_CONTEXT_CHARS:
+                break
             thread_info = thread_metadata.get(conv_id, {})
-            context_parts.append(f"""
+            add(f"""
 THREAD {thread_num} ({thread_info.get('count', len(thread_emails))} messages):
 Subject: {thread_info.get('subject', thread_emails[0].get('subject', 'No Subject'))}
 Conversation ID: {conv_id}
@@ -383,40 +706,34 @@ Conversation ID: {conv_id}
 """)
             
             for msg_num, email in enumerate(thread_emails, 1):
+                if running_chars >= MAX_CONTEXT_CHARS:
+                    break
                 # Clean HTML from body and use larger body budget for thread context (2000 chars per message)
-                body = email.get('body', '')
-                body_cleaned = clean_html_body(body)
+                body_cleaned = self._cleaned_body(email, cleaned_bodies)
                 body_preview = body_cleaned[:2000] + ('...' if len(body_cleaned) > 2000 else '')
                 
-                context_parts.append(f"""  Message {msg_num}:
+                add(f"""  Message {msg_num}:
   From: {email.get('sender_name', '')} <{email.get('sender_email', '')}>
   Date: {email.get('received_time', '')}
   Body: {body_preview}
 """)
                 
                 # Add attachment content if available
-                email_id = email.get('id')
-                if email_id:
-                    attachments = self._get_email_attachments(email_id)
-                    if attachments:
-                        context_parts.append("  Attachments:")
-                        for att in attachments[:5]:  # Limit to 5 attachments per email
-                            att_text = att.get('extracted_text', '') or att.get('text', '')
-                            if att_text:
-                                att_preview = att_text[:500] + ('...' if len(att_text) > 500 else '')
-                                context_parts.append(f"    - {att.get('filename', 'unknown')}: {att_preview}")
+                add_attachments(email.get('id'), "  ")
                 
-                context_parts.append("")
+                add("")
+                included += 1
             
             thread_num += 1
         
         # Process standalone emails (no conversation_id)
         for email in standalone:
-            body = email.get('body', '')
-            body_cleaned = clean_html_body(body)
+            if running_chars >= MAX_CONTEXT_CHARS:
+                break
+            body_cleaned = self._cleaned_body(email, cleaned_bodies)
             body_preview = body_cleaned[:2000] + ('...' if len(body_cleaned) > 2000 else '')
             
-            context_parts.append(f"""
+            add(f"""
 STANDALONE EMAIL {thread_num}:
 Subject: {email.get('subject', 'No Subject')}
 From: {email.get('sender_name', '')} <{email.get('sender_email', '')}>
@@ -425,22 +742,31 @@ Body: {body_preview}
 """)
             
             # Add attachment content if available
-            email_id = email.get('id')
-            if email_id:
-                attachments = self._get_email_attachments(email_id)
-                if attachments:
-                    context_parts.append("Attachments:")
-                    for att in attachments[:5]:  # Limit to 5 attachments per email
-                        att_text = att.get('extracted_text', '') or att.get('text', '')
-                        if att_text:
-                            att_preview = att_text[:500] + ('...' if len(att_text) > 500 else '')
-                            context_parts.append(f"  - {att.get('filename', 'unknown')}: {att_preview}")
+            add_attachments(email.get('id'), "")
             
-            context_parts.append("")
+            add("")
+            included += 1
             thread_num += 1
         
+        if included < len(emails):
+            logger.info(f"Context budget reached: included {included} of {len(emails)} emails")
+        
         return "\n".join(context_parts)
     
+    def _get_attachments_bulk(self, email_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Get attachments for many emails from SQLite with one IN query.
+        
+        Args:
+            email_ids: Email IDs
+            
+        Returns:
+            Dict mapping email ID to its attachments, longest text first
+        """
+        if not email_ids or self.sqlite is None:
+            return {}
+        return self.sqlite.get_extracted_attachments(email_ids, per_email_limit=10)
+    
     def _get_email_attachments(self, email_id: str) -> List[Dict[str, Any]]:
         """
         Get attachments for an email from SQLite.
@@ -451,41 +777,7 @@ Body: {body_preview}
         Returns:
             List of attachment dictionaries
         """
-        try:
-            # Import here to avoid circular dependencies
-            from src.SQLiteHandler import SQLiteHandler
-            import os
-            from dotenv import load_dotenv
-            load_dotenv()
-            
-            db_path = os.getenv('SQLITE_DB_PATH')
-            handler = SQLiteHandler(db_path)
-            
-            cursor = handler.conn.cursor()
-            cursor.execute('''
-                SELECT filename, extracted_text, mime_type, text_length
-                FROM attachments
-                WHERE email_id = ? AND extracted_text IS NOT NULL AND extracted_text != ''
-                ORDER BY text_length DESC
-                LIMIT 10
-            ''', (email_id,))
-            
-            results = cursor.fetchall()
-            attachments = []
-            for row in results:
-                attachments.append({
-                    'filename': row[0],
-                    'extracted_text': row[1],
-                    'text': row[1],  # Alias for compatibility
-                    'mime_type': row[2],
-                    'text_length': row[3]
-                })
-            
-            handler.close()
-            return attachments
-        except Exception as e:
-            logger.error(f"Error getting attachments for email {email_id}: {str(e)}")
-            return []
+        return self._get_attachments_bulk([email_id]).get(email_id, [])
     
     def _build_prompt(self, question: str, context: str) -> str:
         """
@@ -530,17 +822,8 @@ Please provide:
         Returns:
             Dict[str, Any]: Response with answer and citations
         """
-        import requests
-        
-        # Use Sarvam's corrected endpoint
-        url = "https://api.sarvam.ai/v1/chat/completions"
-        headers = {
-            "api-subscription-key": os.getenv("SARVAM_API_KEY"),
-            "Content-Type": "application/json"
-        }
-        
         payload = {
-            "model": os.getenv("SARVAM_MODEL", "sarvam-m"),
+            "model": SARVAM_MODEL,
             "messages": [
                 {
                     "role": "user",
@@ -552,7 +835,8 @@ Please provide:
         }
         
         try:
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
+            # Sarvam's corrected endpoint, over the client's keep-alive session
+            response = self.sarvam.post_json("/v1/chat/completions", payload, timeout=30)
             
             if response.status_code == 200:
                 result = response.json()
@@ -566,13 +850,60 @@ Please provide:
                 logger.error(f"Sarvam API error: {response.status_code} - {response.text}")
                 return {
                     "answer": f"Error calling Sarvam API: {response.status_code}",
-                    "citations": []
+                    "citations": [],
+                    "error": True
                 }
         except Exception as e:
             logger.error(f"Exception calling Sarvam API: {str(e)}")
             raise
     
-    def _build_citations(self, emails: List[Dict[str, Any]], keywords: List[str] = None, raw_citations: List[Any] = None) -> List[Dict[str, Any]]:
+    def _stream_answer(self, prompt: str) -> Iterator[str]:
+        """
+        Stream answer text from Sarvam AI as it is generated.
+        
+        Args:
+            prompt (str): Formatted prompt
+            
+        Yields:
+            str: Answer text deltas, in order
+        """
+        payload = {
+            "model": SARVAM_MODEL,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "temperature": 0.2,
+            "max_tokens": 500,
+            "stream": True
+        }
+        
+        response = self.sarvam.post_json("/v1/chat/completions", payload, timeout=30, stream=True)
+        try:
+            if response.status_code != 200:
+                logger.error(f"Sarvam API error: {response.status_code} - {response.text}")
+                raise RuntimeError(f"Error calling Sarvam API: {response.status_code}")
+            
+            # Server-sent events: one 'data: {json}' line per chunk, then 'data: [DONE]'
+            for line in response.iter_lines():
+                if not line.startswith(b'data:'):
+                    continue
+                data = line[5:].strip()
+                if data == b'[DONE]':
+                    break
+                choices = orjson.loads(data).get("choices") or [{}]
+                text = (choices[0].get("delta") or {}).get("content")
+                if text:
+                    yield text
+        finally:
+            response.close()
+    
+    def _build_citations(
+        self, emails: List[Dict[str, Any]], keywords: List[str] = None, raw_citations: List[Any] = None,
+        cleaned_bodies: Optional[Dict[str, str]] = None
+    ) -> List[Dict[str, Any]]:
         """
         Build structured citations from emails, filtering for relevance.
         
@@ -580,6 +911,7 @@ Please provide:
             emails (List[Dict[str, Any]]): Retrieved emails
             keywords (List[str], optional): Search keywords for relevance filtering
             raw_citations (List[Any], optional): Raw citations from LLM (if any, currently unused)
+            cleaned_bodies (Dict[str, str], optional): Per-query cache of cleaned bodies
             
         Returns:
             List[Dict[str, Any]]: Structured citations (only relevant ones)
@@ -587,10 +919,10 @@ Please provide:
         citations = []
         for email in emails:
             # Only include citations that are relevant to the query
-            if keywords and not self._is_email_relevant(email, keywords):
+            if keywords and not self._is_email_relevant(email, keywords, cleaned_bodies):
                 continue
                 
-            body_cleaned = clean_html_body(email.get('body', ''))
+            body_cleaned = self._cleaned_body(email, cleaned_bodies)
             citations.append({
                 "id": email.get('id'),
                 "subject": email.get('subject'),
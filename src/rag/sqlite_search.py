@@ -2,7 +2,7 @@
 SQLite FTS5 search helpers for email retrieval.
 """
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from src.SQLiteHandler import SQLiteHandler
 
 logger = logging.getLogger('outlook-email.rag.sqlite')
@@ -49,6 +49,31 @@ class EmailSearcher:
         logger.info(f"Found {len(results)} emails matching query")
         return results
     
+    def search_threads(self, query: str, top_k: int = 10) -> List[Dict[str, Any]]:
+        """
+        Search emails and return the best-matching email of each top thread.
+        
+        Args:
+            query (str): Search query
+            top_k (int): Number of threads to return
+            
+        Returns:
+            List[Dict[str, Any]]: One email per thread with an FTS 'snippet' in
+            place of the body, plus 'thread_id', 'thread_rank', 'thread_hits' and
+            'matched_ids', best thread first
+        """
+        logger.info(f"Searching threads with query: '{query}', top_k: {top_k}")
+        
+        fts_query = query.strip()
+        if not fts_query:
+            logger.warning("Empty query provided")
+            return []
+        
+        results = self.sqlite.search_threads_fts(fts_query, limit=top_k)
+        
+        logger.info(f"Found {len(results)} threads matching query")
+        return results
+    
     def search_with_keywords(self, keywords: List[str], top_k: int = 10) -> List[Dict[str, Any]]:
         """
         Search emails using a list of keywords (OR query).
@@ -98,4 +123,60 @@ class EmailSearcher:
         if not conversation_id:
             return []
         return self.sqlite.get_emails_by_conversation_id(conversation_id)
-
+    
+    def get_threads_emails(self, conversation_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Get all emails of several conversation threads with one query.
+        
+        Args:
+            conversation_ids (List[str]): Conversation IDs
+            
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: Thread emails by conversation ID
+        """
+        if not conversation_ids:
+            return {}
+        return self.sqlite.get_emails_by_conversation_ids(conversation_ids)
+    
+    def get_email(self, email_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a single email by its ID.
+        
+        Args:
+            email_id (str): Email ID
+            
+        Returns:
+            Optional[Dict[str, Any]]: Email if found
+        """
+        if not email_id:
+            return None
+        return self.sqlite.get_email_by_id(email_id)
+    
+    def search_sender(self, sender_email: str, top_k: int = 10) -> List[Dict[str, Any]]:
+        """
+        Get the most recent emails from an exact sender address.
+        
+        Args:
+            sender_email (str): Sender email address
+            top_k (int): Number of results to return
+            
+        Returns:
+            List[Dict[str, Any]]: Matching emails, newest first
+        """
+        if not sender_email:
+            return []
+        return self.sqlite.get_emails_by_sender(sender_email, limit=top_k)
+    
+    def get_bodies(self, email_ids: List[str]) -> Dict[str, str]:
+        """
+        Get full bodies for emails returned without one (e.g. by search_threads).
+        
+        Args:
+            email_ids (List[str]): Email IDs
+            
+        Returns:
+            Dict[str, str]: Body by email ID
+        """
+        if not email_ids:
+            return {}
+        return self.sqlite.get_email_bodies(email_ids)
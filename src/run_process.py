@@ -1,12 +1,35 @@
 import asyncio
-from src.mcp_server import processor
+import os
+import sys
+from datetime import datetime
+from src.mcp_server import get_processor
+
+try:
+    import uvloop
+except ImportError:  # uvloop is optional (pip install .[accel]); the default loop is used
+    uvloop = None
+
+# Set USE_UVLOOP=false to keep asyncio's default event loop even when uvloop is installed
+USE_UVLOOP = os.getenv('USE_UVLOOP', 'true').lower() == 'true'
+
+
+def run(coro):
+    """Run a coroutine on uvloop when available and enabled, else on the default loop."""
+    if uvloop is None or not USE_UVLOOP or sys.platform == 'win32':
+        return asyncio.run(coro)
+    if sys.version_info >= (3, 11):
+        with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+            return runner.run(coro)
+    uvloop.install()
+    return asyncio.run(coro)
+
 
 if __name__ == "__main__":
-    start = "2025-12-10"
-    end = "2025-12-30"
+    start = datetime.fromisoformat("2025-12-10")
+    end = datetime.fromisoformat("2025-12-30")
 
-    print(f"Processing emails from {start} to {end}...")
-    result = asyncio.run(
-        processor.process_emails(start, end, [], None)
+    print(f"Processing emails from {start.date()} to {end.date()}...")
+    result = run(
+        get_processor().process_emails(start, end, [], None)
     )
     print(result)
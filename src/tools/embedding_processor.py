@@ -1,16 +1,28 @@
+import hashlib
 import json
 import uuid
 import os
 import sys
-import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Tuple
 from datetime import datetime
+import numpy as np
 from src.SarvamClient import SarvamClient
+from src.embedding_model import get_embedding_model
 
 # Configure logging
 logger = logging.getLogger('outlook-email.embedding')
 
+# Runs Sarvam analysis for a batch while its embeddings are encoded
+ANALYSIS_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix='sarvam-analysis')
+
+# Fields every email needs (present and not None) before it is embedded
+REQUIRED_EMAIL_FIELDS = (
+    'Subject', 'SenderName', 'SenderEmailAddress', 'To',
+    'ReceivedTime', 'Folder', 'AccountName', 'Body'
+)
+
 class EmbeddingProcessor:
     def __init__(self, db_path: str, collection_name: str, sarvam_api_key: str):
         """
@@ -40,15 +52,25 @@ class EmbeddingProcessor:
         
         # Initialize sentence-transformers for real embeddings
         try:
-            from sentence_transformers import SentenceTransformer
             model_name = os.getenv("EMBEDDING_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
             logger.info(f"Loading embedding model: {model_name}")
-            self.embedding_model = SentenceTransformer(model_name)
+            self.embedding_model = get_embedding_model(model_name)
+            self.model_name = model_name
+            self.embedding_provider = "sentence-transformers"
             logger.info(f"Embedding model loaded successfully (dimension: {self.embedding_model.get_sentence_embedding_dimension()})")
+            
+            from src.MongoDBHandler import VECTOR_SEARCH_INDEX
+            if VECTOR_SEARCH_INDEX:
+                self.mongodb_handler.ensure_vector_search_index(
+                    VECTOR_SEARCH_INDEX,
+                    self.embedding_model.get_sentence_embedding_dimension()
+                )
         except Exception as e:
             logger.error(f"Error loading embedding model: {str(e)}")
             logger.warning("Falling back to hash-based embeddings")
             self.embedding_model = None
+            self.model_name = "sha256-fallback"
+            self.embedding_provider = "hash"
     
     def create_email_content(self, email: Dict[str, Any]) -> str:
         """Create a formatted string of email content for embedding."""
@@ -61,17 +83,25 @@ Date: {email.get('ReceivedTime', '')}
 {email.get('Body', '')}
 """
 
+    def content_hash(self, email: Dict[str, Any]) -> str:
+        """
+        Hash the fields that feed the embedding, so unchanged emails can reuse it.
+        
+        Whitespace runs are collapsed first: the tokenizer ignores them, so
+        bodies that differ only in line breaks or indentation (as Graph and
+        Outlook re-renders often do) embed identically and share one entry.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        for field in ('Subject', 'Body', 'SenderEmailAddress'):
+            digest.update(' '.join(str(email.get(field) or '').split()).encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
     def validate_email_data(self, email: Dict[str, Any]) -> bool:
         """Validate email data structure and content."""
-        required_fields = [
-            'Subject', 'SenderName', 'SenderEmailAddress', 'To', 
-            'ReceivedTime', 'Folder', 'AccountName', 'Body'
-        ]
-        
         # Check required fields exist and are not None
-        for field in required_fields:
-            if field not in email or email[field] is None:
-                return False
+        if any(email.get(field) is None for field in REQUIRED_EMAIL_FIELDS):
+            return False
                 
         # Validate dates are in ISO format
         try:
@@ -82,7 +112,7 @@ Date: {email.get('ReceivedTime', '')}
             
         return True
 
-    def process_batch(self, emails: List[Dict[str, Any]], batch_size: int = 4) -> Tuple[int, int]:
+    def process_batch(self, emails: List[Dict[str, Any]], batch_size: int = 4) -> Tuple[List[str], int]:
         """
         Process a batch of emails to generate embeddings with validation.
         
@@ -91,11 +121,13 @@ Date: {email.get('ReceivedTime', '')}
             batch_size: Size of batches for processing (default: 4)
             
         Returns:
-            Tuple[int, int]: (number of successfully processed emails, number of failed emails)
+            Tuple[List[str], int]: (IDs of the emails written to MongoDB, number of failed emails).
+            Emails that fail validation are skipped, so the IDs are not a prefix of the input.
         """
         documents = []
         metadatas = []
         ids = []
+        sources = []
         failed_count = 0
         
         for i, email in enumerate(emails):
@@ -122,94 +154,128 @@ Date: {email.get('ReceivedTime', '')}
                     'InternetMessageId': email.get('InternetMessageId', '') or None
                 }
                 
-                # Validate metadata can be JSON encoded
-                try:
-                    json.dumps(metadata)
-                except (TypeError, ValueError):
-                    failed_count += 1
-                    continue
-                
                 documents.append(content)
                 metadatas.append(metadata)
                 ids.append(email.get('id', str(uuid.uuid4())))
+                sources.append(email)
                 
             except Exception as e:
                 failed_count += 1
                 continue
         
+        # Validate metadata can be JSON encoded: one dumps call for the whole
+        # batch, and a per-email pass only when something in it fails
+        try:
+            json.dumps(metadatas)
+        except (TypeError, ValueError):
+            keep = []
+            for i, metadata in enumerate(metadatas):
+                try:
+                    json.dumps(metadata)
+                    keep.append(i)
+                except (TypeError, ValueError):
+                    failed_count += 1
+            documents = [documents[i] for i in keep]
+            metadatas = [metadatas[i] for i in keep]
+            ids = [ids[i] for i in keep]
+            sources = [sources[i] for i in keep]
+        
         if not documents:
-            return 0, failed_count
+            return [], failed_count
         
         # Process documents in batches
         try:
-            # Generate embeddings using sentence-transformers
-            embeddings = None
-            
-            if self.embedding_model is not None:
-                try:
-                    logger.info(f"Generating real embeddings for {len(documents)} documents using sentence-transformers")
-                    # Normalize embeddings for cosine similarity
-                    embeddings_array = self.embedding_model.encode(
-                        documents, 
-                        normalize_embeddings=True,
-                        show_progress_bar=False
-                    )
-                    # Convert numpy arrays to lists for MongoDB storage
-                    embeddings = [emb.tolist() for emb in embeddings_array]
-                    logger.info(f"Successfully generated {len(embeddings)} real embeddings")
-                except Exception as e:
-                    logger.error(f"Error generating embeddings with sentence-transformers: {str(e)}")
-                    logger.warning("Falling back to hash-based embeddings")
-                    embeddings = None
-            
-            # Fallback to hash-based embeddings if model not available
-            if embeddings is None:
-                logger.warning("Using fallback hash-based embeddings (vector search will not be meaningful)")
-                embeddings = self._generate_fallback_embeddings(documents)
+            # Emails may arrive with a cached 'embedding' / 'analysis'; only fill the gaps.
+            # Sarvam analysis is network-bound and encoding is compute-bound, so the
+            # analysis requests start first and run while the model encodes.
+            analyses = [email.get('analysis') for email in sources]
+            pending_analyses = [i for i, analysis in enumerate(analyses) if analysis is None]
+            analysis_future = None
+            if pending_analyses:
+                logger.info(f"Analyzing {len(pending_analyses)} emails")
+                analysis_future = ANALYSIS_POOL.submit(
+                    self.sarvam_client.analyze_batch, [documents[i] for i in pending_analyses]
+                )
             
-            if not embeddings:
-                logger.error("No embeddings generated")
-                return 0, len(documents) + failed_count
+            embeddings = [email.get('embedding') for email in sources]
+            pending = [i for i, emb in enumerate(embeddings) if emb is None]
+            if pending:
+                new_embeddings, model_name = self._encode_documents([documents[i] for i in pending])
+                if len(new_embeddings) == 0:
+                    logger.error("No embeddings generated")
+                    if analysis_future is not None:
+                        analysis_future.cancel()
+                    return [], len(documents) + failed_count
+                for i, emb in zip(pending, new_embeddings):
+                    embeddings[i] = emb
+                    sources[i]['embedding'] = emb
+                    sources[i]['embedding_model'] = model_name
             
-            # Analyze emails using Sarvam client
-            logger.info(f"Analyzing {len(documents)} emails")
-            analyses = self.sarvam_client.analyze_batch(documents)
+            # Collect the Sarvam analyses; errors surface here and reach the handler below
+            if analysis_future is not None:
+                for i, analysis in zip(pending_analyses, analysis_future.result()):
+                    analyses[i] = analysis
+                    sources[i]['analysis'] = analysis
             
-            # Create batch of documents to add to MongoDB
+            # Create batch of documents to add to MongoDB; the metadata dicts were
+            # built above for this batch only, so the analysis is set in place
+            for meta, analysis in zip(metadatas, analyses):
+                meta['analysis'] = analysis
             batch = [{
                 'id': id_,
                 'embedding': emb,
                 'document': doc,
-                'metadata': {**meta, 'analysis': analysis}
-            } for id_, emb, doc, meta, analysis in zip(ids, embeddings, documents, metadatas, analyses)]
+                'metadata': meta
+            } for id_, emb, doc, meta in zip(ids, embeddings, documents, metadatas)]
             
             logger.info(f"Adding {len(batch)} documents to MongoDB")
             
-            # Add to MongoDB with retries
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    if self.mongodb_handler.add_embeddings(batch):
-                        logger.info(f"Successfully added {len(batch)} documents to MongoDB")
-                        return len(batch), failed_count
-                    else:
-                        logger.warning(f"Failed to add documents to MongoDB (attempt {attempt + 1}/{max_retries})")
-                        if attempt < max_retries - 1:
-                            time.sleep(1)
-                            continue
-                        return 0, len(batch) + failed_count
-                except Exception as e:
-                    logger.error(f"Error adding documents to MongoDB (attempt {attempt + 1}/{max_retries}): {str(e)}")
-                    if attempt < max_retries - 1:
-                        time.sleep(1)
-                        continue
-                    return 0, len(batch) + failed_count
+            # add_embeddings retries transient failures itself and fails fast on the rest
+            if self.mongodb_handler.add_embeddings(batch):
+                logger.info(f"Successfully added {len(batch)} documents to MongoDB")
+                return ids, failed_count
+            logger.warning("Failed to add documents to MongoDB")
+            return [], len(batch) + failed_count
                     
         except Exception as e:
             logger.error(f"Error processing batch: {str(e)}")
-            return 0, len(documents) + failed_count
+            return [], len(documents) + failed_count
     
-    def _generate_fallback_embeddings(self, texts: List[str], dimension: int = 384) -> List[List[float]]:
+    def _encode_documents(self, documents: List[str]) -> Tuple[np.ndarray, str]:
+        """
+        Embed documents with the loaded model, falling back to hash embeddings.
+        
+        Vectors stay as rows of one float32 array; MongoDBHandler packs them
+        to BSON binary directly, so no per-float Python list is built.
+        
+        Args:
+            documents (List[str]): Texts to embed
+            
+        Returns:
+            Tuple[np.ndarray, str]: (float32 embedding matrix, name of the model that produced it)
+        """
+        if self.embedding_model is not None:
+            try:
+                logger.info(f"Generating real embeddings for {len(documents)} documents using sentence-transformers")
+                # Normalize embeddings for cosine similarity; rows are handed on as
+                # views, so the matrix is made C-contiguous float32 once here
+                embeddings = np.ascontiguousarray(self.embedding_model.encode(
+                    documents, 
+                    normalize_embeddings=True,
+                    convert_to_numpy=True,
+                    show_progress_bar=False
+                ), dtype=np.float32)
+                logger.info(f"Successfully generated {len(embeddings)} real embeddings")
+                return embeddings, self.model_name
+            except Exception as e:
+                logger.error(f"Error generating embeddings with sentence-transformers: {str(e)}")
+                logger.warning("Falling back to hash-based embeddings")
+        
+        # Fallback to hash-based embeddings if model not available
+        logger.warning("Using fallback hash-based embeddings (vector search will not be meaningful)")
+        return self._generate_fallback_embeddings(documents), "sha256-fallback"
+    
+    def _generate_fallback_embeddings(self, texts: List[str], dimension: int = 384) -> np.ndarray:
         """
         Generate fallback hash-based embeddings (for when sentence-transformers fails).
         This is NOT suitable for meaningful vector search.
@@ -219,26 +285,23 @@ Date: {email.get('ReceivedTime', '')}
             dimension (int): Embedding dimension
             
         Returns:
-            List[List[float]]: List of embedding vectors
+            np.ndarray: float32 embedding matrix, one row per text
         """
-        import hashlib
+        if not texts:
+            return np.empty((0, dimension), dtype=np.float32)
         
-        embeddings = []
-        for text in texts:
-            # Create a hash of the text
-            text_hash = hashlib.sha256(text.encode()).hexdigest()
-            
-            # Convert hash to numbers and normalize
-            embedding = []
-            for i in range(dimension):
-                # Use parts of the hash to generate pseudo-random numbers
-                hash_part = text_hash[(i * 2) % len(text_hash):(i * 2 + 2) % len(text_hash)]
-                value = int(hash_part or "00", 16) / 255.0 * 2 - 1  # Normalize to [-1, 1]
-                embedding.append(value)
-            
-            embeddings.append(embedding)
+        # One SHA-256 digest per text; dimension i reads digest byte i % 32
+        digests = np.frombuffer(
+            b''.join(hashlib.sha256(text.encode()).digest() for text in texts), dtype=np.uint8
+        ).reshape(len(texts), 32)
+        byte_index = np.arange(dimension) % 32
+        values = digests[:, byte_index].astype(np.float32)
+        # The original hex slicing wrapped to an empty slice for byte 31 and read it
+        # as 0; keep that so previously stored fallback vectors stay identical
+        values[:, byte_index == 31] = 0.0
         
-        return embeddings
+        # Normalize to [-1, 1]
+        return values * np.float32(2.0 / 255.0) - np.float32(1.0)
             
     def close(self) -> None:
         """Close connections."""
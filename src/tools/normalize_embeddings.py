@@ -0,0 +1,16 @@
+"""
+One-off migration: rescale email embeddings stored before normalization.
+
+Usage: python -m src.tools.normalize_embeddings
+"""
+import os
+import logging
+from dotenv import load_dotenv
+from src.MongoDBHandler import MongoDBHandler
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    load_dotenv()
+
+    with MongoDBHandler(os.environ["MONGODB_URI"], os.environ["COLLECTION_NAME"]) as handler:
+        print(f"Normalized {handler.normalize_stored_embeddings()} embeddings")
@@ -0,0 +1,20 @@
+"""
+Compile the optional numba kernels ahead of the first request.
+
+The kernels are cached on disk (cache=True), so running this once after
+installing .[accel] spares every fresh worker process the compile.
+
+Usage: python -m src.tools.warmup_kernels
+"""
+import numpy as np
+from src.attachments import chunking
+from src.rag import mongo_vectors
+
+if __name__ == "__main__":
+    if mongo_vectors.njit is None:
+        print("numba is not installed; nothing to compile")
+    else:
+        rows = np.ones((2, 4), dtype=np.float32)
+        mongo_vectors._score_rows(rows, np.full(4, 0.5, dtype=np.float32), np.array([True, False]))
+        chunking._plan_chunks(np.array([4, 8], dtype=np.int32), 12, 6, 1)
+        print("Compiled numba kernels")
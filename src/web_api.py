@@ -2,16 +2,23 @@
 FastAPI server for Email RAG search.
 Provides HTTP endpoints for querying emails and generating answers.
 """
+import asyncio
 import logging
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import chain
 from typing import Optional
+import orjson
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, field_validator
 from src.SQLiteHandler import SQLiteHandler
 from src.MongoDBHandler import MongoDBHandler
 from src.SarvamClient import SarvamClient
@@ -27,6 +34,26 @@ logging.basicConfig(
 )
 logger = logging.getLogger('outlook-email.web-api')
 
+# Worker threads for blocking SQLite, MongoDB, Sarvam and encoding calls, so
+# handlers never stall the event loop while a request waits on I/O
+API_IO_WORKERS = int(os.getenv('API_IO_WORKERS', '8'))
+IO_POOL = ThreadPoolExecutor(max_workers=API_IO_WORKERS, thread_name_prefix='api-io')
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """
+    Run a blocking call on IO_POOL and await its result.
+    
+    Args:
+        fn (Callable): Function to call
+        *args: Positional arguments for fn
+        **kwargs: Keyword arguments for fn
+        
+    Returns:
+        Any: Result of fn
+    """
+    return await asyncio.get_running_loop().run_in_executor(IO_POOL, partial(fn, *args, **kwargs))
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Email RAG API",
@@ -47,6 +74,16 @@ app.add_middleware(
 class QueryRequest(BaseModel):
     question: str
     top_k: Optional[int] = 8
+    force_refresh: bool = False
+    
+    @field_validator('question')
+    @classmethod
+    def question_not_blank(cls, value: str) -> str:
+        """Strip the question, rejecting blank ones (FastAPI answers 422)."""
+        value = value.strip()
+        if not value:
+            raise ValueError("Question cannot be empty")
+        return value
 
 
 class QueryResponse(BaseModel):
@@ -91,27 +128,43 @@ async def startup_event():
     
     # Initialize embedding model for reranking
     embedding_model = None
+    model_name = os.getenv("EMBEDDING_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
     if enable_vector_rerank:
         try:
-            from sentence_transformers import SentenceTransformer
-            model_name = os.getenv("EMBEDDING_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
+            from src.embedding_model import EncodeBatcher, get_embedding_model
             logger.info(f"Loading embedding model: {model_name}")
-            embedding_model = SentenceTransformer(model_name)
+            # Concurrent /query requests share one forward for their query embeddings
+            embedding_model = EncodeBatcher(get_embedding_model(model_name))
             logger.info("Embedding model loaded successfully")
         except Exception as e:
             logger.error(f"Error loading embedding model: {str(e)}")
             logger.warning("Vector reranking will be disabled")
     
-    vector_reranker = VectorReranker(mongodb_handler, embedding_model)
+    # Query embeddings also persist in the SQLite embedding cache across restarts
+    vector_reranker = VectorReranker(
+        mongodb_handler, embedding_model, embedding_cache=sqlite_handler, model_name=model_name
+    )
     
     # Initialize query service
     query_service = QueryService(
         email_searcher=email_searcher,
         vector_reranker=vector_reranker,
         sarvam_client=sarvam_client,
-        enable_vector_rerank=enable_vector_rerank
+        enable_vector_rerank=enable_vector_rerank,
+        sqlite_handler=sqlite_handler
     )
     
+    # Warm up the paths the first query takes: the embedding model already ran
+    # a dry encode when loaded; touch the FTS index and open a MongoDB connection
+    try:
+        sqlite_handler.conn.execute("SELECT rowid FROM emails_fts LIMIT 1").fetchone()
+        mongodb_handler.collection.find_one({}, {"_id": 1})
+    except Exception as e:
+        logger.warning(f"Warm-up failed: {str(e)}")
+    
+    # Build the known-ID filter off the request path; it scans every stored id
+    threading.Thread(target=mongodb_handler.load_known_ids, name='known-ids-loader', daemon=True).start()
+    
     logger.info("Services initialized successfully")
 
 
@@ -122,6 +175,9 @@ async def shutdown_event():
     
     logger.info("Shutting down services...")
     
+    # Let in-flight calls finish before their connections close
+    IO_POOL.shutdown(wait=True)
+    
     if sqlite_handler:
         sqlite_handler.close()
     
@@ -139,6 +195,7 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "query": "/query (POST)",
+            "query_stream": "/query/stream (POST, NDJSON events)",
             "emails": "/emails (GET)",
             "email_by_id": "/emails/{id} (GET)",
             "health": "/health (GET)"
@@ -160,16 +217,52 @@ async def query_emails(request: QueryRequest):
     if not query_service:
         raise HTTPException(status_code=500, detail="Query service not initialized")
     
-    if not request.question or not request.question.strip():
-        raise HTTPException(status_code=400, detail="Question cannot be empty")
-    
     try:
         logger.info(f"Received query: {request.question}")
-        result = query_service.query(request.question, top_k=request.top_k)
-        return QueryResponse(**result)
+        result = await run_blocking(
+            query_service.query,
+            request.question, top_k=request.top_k, force_refresh=request.force_refresh
+        )
+        # Returning a response directly skips rebuilding and re-validating the
+        # result as a QueryResponse, which stays the documented schema
+        return ORJSONResponse(result)
+    except Exception as e:
+        logger.error(f"Error processing query: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
+
+
+@app.post("/query/stream")
+async def query_emails_stream(request: QueryRequest):
+    """
+    Query emails and stream the answer as it is generated.
+    
+    The body is newline-delimited JSON: a 'context' event with citations and
+    retrieved emails, 'token' events with answer text, then a 'done' event.
+    
+    Args:
+        request (QueryRequest): Query request with question and top_k
+        
+    Returns:
+        StreamingResponse: NDJSON event stream
+    """
+    if not query_service:
+        raise HTTPException(status_code=500, detail="Query service not initialized")
+    
+    try:
+        logger.info(f"Received streaming query: {request.question}")
+        events = query_service.query_stream(
+            request.question, top_k=request.top_k, force_refresh=request.force_refresh
+        )
+        # Retrieval runs up to the first event, so errors still become a 500
+        first = await run_blocking(next, events)
     except Exception as e:
         logger.error(f"Error processing query: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
+    
+    return StreamingResponse(
+        (orjson.dumps(event) + b"\n" for event in chain([first], events)),
+        media_type="application/x-ndjson"
+    )
 
 
 @app.get("/emails")
@@ -188,25 +281,7 @@ async def list_emails(limit: int = 20, offset: int = 0):
         raise HTTPException(status_code=500, detail="SQLite handler not initialized")
     
     try:
-        cursor = sqlite_handler.conn.cursor()
-        cursor.execute('''
-            SELECT id, subject, sender_name, sender_email, received_time, folder
-            FROM emails
-            ORDER BY received_time DESC
-            LIMIT ? OFFSET ?
-        ''', (limit, offset))
-        
-        emails = []
-        for row in cursor.fetchall():
-            emails.append({
-                "id": row[0],
-                "subject": row[1],
-                "sender_name": row[2],
-                "sender_email": row[3],
-                "received_time": row[4],
-                "folder": row[5]
-            })
-        
+        emails = await run_blocking(sqlite_handler.get_recent_emails, limit, offset)
         return {"emails": emails, "count": len(emails)}
     except Exception as e:
         logger.error(f"Error listing emails: {str(e)}", exc_info=True)
@@ -228,7 +303,7 @@ async def get_email(email_id: str):
         raise HTTPException(status_code=500, detail="SQLite handler not initialized")
     
     try:
-        email = sqlite_handler.get_email_by_id(email_id)
+        email = await run_blocking(sqlite_handler.get_email_by_id, email_id)
         
         if not email:
             raise HTTPException(status_code=404, detail="Email not found")
@@ -257,7 +332,7 @@ async def health_check():
     # Check SQLite
     try:
         if sqlite_handler:
-            count = sqlite_handler.get_email_count()
+            count = await run_blocking(sqlite_handler.get_email_count)
             health_status["services"]["sqlite"] = {
                 "status": "ok",
                 "email_count": count
@@ -276,7 +351,7 @@ async def health_check():
     # Check MongoDB
     try:
         if mongodb_handler:
-            count = mongodb_handler.get_collection_count()
+            count = await run_blocking(mongodb_handler.get_collection_count)
             health_status["services"]["mongodb"] = {
                 "status": "ok",
                 "document_count": count
@@ -295,7 +370,7 @@ async def health_check():
     # Check Sarvam API
     try:
         if query_service and query_service.sarvam:
-            test_result = query_service.sarvam.test_connection()
+            test_result = await run_blocking(query_service.sarvam.test_connection)
             health_status["services"]["sarvam"] = {
                 "status": "ok" if test_result else "error",
                 "endpoint": "https://api.sarvam.ai/v1/chat/completions"
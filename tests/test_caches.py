@@ -0,0 +1,103 @@
+"""
+Tests for the RAG query-path caches.
+"""
+import threading
+import time
+import unittest
+from src.rag.caches import SingleFlight, TTLCache
+
+
+class FakeClock:
+    """Manually advanced clock."""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache(unittest.TestCase):
+    """Test LRU eviction and expiry."""
+    
+    def test_evicts_least_recently_used(self):
+        """The entry not read most recently is evicted first."""
+        cache = TTLCache(max_items=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(len(cache), 2)
+    
+    def test_entries_expire(self):
+        """Entries older than ttl_sec are treated as missing."""
+        clock = FakeClock()
+        cache = TTLCache(max_items=10, ttl_sec=60, timer=clock)
+        cache.set('a', 1)
+        
+        clock.now = 60
+        self.assertEqual(cache.get('a'), 1)
+        clock.now = 61
+        self.assertEqual(cache.get('a', 'missing'), 'missing')
+        self.assertEqual(len(cache), 0)
+    
+    def test_clear(self):
+        """clear() drops every entry."""
+        cache = TTLCache()
+        cache.set('a', 1)
+        cache.clear()
+        
+        self.assertIsNone(cache.get('a'))
+
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Test coalescing of overlapping calls."""
+    
+    def test_overlapping_calls_share_one_run(self):
+        """Callers that arrive while a call is running get its result."""
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        runs = []
+        
+        def slow():
+            runs.append(1)
+            started.set()
+            release.wait(5)
+            return 'answer'
+        
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do('q', slow)))
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=lambda: results.append(flight.do('q', slow))) for _ in range(3)]
+        for thread in followers:
+            thread.start()
+        time.sleep(0.1)  # Let the followers reach do() while the leader is running
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+        
+        self.assertEqual(results, ['answer'] * 4)
+        self.assertEqual(len(runs), 1)
+        self.assertEqual(flight.do('q', lambda: 'fresh'), 'fresh')
+    
+    def test_exception_propagates(self):
+        """A failing call raises for the caller and is not remembered."""
+        flight = SingleFlight()
+        
+        def fail():
+            raise ValueError('boom')
+        
+        with self.assertRaises(ValueError):
+            flight.do('q', fail)
+        self.assertEqual(flight.do('q', lambda: 1), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
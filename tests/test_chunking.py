@@ -0,0 +1,102 @@
+"""
+Tests for document chunking.
+"""
+import unittest
+import numpy as np
+from src.attachments.chunking import DocumentChunker, _plan_chunks
+
+
+class TestDocumentChunker(unittest.TestCase):
+    """Test boundary detection and chunk layout."""
+
+    def setUp(self):
+        self.chunker = DocumentChunker(chunk_size=200, overlap=20)
+        paragraph = "This is a sentence. Another one follows! Does it end? " * 4
+        self.text = "\n\n".join([paragraph.strip()] * 6)
+
+    def test_boundaries_sorted_and_unique(self):
+        """Boundaries come out strictly increasing."""
+        boundaries = self.chunker._detect_boundaries(self.text)
+        self.assertTrue(boundaries)
+        self.assertEqual(boundaries, sorted(set(boundaries)))
+
+    def test_boundaries_after_markers(self):
+        """Sentence and paragraph boundaries sit just after their marker."""
+        boundaries = self.chunker._detect_boundaries("One. Two!\n\nThree")
+        self.assertIn(5, boundaries)   # after ". "
+        self.assertIn(11, boundaries)  # after "\n\n"
+        self.assertIn(4, boundaries)   # word boundary at the first space
+
+    def test_find_nearest_boundary(self):
+        """Nearest boundary search returns the first boundary at or after position."""
+        boundaries = [10, 20, 30]
+        self.assertEqual(self.chunker._find_nearest_boundary(boundaries, 20), 20)
+        self.assertEqual(self.chunker._find_nearest_boundary(boundaries, 21), 30)
+        self.assertIsNone(self.chunker._find_nearest_boundary(boundaries, 31))
+
+    def test_chunks_cover_text(self):
+        """Chunks are numbered, overlap, and reach the end of the text."""
+        chunks = self.chunker.chunk_document(self.text, {'filename': 'doc.txt'})
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(chunks[0]['start_position'], 0)
+        self.assertEqual(chunks[-1]['end_position'], len(self.text))
+        for i, chunk in enumerate(chunks):
+            self.assertEqual(chunk['chunk_number'], i)
+            self.assertEqual(chunk['total_chunks'], len(chunks))
+            self.assertEqual(chunk['metadata']['filename'], 'doc.txt')
+        for prev, nxt in zip(chunks, chunks[1:]):
+            self.assertEqual(nxt['start_position'], prev['end_position'] - 20)
+
+    def test_fast_plan_matches_boundary_plan(self):
+        """The fast path picks the same positions as the boundary-list path."""
+        text = self.text + "\n\n\nTrailing words without any sentence end " * 20 + "x" * 500
+        boundaries = self.chunker._detect_boundaries(text)
+        starts, ends = _plan_chunks(np.array(boundaries, dtype=np.int32), len(text), 200, 20)
+        fast_starts, fast_ends = self.chunker._plan_chunks_fast(text)
+        self.assertEqual(starts.tolist(), fast_starts)
+        self.assertEqual(ends.tolist(), fast_ends)
+
+    def test_chunk_document_array(self):
+        """Array output has the same layout as chunk_document."""
+        chunks = self.chunker.chunk_document(self.text, {'filename': 'doc.txt'})
+        array = self.chunker.chunk_document_array(self.text)
+        self.assertEqual(len(array), len(chunks))
+        self.assertEqual(array.positions['start'].tolist(), [c.start_position for c in chunks])
+        self.assertEqual(array.as_dicts({'filename': 'doc.txt'}), [c.to_dict() for c in chunks])
+
+    def test_chunk_to_dict(self):
+        """Chunks convert to the plain dictionary form."""
+        chunk = self.chunker.chunk_document(self.text, {})[1]
+        data = chunk.to_dict()
+        self.assertEqual(data['chunk_text'], chunk.chunk_text)
+        self.assertEqual(data['chunk_text'], self.text[chunk.start_position:chunk.end_position].strip())
+        self.assertEqual(set(data), {
+            'chunk_number', 'total_chunks', 'chunk_text', 'start_position',
+            'end_position', 'token_count', 'metadata'
+        })
+
+    def test_chunk_documents_matches_chunk_document(self):
+        """Batch chunking returns one chunk list per document, in order."""
+        items = [(self.text, {'n': 0}), ("Short text.", {'n': 1})]
+        batched = self.chunker.chunk_documents(items)
+        self.assertEqual(batched, [self.chunker.chunk_document(text, meta) for text, meta in items])
+
+    def test_short_text_single_chunk(self):
+        """Text within chunk_size yields one chunk."""
+        chunks = self.chunker.chunk_document("Short text.", {})
+        self.assertEqual(len(chunks), 1)
+        self.assertTrue(chunks[0]['metadata']['is_single_chunk'])
+
+    def test_invalid_overlap_rejected(self):
+        """Overlap must be non-negative and smaller than the chunk size."""
+        for chunk_size, overlap in [(200, 200), (200, 250), (200, -1), (0, 0)]:
+            with self.assertRaises(ValueError):
+                DocumentChunker(chunk_size=chunk_size, overlap=overlap)
+
+    def test_empty_text(self):
+        """Empty text yields no chunks."""
+        self.assertEqual(self.chunker.chunk_document("", {}), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+"""
+Tests for document text extraction.
+"""
+import unittest
+import zipfile
+from io import BytesIO
+from src.attachments.document_extractors import DOCXExtractor
+
+W = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+MC = 'http://schemas.openxmlformats.org/markup-compatibility/2006'
+
+DOCUMENT_XML = f'''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<w:document xmlns:w="{W}" xmlns:mc="{MC}">
+  <w:body>
+    <w:p>
+      <w:pPr><w:tabs><w:tab w:val="left" w:pos="720"/></w:tabs></w:pPr>
+      <w:r><w:t>Name</w:t><w:tab/><w:t>Value</w:t></w:r>
+    </w:p>
+    <w:p>
+      <w:r><w:t>First line</w:t><w:br/><w:t>Second line</w:t><w:cr/><w:t>Third</w:t></w:r>
+    </w:p>
+    <w:p>
+      <w:r>
+        <mc:AlternateContent>
+          <mc:Choice Requires="wps"><w:r><w:t>Shape text</w:t></w:r></mc:Choice>
+          <mc:Fallback><w:r><w:t>Shape text</w:t></w:r></mc:Fallback>
+        </mc:AlternateContent>
+      </w:r>
+    </w:p>
+  </w:body>
+</w:document>'''
+
+
+def build_docx(document_xml: str) -> bytes:
+    """Zip a minimal package around document.xml."""
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as package:
+        package.writestr('word/document.xml', document_xml)
+    return buffer.getvalue()
+
+
+class TestDOCXExtractor(unittest.TestCase):
+    """Test the lxml fast path for Word documents."""
+
+    def test_tabs_breaks_and_alternate_content(self):
+        """Tabs and breaks are kept, tab stops ignored, and fallback text not repeated."""
+        paragraphs, _, metadata = DOCXExtractor()._extract_xml(build_docx(DOCUMENT_XML))
+
+        self.assertEqual(paragraphs, ['Name\tValue', 'First line\nSecond line\nThird', 'Shape text'])
+        self.assertEqual(metadata['paragraph_count'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
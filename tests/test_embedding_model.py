@@ -0,0 +1,81 @@
+"""
+Tests for batched query encoding.
+"""
+import threading
+import unittest
+import numpy as np
+from src.embedding_model import EncodeBatcher
+
+
+class FakeModel:
+    """Model whose embedding is the sentence length, recording each forward."""
+    
+    def __init__(self):
+        self.calls = []
+        self.dimension = 2
+    
+    def encode(self, sentences, **kwargs):
+        self.calls.append((list(sentences), kwargs))
+        return np.array([[len(s), 1.0] for s in sentences], dtype=np.float32)
+
+
+class TestEncodeBatcher(unittest.TestCase):
+    """Test that concurrent single-sentence encodes share forwards."""
+    
+    def setUp(self):
+        self.model = FakeModel()
+        self.batcher = EncodeBatcher(self.model, max_batch=8, max_delay=0.2)
+    
+    def tearDown(self):
+        self.batcher.close()
+    
+    def test_concurrent_calls_share_a_forward(self):
+        """Overlapping calls are encoded together and each gets its own row."""
+        results = {}
+        
+        def call(text):
+            results[text] = self.batcher.encode([text], normalize_embeddings=True)
+        
+        threads = [threading.Thread(target=call, args=('x' * n,)) for n in range(1, 5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(len(self.model.calls), 1)
+        self.assertEqual(sorted(self.model.calls[0][0]), sorted(results))
+        self.assertEqual(self.model.calls[0][1], {'normalize_embeddings': True})
+        for text, embedding in results.items():
+            self.assertEqual(embedding.shape, (1, 2))
+            self.assertEqual(embedding[0, 0], len(text))
+    
+    def test_multi_sentence_calls_bypass_queue(self):
+        """Calls with several sentences go straight to the model."""
+        embeddings = self.batcher.encode(['a', 'bb'])
+        self.assertEqual(embeddings[:, 0].tolist(), [1, 2])
+        self.assertEqual(self.model.calls, [(['a', 'bb'], {})])
+    
+    def test_unhashable_options_bypass_queue(self):
+        """Options that cannot key a batch go straight to the model and leave the worker running."""
+        embeddings = self.batcher.encode(['a'], prompt_ids=[1, 2])
+        self.assertEqual(embeddings[:, 0].tolist(), [1])
+        self.assertEqual(self.model.calls, [(['a'], {'prompt_ids': [1, 2]})])
+        
+        self.assertEqual(self.batcher.encode(['bb'])[:, 0].tolist(), [2])
+    
+    def test_errors_reach_caller(self):
+        """A failing forward raises in the waiting caller."""
+        def failing_encode(sentences, **kwargs):
+            raise RuntimeError('boom')
+        
+        self.model.encode = failing_encode
+        with self.assertRaises(RuntimeError):
+            self.batcher.encode(['a'])
+    
+    def test_forwards_model_attributes(self):
+        """Attributes other than encode come from the wrapped model."""
+        self.assertEqual(self.batcher.dimension, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,6 +4,9 @@ Tests for FTS search functionality.
 import unittest
 import tempfile
 import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 from src.SQLiteHandler import SQLiteHandler
 from src.rag.sqlite_search import EmailSearcher
 from src.EmailMetadata import EmailMetadata
@@ -13,17 +16,18 @@ from datetime import datetime
 class TestFTSSearch(unittest.TestCase):
     """Test FTS search functionality."""
     
-    def setUp(self):
-        """Set up test database with sample emails."""
+    @classmethod
+    def setUpClass(cls):
+        """Set up one test database with sample emails, shared by every test."""
         # Create temporary database
-        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
-        self.temp_db.close()
+        cls.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        cls.temp_db.close()
         
-        self.sqlite = SQLiteHandler(self.temp_db.name)
-        self.searcher = EmailSearcher(self.sqlite)
+        cls.sqlite = SQLiteHandler(cls.temp_db.name)
+        cls.searcher = EmailSearcher(cls.sqlite)
         
         # Add sample emails
-        self.sample_emails = [
+        cls.sample_emails = [
             EmailMetadata(
                 AccountName="test@example.com",
                 Entry_ID="email1",
@@ -74,16 +78,21 @@ class TestFTSSearch(unittest.TestCase):
             ),
         ]
         
-        for email in self.sample_emails:
-            self.sqlite.add_or_update_email(email)
-        
-        # Rebuild FTS index
-        self.sqlite.rebuild_fts_index()
+        # One executemany transaction; the FTS triggers index the rows as they land
+        cls.sqlite.add_or_update_emails_bulk(cls.sample_emails)
     
-    def tearDown(self):
+    @classmethod
+    def tearDownClass(cls):
         """Clean up test database."""
-        self.sqlite.close()
-        os.unlink(self.temp_db.name)
+        cls.sqlite.close()
+        os.unlink(cls.temp_db.name)
+    
+    def _revert_after_test(self, sql: str):
+        """Undo a test's writes to the shared database once the test finishes."""
+        def revert():
+            self.sqlite.conn.execute(sql)
+            self.sqlite.conn.commit()
+        self.addCleanup(revert)
     
     def test_search_by_subject(self):
         """Test searching by subject."""
@@ -115,6 +124,131 @@ class TestFTSSearch(unittest.TestCase):
         results = self.searcher.search("email", top_k=2)
         self.assertLessEqual(len(results), 2)
 
+    
+    def test_search_threads_best_per_thread(self):
+        """Test thread search returns one best-ranked email per conversation."""
+        self._revert_after_test("UPDATE emails SET conversation_id = NULL")
+        self.sqlite.conn.execute("UPDATE emails SET conversation_id = 'conv1' WHERE id IN ('email1', 'email3')")
+        self.sqlite.conn.commit()
+        
+        threads = self.searcher.search_threads("pricing OR maintenance OR policy", top_k=10)
+        
+        self.assertEqual(sorted(t['thread_id'] for t in threads), ['conv1', 'email2'])
+        conv1 = next(t for t in threads if t['thread_id'] == 'conv1')
+        self.assertEqual(conv1['thread_hits'], 2)
+        self.assertEqual(sorted(conv1['matched_ids']), ['email1', 'email3'])
+        self.assertEqual([t['thread_rank'] for t in threads], sorted(t['thread_rank'] for t in threads))
+        self.assertEqual(len(self.searcher.search_threads("pricing OR maintenance OR policy", top_k=1)), 1)
+    
+    def test_search_threads_snippets_and_bodies(self):
+        """Test thread search returns snippets, with bodies fetched separately."""
+        threads = self.searcher.search_threads("pricing", top_k=10)
+        
+        self.assertEqual([t['id'] for t in threads], ['email1'])
+        self.assertNotIn('body', threads[0])
+        self.assertIn('pricing', threads[0]['snippet'])
+        bodies = self.searcher.get_bodies(['email1', 'missing'])
+        self.assertEqual(bodies, {'email1': self.sample_emails[0].Body})
+    
+    def test_get_threads_emails(self):
+        """Test bulk thread retrieval groups emails by conversation."""
+        self._revert_after_test("UPDATE emails SET conversation_id = NULL")
+        self.sqlite.conn.execute("UPDATE emails SET conversation_id = 'conv1' WHERE id IN ('email1', 'email3')")
+        self.sqlite.conn.execute("UPDATE emails SET conversation_id = 'conv2' WHERE id = 'email2'")
+        self.sqlite.conn.commit()
+        
+        threads = self.searcher.get_threads_emails(['conv1', 'conv2', 'conv3'])
+        
+        self.assertEqual(set(threads), {'conv1', 'conv2'})
+        self.assertEqual(sorted(e['id'] for e in threads['conv1']), ['email1', 'email3'])
+        self.assertEqual(threads['conv1'], self.searcher.get_thread_emails('conv1'))
+    
+    def test_extracted_attachments_grouped(self):
+        """Test bulk attachment lookup groups by email and skips empty text."""
+        self._revert_after_test("DELETE FROM attachments")
+        for att_id, email_id, text in [('a1', 'email1', 'short'), ('a2', 'email1', 'much longer text'),
+                                       ('a3', 'email2', ''), ('a4', 'email3', 'ops runbook')]:
+            self.sqlite.add_attachment({
+                'id': att_id, 'email_id': email_id, 'filename': f'{att_id}.txt',
+                'file_size': len(text), 'mime_type': 'text/plain', 'storage_id': None,
+                'extracted_text': text, 'text_length': len(text), 'page_count': 1,
+                'is_processed': True, 'chunk_count': 1
+            })
+        
+        grouped = self.sqlite.get_extracted_attachments(['email1', 'email2', 'email3', 'email1'])
+        
+        self.assertEqual(set(grouped), {'email1', 'email3'})
+        self.assertEqual([a['filename'] for a in grouped['email1']], ['a2.txt', 'a1.txt'])
+        self.assertEqual(grouped['email3'][0]['text'], 'ops runbook')
+
+    
+    def test_get_recent_emails(self):
+        """Test the listing page is newest first and served from the covering index."""
+        recent = self.sqlite.get_recent_emails(limit=2)
+        
+        self.assertEqual(len(recent), 2)
+        self.assertEqual(set(recent[0]), {'id', 'subject', 'sender_name', 'sender_email', 'received_time', 'folder'})
+        self.assertGreaterEqual(recent[0]['received_time'], recent[1]['received_time'])
+        self.assertEqual(self.sqlite.get_recent_emails(limit=2, offset=2)[0]['id'],
+                         self.sqlite.get_recent_emails(limit=3)[2]['id'])
+        
+        plan = ' '.join(row[3] for row in self.sqlite.conn.execute(
+            'EXPLAIN QUERY PLAN SELECT id, subject, sender_name, sender_email, received_time, folder '
+            'FROM emails ORDER BY received_time DESC LIMIT 2 OFFSET 0'
+        ))
+        self.assertIn('COVERING INDEX idx_recent_listing', plan)
+
+    
+    def test_worker_thread_reads_and_cache_writes(self):
+        """Test that other threads read on their own connection and write through the writer thread."""
+        self._revert_after_test("DELETE FROM embedding_cache WHERE hash = 'worker-hash'")
+        entries = [{'hash': 'worker-hash', 'embedding': [0.5, 0.5], 'analysis': None}]
+        
+        def on_worker():
+            reader = self.sqlite._reader()
+            results = self.searcher.search("sales", top_k=10)
+            stored = self.sqlite.cache_embeddings(entries, 'model', 'provider')
+            return reader, results, stored
+        
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            reader, results, stored = pool.submit(on_worker).result()
+        
+        self.assertIsNot(reader, self.sqlite.conn)
+        self.assertEqual(results, self.searcher.search("sales", top_k=10))
+        self.assertTrue(stored)
+        cached = self.sqlite.get_cached_embeddings(['worker-hash'], 'model', 'provider')
+        self.assertEqual(cached['worker-hash'][0].tolist(), [0.5, 0.5])
+
+
+class TestCorruptDatabase(unittest.TestCase):
+    """Test SQLITE_CORRUPTED_BEHAVIOR=recreate only replaces corrupt files."""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.db_path = os.path.join(self.temp_dir.name, 'emails.db')
+        patcher = mock.patch('src.SQLiteHandler.SQLITE_CORRUPTED_BEHAVIOR', 'recreate')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def test_recreates_corrupt_file(self):
+        """A file that is not a database is moved aside and replaced."""
+        with open(self.db_path, 'wb') as f:
+            f.write(b'not a database' * 512)
+        
+        SQLiteHandler(self.db_path).close()
+        
+        self.assertTrue(any('.corrupt-' in name for name in os.listdir(self.temp_dir.name)))
+    
+    def test_locked_database_not_recreated(self):
+        """An OperationalError such as a lock is re-raised and leaves the file alone."""
+        SQLiteHandler(self.db_path).close()
+        
+        with mock.patch.object(SQLiteHandler, '_open', side_effect=sqlite3.OperationalError('database is locked')):
+            with self.assertRaises(sqlite3.OperationalError):
+                SQLiteHandler(self.db_path)
+        
+        self.assertFalse(any('.corrupt-' in name for name in os.listdir(self.temp_dir.name)))
 
 if __name__ == '__main__':
     unittest.main()
@@ -2,6 +2,7 @@
 Tests for query service.
 """
 import unittest
+from unittest import mock
 from src.rag.query_service import QueryService
 
 
@@ -21,6 +22,14 @@ class MockEmailSearcher:
                 'rank': -0.5
             }
         ]
+    
+    def search_threads(self, query, top_k=10):
+        """Mock thread search; every email is its own thread."""
+        return [dict(email, thread_id=email['id']) for email in self.search(query, top_k)]
+    
+    def get_threads_emails(self, conversation_ids):
+        """Mock bulk thread retrieval; no conversations."""
+        return {}
 
 
 class MockVectorReranker:
@@ -110,6 +119,137 @@ class TestQueryService(unittest.TestCase):
         self.assertEqual(citations[0]['subject'], 'Test')
         self.assertIn('snippet', citations[0])
 
+    
+    def test_query_answer_cached(self):
+        """Test that a repeated question reuses the answer unless refreshed."""
+        calls = []
+        self.service._generate_answer = lambda prompt: calls.append(prompt) or {'answer': 'Cached', 'citations': []}
+        self.service._get_attachments_bulk = lambda email_ids: {}
+        
+        first = self.service.query("test email")
+        second = self.service.query("  Test   EMAIL ")
+        self.service.query("test email", force_refresh=True)
+        
+        self.assertEqual(first, second)
+        self.assertEqual(second['answer'], 'Cached')
+        self.assertEqual(len(calls), 2)
+    
+    def test_classify_intent(self):
+        """Test literal lookups are told apart from semantic questions."""
+        self.assertEqual(self.service._classify_intent('"quarterly budget"'), 'literal_phrase')
+        self.assertEqual(self.service._classify_intent('0000000012AB34CD56EF7890ABCD'), 'id_lookup')
+        self.assertEqual(
+            self.service._classify_intent('AAMkAGI2TG93AAA-_1BAAAAAAAAAAzZ8dRNbRFS4kX_OhlaYJ4AAAAAAEMAAA='),
+            'id_lookup'
+        )
+        self.assertEqual(self.service._classify_intent('internationalization'), 'semantic')
+        self.assertEqual(self.service._classify_intent('from: john@example.com'), 'sender_lookup')
+        self.assertEqual(self.service._classify_intent('what did john say about the budget?'), 'semantic')
+    
+    def test_literal_query_skips_generation(self):
+        """Test a quoted phrase is answered from the top hit without Sarvam."""
+        def fail(*args, **kwargs):
+            raise AssertionError("literal lookups must not rerank or generate")
+        self.service._generate_answer = fail
+        self.reranker.rerank = fail
+        self.searcher.search_phrase = lambda phrase, top_k=10: self.searcher.search(phrase, top_k)
+        
+        result = self.service.query('"test email"')
+        
+        self.assertTrue(result['success'])
+        self.assertIn('Test email', result['answer'])
+        self.assertIn('This is a test email body.', result['answer'])
+        self.assertEqual([c['id'] for c in result['citations']], ['email1'])
+    
+    def test_thread_context_fetches_attachments_once(self):
+        """Test attachments for the whole context come from a single bulk lookup."""
+        calls = []
+        
+        class FakeHandler:
+            def get_extracted_attachments(self, email_ids, per_email_limit=10):
+                calls.append(list(email_ids))
+                return {'e2': [{'filename': 'plan.pdf', 'extracted_text': 'Launch plan'}]}
+        
+        self.service.sqlite = FakeHandler()
+        emails = [
+            {'id': 'e1', 'conversation_id': 'c1', 'received_time': '1', 'body': 'First'},
+            {'id': 'e2', 'conversation_id': 'c1', 'received_time': '2', 'body': 'Second'},
+            {'id': 'e3', 'received_time': '3', 'body': 'Standalone'}
+        ]
+        
+        context = self.service._build_thread_context(emails, {})
+        
+        self.assertEqual(calls, [['e1', 'e2', 'e3']])
+        self.assertIn('plan.pdf: Launch plan', context)
+    
+    def test_query_stream_events(self):
+        """Test streaming yields context, tokens and done, and fills the answer cache."""
+        self.service._stream_answer = lambda prompt: iter(['Hello', ' world'])
+        self.service._get_attachments_bulk = lambda email_ids: {}
+        
+        events = list(self.service.query_stream("test email"))
+        
+        self.assertEqual([e['type'] for e in events], ['context', 'token', 'token', 'done'])
+        self.assertEqual(events[0]['citations'][0]['id'], 'email1')
+        self.assertEqual(events[-1]['answer'], 'Hello world')
+        self.service._generate_answer = lambda prompt: self.fail("answer should come from the cache")
+        self.assertEqual(self.service.query("test email")['answer'], 'Hello world')
+    
+    def test_stream_answer_parses_sse(self):
+        """Test server-sent event lines are turned into answer deltas."""
+        class FakeResponse:
+            status_code = 200
+            closed = False
+            
+            def iter_lines(self):
+                return iter([
+                    b'data: {"choices": [{"delta": {"role": "assistant"}}]}',
+                    b'',
+                    b'data: {"choices": [{"delta": {"content": "Hi"}}]}',
+                    b'data: {"choices": [{"delta": {"content": " there"}}]}',
+                    b'data: [DONE]'
+                ])
+            
+            def close(self):
+                self.closed = True
+        
+        response = FakeResponse()
+        self.sarvam.post_json = lambda path, payload, timeout=30, stream=False: response
+        
+        self.assertEqual(list(self.service._stream_answer("prompt")), ['Hi', ' there'])
+        self.assertTrue(response.closed)
+    
+    def test_thread_context_budget(self):
+        """Test emails past the context budget are neither cleaned nor included."""
+        self.service._get_attachments_bulk = lambda email_ids: {}
+        emails = [{'id': f'e{i}', 'received_time': str(i), 'body': f'Body {i} ' + 'x' * 1000} for i in range(10)]
+        cleaned = {}
+        
+        with mock.patch('src.rag.query_service.MAX_CONTEXT_CHARS', 2500):
+            context = self.service._build_thread_context(emails, {}, cleaned)
+        
+        self.assertIn('Body 2 ', context)
+        self.assertNotIn('Body 3 ', context)
+        self.assertEqual(sorted(cleaned), ['e0', 'e1', 'e2'])
+    
+    def test_fts_matched_thread_emails_skip_recheck(self):
+        """Test thread emails the FTS query matched are kept without a keyword re-check."""
+        thread = [
+            {'id': 'm1', 'subject': 'Budget', 'body': 'Budget draft', 'conversation_id': 'c1', 'received_time': '1'},
+            {'id': 'm2', 'subject': 'Re:', 'body': 'Matched on sender', 'conversation_id': 'c1', 'received_time': '2'},
+            {'id': 'm3', 'subject': 'Re:', 'body': 'Unrelated reply', 'conversation_id': 'c1', 'received_time': '3'}
+        ]
+        self.searcher.search_threads = lambda query, top_k=10: [
+            dict(thread[0], thread_id='c1', snippet='Budget', matched_ids=['m1', 'm2'])
+        ]
+        self.searcher.get_threads_emails = lambda conversation_ids: {'c1': [dict(e) for e in thread]}
+        self.service._get_attachments_bulk = lambda email_ids: {}
+        self.service._generate_answer = lambda prompt: {'answer': 'ok', 'citations': []}
+        self.service._is_email_relevant = lambda email, keywords, cleaned=None: email['id'] == 'm1'
+        
+        result = self.service.query("budget")
+        
+        self.assertEqual([e['id'] for e in result['retrieved_emails']], ['m1', 'm2'])
 
 if __name__ == '__main__':
     unittest.main()
@@ -82,6 +82,11 @@ class MockEmailSearcher:
                 }
             ]
         return []
+    
+    def get_threads_emails(self, conversation_ids):
+        """Mock bulk thread retrieval."""
+        threads = {conv_id: self.get_thread_emails(conv_id) for conv_id in conversation_ids}
+        return {conv_id: emails for conv_id, emails in threads.items() if emails}
 
 
 class MockVectorReranker:
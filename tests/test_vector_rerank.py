@@ -1,9 +1,15 @@
 """
 Tests for vector reranking functionality.
 """
+import threading
 import unittest
+from unittest import mock
+import bson
 import numpy as np
-from src.rag.mongo_vectors import VectorReranker
+from pymongo.errors import OperationFailure
+from src.MongoDBHandler import IdBloomFilter, MongoDBHandler, decode_embedding, decode_embedding_matrix, encode_embedding, normalize_embedding
+from src.rag.caches import TTLCache
+from src.rag.mongo_vectors import COVERED_PROJECTION, VectorReranker, _score_rows
 
 
 class MockMongoDBHandler:
@@ -28,11 +34,51 @@ class MockMongoDBHandler:
             },
         }
         self.collection = self
+        self.find_calls = 0
+        self.find_queries = []
+        self.vector_search_error = False
+    
+    def filter_known_ids(self, entry_ids):
+        """Mock known-ID filter."""
+        return [entry_id for entry_id in entry_ids if entry_id in self.data]
     
     def find_one(self, query):
         """Mock find_one method."""
         email_id = query.get('id')
         return self.data.get(email_id)
+    
+    def aggregate(self, pipeline):
+        """Mock $vectorSearch; scores are reported the way Atlas does for cosine."""
+        if self.vector_search_error:
+            raise OperationFailure("$vectorSearch is not allowed")
+        return iter([
+            {'id': 'email3', 'metadata': {'subject': 'Test 3'}, 'score': 1.0},
+            {'id': 'email1', 'metadata': {'subject': 'Test 1'}, 'score': 0.85},
+        ][:pipeline[0]['$vectorSearch']['limit']])
+    
+    def find(self, query, projection=None, batch_size=0):
+        """Mock find method supporting an $in filter on id, a binData filter and inclusion projections."""
+        self.find_calls += 1
+        self.find_queries.append((query, projection))
+        ids = query['id']['$in']
+        docs = [doc for email_id, doc in self.data.items() if email_id in ids]
+        if 'embedding' in query:
+            docs = [doc for doc in docs if isinstance(doc.get('embedding'), bytes)]
+        if projection:
+            docs = [{k: v for k, v in doc.items() if projection.get(k)} for doc in docs]
+        return iter(docs)
+
+
+class MockEmbeddingModel:
+    """Mock sentence-transformers model that counts encode calls."""
+    
+    def __init__(self):
+        self.calls = 0
+    
+    def encode(self, texts, normalize_embeddings=True, show_progress_bar=False):
+        """Mock encode method."""
+        self.calls += 1
+        return np.array([[float(len(text)), 1.0, 0.0] for text in texts])
 
 
 class TestVectorReranker(unittest.TestCase):
@@ -69,6 +115,258 @@ class TestVectorReranker(unittest.TestCase):
         self.assertEqual(results[0]['id'], 'email3')
         self.assertGreater(results[0]['similarity'], results[1]['similarity'])
     
+    def test_rerank_single_query(self):
+        """Test that all candidate embeddings are fetched in one query."""
+        results = self.reranker.rerank(['email1', 'missing', 'email3'], [0.8, 0.8, 0.0])
+        
+        self.assertEqual(self.mock_mongo.find_calls, 1)
+        self.assertEqual([r['id'] for r in results], ['email3', 'email1'])
+    
+    def test_rerank_metadata_path_projects_dim(self):
+        """Test that the with-metadata fetch reads the stored dimension instead of decoding."""
+        self.reranker.rerank(['email1', 'email3'], [0.8, 0.8, 0.0])
+        
+        self.assertTrue(all(projection.get('dim') for _, projection in self.mock_mongo.find_queries))
+    
+    def test_rerank_cache(self):
+        """Test that a repeated rerank is served from the cache until it expires."""
+        now = [0.0]
+        self.reranker._rerank_cache = TTLCache(max_items=16, ttl_sec=30, timer=lambda: now[0])
+        first = self.reranker.rerank(['email1', 'email3'], [0.8, 0.8, 0.0], top_k=1)
+        calls = self.mock_mongo.find_calls
+        first[0]['similarity'] = -1.0
+        second = self.reranker.rerank(['email1', 'email3'], [0.8, 0.8, 0.0], top_k=1)
+        
+        self.assertEqual(self.mock_mongo.find_calls, calls)
+        self.assertEqual(second[0]['id'], 'email3')
+        self.assertGreater(second[0]['similarity'], 0.9)
+        
+        now[0] = 31.0
+        self.reranker.rerank(['email1', 'email3'], [0.8, 0.8, 0.0], top_k=1)
+        self.assertGreater(self.mock_mongo.find_calls, calls)
+    
+    def test_rerank_vector_cache(self):
+        """Test that candidate vectors are reused across different queries."""
+        expected = VectorReranker(self.mock_mongo, embedding_model=None).rerank(
+            ['email1', 'email2', 'email3'], [0.0, 0.8, 0.8], top_k=2)
+        self.reranker.rerank(['email1', 'email3'], [0.8, 0.8, 0.0], top_k=1)
+        calls = self.mock_mongo.find_calls
+        results = self.reranker.rerank(['email1', 'email2', 'email3'], [0.0, 0.8, 0.8], top_k=2)
+        
+        self.assertEqual(results, expected)
+        fetched = [query['id']['$in'] for query, projection in self.mock_mongo.find_queries[calls:]
+                   if projection == COVERED_PROJECTION]
+        self.assertTrue(fetched)
+        self.assertTrue(all(ids == ['email2'] for ids in fetched))
+    
+    def test_rerank_vector_cache_not_mutated(self):
+        """Test that winner metadata is not written onto cached vector documents."""
+        results = self.reranker.rerank(['email1', 'email3'], [0.8, 0.8, 0.0], top_k=1)
+        
+        self.assertEqual(results[0]['metadata'], {'subject': 'Test 3'})
+        for email_id in ('email1', 'email3'):
+            self.assertNotIn('metadata', self.reranker._vector_cache.get(email_id))
+    
+    def test_rerank_top_k_ties_in_input_order(self):
+        """Test that ties at the top_k cut keep the earliest candidates."""
+        levels = [2, 0, 0, 2, 0, 1, 0, 0, 1, 1, 1, 0, 0, 0, 0, 2, 1, 1, 0, 1, 2, 1, 1, 2, 2, 2, 1, 2, 2, 1]
+        vectors = {0: [0.0, 1.0, 0.0], 1: [1.0, 1.0, 0.0], 2: [1.0, 0.0, 0.0]}
+        email_ids = [f'tie{i}' for i in range(len(levels))]
+        for email_id, level in zip(email_ids, levels):
+            self.mock_mongo.data[email_id] = {'id': email_id, 'embedding': vectors[level], 'metadata': {}}
+        
+        results = self.reranker.rerank(email_ids, [1.0, 0.0, 0.0], top_k=8)
+        
+        expected = [email_id for email_id, level in zip(email_ids, levels) if level == 2][:8]
+        self.assertEqual([r['id'] for r in results], expected)
+    
+    def test_rerank_chunked_fetch(self):
+        """Test that large candidate sets are fetched in chunks with the same ranking."""
+        email_ids = ['email1', 'email2', 'email3']
+        expected = self.reranker.rerank(email_ids, [0.8, 0.8, 0.0])
+        
+        chunked = VectorReranker(self.mock_mongo, embedding_model=None)
+        calls = self.mock_mongo.find_calls
+        with mock.patch('src.rag.mongo_vectors.FETCH_CHUNK_SIZE', 1):
+            results = chunked.rerank(email_ids, [0.8, 0.8, 0.0])
+        
+        self.assertEqual(results, expected)
+        self.assertEqual(self.mock_mongo.find_calls - calls, 3)
+    
+    def test_rerank_top_k_fetches_winner_metadata(self):
+        """Test that a top_k cut scores without metadata and fetches it for the winners only."""
+        for doc in self.mock_mongo.data.values():
+            doc.update(bson.decode(bson.encode(encode_embedding(doc['embedding'], dtype='int8'))))
+        
+        results = self.reranker.rerank(['email1', 'email2', 'email3'], [0.8, 0.8, 0.0], top_k=1)
+        
+        (scoring, scoring_projection), (lookup, _) = self.mock_mongo.find_queries
+        self.assertNotIn('metadata', scoring_projection)
+        self.assertEqual(lookup['id']['$in'], ['email3'])
+        self.assertEqual(results[0]['metadata'], {'subject': 'Test 3'})
+    
+    def test_rerank_matches_pairwise_similarity(self):
+        """Test that batched scores match the pairwise cosine similarity."""
+        query_embedding = [0.2, 0.9, 0.1]
+        results = self.reranker.rerank(['email1', 'email2', 'email3'], query_embedding)
+        
+        for result in results:
+            expected = self.reranker._cosine_similarity(
+                query_embedding, self.mock_mongo.data[result['id']]['embedding']
+            )
+            self.assertAlmostEqual(result['similarity'], expected, places=5)
+        self.assertEqual([r['id'] for r in results], ['email2', 'email3', 'email1'])
+    
+    def test_rerank_int8_embeddings(self):
+        """Test reranking against int8-quantized stored embeddings."""
+        for doc in self.mock_mongo.data.values():
+            # Round-trip through BSON as the driver would
+            doc.update(bson.decode(bson.encode(encode_embedding(doc['embedding'], dtype='int8'))))
+        
+        results = self.reranker.rerank(['email1', 'email2', 'email3'], [0.8, 0.8, 0.0])
+        
+        self.assertEqual(results[0]['id'], 'email3')
+        self.assertAlmostEqual(results[0]['similarity'], 1.0, places=2)
+    
+    def test_rerank_mixed_normalized_embeddings(self):
+        """Test that unit-length and legacy unnormalized vectors score alike."""
+        self.mock_mongo.data['email3']['embedding'] = [0.5, 0.5, 0.0]
+        self.mock_mongo.data['email1'].update({
+            'embedding': normalize_embedding([3.0, 0.0, 0.0]).tolist(),
+            'normalized': True
+        })
+        
+        results = self.reranker.rerank(['email1', 'email2', 'email3'], [0.8, 0.8, 0.0])
+        
+        self.assertEqual(results[0]['id'], 'email3')
+        self.assertAlmostEqual(results[0]['similarity'], 1.0, places=5)
+        self.assertAlmostEqual(results[1]['similarity'], np.sqrt(0.5), places=5)
+    
+    def test_score_rows_matches_numpy(self):
+        """Test that the scoring kernel matches normalizing and multiplying with NumPy."""
+        rng = np.random.default_rng(0)
+        matrix = rng.standard_normal((6, 4)).astype(np.float32)
+        needs_norm = np.array([True, False, True, True, False, True])
+        matrix[~needs_norm] /= np.linalg.norm(matrix[~needs_norm], axis=1, keepdims=True)
+        query = normalize_embedding(rng.standard_normal(4)).astype(np.float32)
+        
+        expected = (matrix / np.linalg.norm(matrix, axis=1, keepdims=True)) @ query
+        
+        np.testing.assert_allclose(_score_rows(matrix, query, needs_norm), expected, rtol=1e-5, atol=1e-6)
+    
+    def test_id_bloom_filter(self):
+        """Test that the known-ID filter keeps every added ID as it grows."""
+        known = IdBloomFilter(capacity=100, error_rate=0.01)
+        ids = [f"email-{i}" for i in range(1000)]
+        for entry_id in ids:
+            known.add(entry_id)
+        
+        self.assertTrue(all(entry_id in known for entry_id in ids))
+        false_positives = sum(f"other-{i}" in known for i in range(1000))
+        self.assertLess(false_positives, 30)
+    
+    def test_filter_known_ids_after_load(self):
+        """Test that IDs pass through until the filter loads, then only stored ones remain."""
+        handler = MongoDBHandler.__new__(MongoDBHandler)
+        handler._known_ids = None
+        handler._known_ids_loading = None
+        handler._known_ids_lock = threading.Lock()
+        handler.collection = mock.Mock()
+        handler.collection.find.return_value = [{'id': 'email1'}, {'id': 'email2'}]
+        
+        self.assertEqual(handler.filter_known_ids(['email1', 'missing']), ['email1', 'missing'])
+        self.assertTrue(handler.load_known_ids())
+        handler._remember_ids(['email3'])
+        
+        self.assertEqual(handler.filter_known_ids(['email1', 'missing', 'email3']), ['email1', 'email3'])
+    
+    def test_decode_embedding_matrix_int8(self):
+        """Test that batch int8 decoding matches decoding one document at a time."""
+        docs = [
+            bson.decode(bson.encode(encode_embedding(doc['embedding'], dtype='int8')))
+            for doc in self.mock_mongo.data.values()
+        ]
+        
+        matrix = decode_embedding_matrix(docs)
+        
+        self.assertEqual(matrix.dtype, np.float32)
+        np.testing.assert_allclose(matrix, np.stack([decode_embedding(doc) for doc in docs]))
+    
+    def test_rerank_legacy_int8_bytes(self):
+        """Test int8 vectors stored as plain bytes before the BSON vector subtype."""
+        for doc in self.mock_mongo.data.values():
+            packed = encode_embedding(doc['embedding'], dtype='int8')
+            packed['embedding'] = bytes(packed['embedding'])[2:]
+            doc.update(packed)
+        
+        results = self.reranker.rerank(['email1', 'email2', 'email3'], [0.8, 0.8, 0.0])
+        
+        self.assertEqual(results[0]['id'], 'email3')
+        self.assertAlmostEqual(results[0]['similarity'], 1.0, places=2)
+    
+    def test_rerank_vector_search(self):
+        """Test server-side scoring converts Atlas scores back to cosine."""
+        self.reranker.use_vector_search = True
+        
+        results = self.reranker.rerank(['email1', 'email2', 'email3'], [0.8, 0.8, 0.0], top_k=2)
+        
+        self.assertEqual(self.mock_mongo.find_calls, 0)
+        self.assertEqual([r['id'] for r in results], ['email3', 'email1'])
+        self.assertAlmostEqual(results[1]['similarity'], 0.7, places=5)
+    
+    def test_rerank_vector_search_fallback(self):
+        """Test falling back to client-side scoring when $vectorSearch is rejected."""
+        self.reranker.use_vector_search = True
+        self.mock_mongo.vector_search_error = True
+        
+        results = self.reranker.rerank(['email1', 'email2', 'email3'], [0.8, 0.8, 0.0])
+        
+        self.assertFalse(self.reranker.use_vector_search)
+        self.assertEqual(self.mock_mongo.find_calls, 1)
+        self.assertEqual(results[0]['id'], 'email3')
+    
+    def test_embed_query_cached(self):
+        """Test that repeated queries reuse the cached embedding."""
+        model = MockEmbeddingModel()
+        reranker = VectorReranker(self.mock_mongo, embedding_model=model)
+        
+        first = reranker.embed_query("budget review")
+        second = reranker.embed_query("  budget   review ")
+        second.append(99.0)  # Callers get a copy, not the cached value
+        
+        self.assertEqual(model.calls, 1)
+        self.assertEqual(reranker.embed_query("budget review"), first)
+        
+        reranker.embedding_model = MockEmbeddingModel()
+        reranker.embed_query("budget review")
+        self.assertEqual(reranker.embedding_model.calls, 1)
+    
+    def test_embed_query_persistent_cache(self):
+        """Test that query embeddings are shared through the embedding cache."""
+        class DictEmbeddingCache:
+            def __init__(self):
+                self.entries = {}
+            
+            def get_cached_embeddings(self, hashes, model, provider):
+                return {h: self.entries[(h, model, provider)] for h in hashes if (h, model, provider) in self.entries}
+            
+            def cache_embeddings(self, entries, model, provider):
+                for entry in entries:
+                    self.entries[(entry['hash'], model, provider)] = (np.asarray(entry['embedding'], dtype=np.float32), None)
+                return True
+        
+        cache = DictEmbeddingCache()
+        first_model = MockEmbeddingModel()
+        first = VectorReranker(self.mock_mongo, first_model, embedding_cache=cache, model_name='m').embed_query("budget review")
+        
+        second_model = MockEmbeddingModel()
+        restarted = VectorReranker(self.mock_mongo, second_model, embedding_cache=cache, model_name='m')
+        self.assertEqual(restarted.embed_query(" budget  review"), first)
+        self.assertEqual((first_model.calls, second_model.calls), (1, 0))
+        
+        VectorReranker(self.mock_mongo, second_model, embedding_cache=cache, model_name='other').embed_query("budget review")
+        self.assertEqual(second_model.calls, 1)
+    
     def test_rerank_empty_list(self):
         """Test reranking with empty email list."""
         results = self.reranker.rerank([], [1.0, 0.0, 0.0])